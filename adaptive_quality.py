@@ -0,0 +1,107 @@
+"""
+Adaptive Quality Controller for Camera Sender
+Closed loop that trades JPEG quality, resolution scale and FPS against a
+per-camera bandwidth and latency target using sender and server feedback
+"""
+
+import time
+from collections import deque
+from typing import Optional
+
+
+class QualityController:
+    """AIMD-style controller: back off quickly under pressure, recover slowly with headroom"""
+
+    def __init__(self, target_kbps: float = 2000, target_latency_ms: float = 200,
+                 max_fps: int = 15, min_fps: int = 2, max_quality: int = 80, min_quality: int = 30,
+                 min_scale: float = 0.25, max_buffer_bytes: int = 256 * 1024):
+        self.target_kbps = target_kbps
+        self.target_latency_ms = target_latency_ms
+        self.max_fps = max_fps
+        self.min_fps = min(min_fps, max_fps)
+        self.max_quality = max_quality
+        self.min_quality = min(min_quality, max_quality)
+        self.min_scale = min_scale
+        self.max_buffer_bytes = max_buffer_bytes
+
+        # Current settings
+        self.quality = max_quality
+        self.scale = 1.0
+        self.fps = max_fps
+
+        self.last_inputs: dict = {}
+        self.decisions: deque = deque(maxlen=20)
+
+    def update(self, kbps: float, rtt_ms: Optional[float], buffer_bytes: int,
+               drop_rate: float) -> Optional[str]:
+        """Feed one measurement window; returns the action taken, if any"""
+        self.last_inputs = {
+            'kbps': round(kbps, 1),
+            'rtt_ms': round(rtt_ms, 1) if rtt_ms is not None else None,
+            'buffer_bytes': buffer_bytes,
+            'drop_rate': round(drop_rate, 3)
+        }
+
+        reasons = []
+        if kbps > self.target_kbps * 1.1:
+            reasons.append('bandwidth')
+        if rtt_ms is not None and rtt_ms > self.target_latency_ms:
+            reasons.append('latency')
+        if buffer_bytes > self.max_buffer_bytes:
+            reasons.append('send_buffer')
+        if drop_rate > 0.05:
+            reasons.append('viewer_drops')
+
+        if reasons:
+            action = self._decrease()
+            return self._record(action, ','.join(reasons))
+
+        headroom = (kbps < self.target_kbps * 0.7
+                    and (rtt_ms is None or rtt_ms < self.target_latency_ms * 0.5)
+                    and buffer_bytes < self.max_buffer_bytes * 0.25
+                    and drop_rate < 0.01)
+        if headroom:
+            return self._record(self._increase(), 'headroom')
+        return None
+
+    def _decrease(self) -> Optional[str]:
+        # Cheapest visible loss first: quality, then resolution, then frame rate
+        if self.quality > self.min_quality:
+            self.quality = max(self.min_quality, self.quality - 10)
+            return f'quality={self.quality}'
+        if self.scale > self.min_scale:
+            self.scale = max(self.min_scale, round(self.scale * 0.75, 3))
+            return f'scale={self.scale}'
+        if self.fps > self.min_fps:
+            self.fps = max(self.min_fps, self.fps // 2)
+            return f'fps={self.fps}'
+        return None
+
+    def _increase(self) -> Optional[str]:
+        # Undo in reverse order, one small step per window
+        if self.fps < self.max_fps:
+            self.fps = min(self.max_fps, self.fps + 1)
+            return f'fps={self.fps}'
+        if self.scale < 1.0:
+            self.scale = min(1.0, round(self.scale / 0.9, 3))
+            return f'scale={self.scale}'
+        if self.quality < self.max_quality:
+            self.quality = min(self.max_quality, self.quality + 5)
+            return f'quality={self.quality}'
+        return None
+
+    def _record(self, action: Optional[str], reason: str) -> Optional[str]:
+        if action:
+            self.decisions.append({'time': time.time(), 'action': action, 'reason': reason})
+        return action
+
+    def snapshot(self) -> dict:
+        return {
+            'quality': self.quality,
+            'scale': self.scale,
+            'fps': self.fps,
+            'target_kbps': self.target_kbps,
+            'target_latency_ms': self.target_latency_ms,
+            'inputs': self.last_inputs,
+            'decisions': list(self.decisions)
+        }
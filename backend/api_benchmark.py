@@ -0,0 +1,201 @@
+# backend/api_benchmark.py
+"""
+Load benchmark for the sensor API: many simulated ESP devices POST /data
+(or buffered batches to /data/batch) while dashboards GET /latest, against
+the Flask dev server and the async production server. Reports requests/s,
+readings/s and latency percentiles per route
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SERVERS = {
+    # Werkzeug's threaded dev server, as `python server.py` runs it minus the reloader
+    "flask": [sys.executable, "-c", "import sys, server; server.app.run(host='127.0.0.1', port=int(sys.argv[1]))"],
+    "async": [sys.executable, "api_server.py", "--host", "127.0.0.1", "--port"],
+}
+
+
+async def http_request(connection, host, port, method, path, body=b""):
+    """One HTTP/1.1 request on a kept-alive connection; reconnects when the server closes it"""
+    if connection[0] is None:
+        connection[:] = await asyncio.open_connection(host, port)
+    reader, writer = connection
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    status = await reader.readline()
+    length = 0
+    close = status.startswith(b"HTTP/1.0")
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "connection":
+            close = value.strip().lower() == "close"
+    await reader.readexactly(length)
+    if close:
+        writer.close()
+        connection[:] = [None, None]
+    return int(status.split()[1])
+
+
+def device_reading(index, counter):
+    return {"device_id": f"esp-{index}", "status": "normal", "temperature": 20 + counter % 10, "humidity": 50}
+
+
+async def run_client(role, index, args, stop_at, result):
+    connection = [None, None]
+    batch_size = args["batch_size"]
+    route = "GET /latest" if role != "device" else "POST /data" if batch_size == 1 else "POST /data/batch"
+    samples = result["latency_ms"].setdefault(route, [])
+    counter = 0
+    while time.monotonic() < stop_at:
+        if role == "device" and batch_size == 1:
+            counter += 1
+            body = json.dumps(device_reading(index, counter)).encode()
+            method, path = "POST", "/data"
+        elif role == "device":
+            # A node that buffered batch_size readings, each stamped when it was taken
+            now = time.time()
+            readings = []
+            for i in range(batch_size):
+                counter += 1
+                readings.append(dict(device_reading(index, counter), timestamp=now - (batch_size - i)))
+            body = json.dumps({"readings": readings}).encode()
+            method, path = "POST", "/data/batch"
+        else:
+            body, method, path = b"", "GET", "/latest"
+        start = time.perf_counter()
+        try:
+            status = await http_request(connection, args["host"], args["port"], method, path, body)
+        except (OSError, asyncio.IncompleteReadError):
+            result["errors"] += 1
+            connection[:] = [None, None]
+            await asyncio.sleep(0.01)
+            continue
+        samples.append((time.perf_counter() - start) * 1000)
+        if status != 200:
+            result["errors"] += 1
+        elif role == "device":
+            result["readings"] += batch_size
+        if args["interval"]:
+            await asyncio.sleep(args["interval"])
+
+
+async def run_shard(shard):
+    result = {"latency_ms": {}, "errors": 0, "readings": 0}
+    stop_at = time.monotonic() + shard["duration"]
+    await asyncio.gather(
+        *(run_client("device", i, shard, stop_at, result) for i in shard["devices"]),
+        *(run_client("dashboard", i, shard, stop_at, result) for i in range(shard["dashboards"])),
+    )
+    return result
+
+
+def shard_main(shard):
+    return asyncio.run(run_shard(shard))
+
+
+def wait_for_port(host, port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not come up on {host}:{port}")
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_server(name, batch_size, args):
+    """Start one server mode, drive it from several client processes and summarize"""
+    env = dict(os.environ, SENSOR_DATA_DIR=tempfile.mkdtemp(prefix="sensor-bench-"), CLIP_TRIGGER_URLS="")
+    server = subprocess.Popen(SERVERS[name] + [str(args.port)], cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port("127.0.0.1", args.port)
+        shards = [{
+            "host": "127.0.0.1",
+            "port": args.port,
+            "devices": list(range(i, args.devices, args.client_procs)),
+            "dashboards": len(range(i, args.dashboards, args.client_procs)),
+            "duration": args.duration,
+            "interval": args.interval,
+            "batch_size": batch_size,
+        } for i in range(args.client_procs)]
+        with multiprocessing.get_context("spawn").Pool(args.client_procs) as pool:
+            results = pool.map(shard_main, shards)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    summary = {"server": name, "batch_size": batch_size, "errors": sum(r["errors"] for r in results),
+               "readings_per_sec": sum(r["readings"] for r in results) / args.duration, "routes": {}}
+    for route in sorted({route for r in results for route in r["latency_ms"]}):
+        samples = [s for r in results for s in r["latency_ms"].get(route, [])]
+        summary["routes"][route] = {
+            "requests_per_sec": len(samples) / args.duration,
+            "p50_ms": percentile(samples, 0.5),
+            "p99_ms": percentile(samples, 0.99),
+        }
+    summary["total_per_sec"] = sum(r["requests_per_sec"] for r in summary["routes"].values())
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sensor API load benchmark")
+    parser.add_argument("--servers", nargs="+", default=["flask", "async"], choices=sorted(SERVERS))
+    parser.add_argument("--devices", type=int, default=200, help="Simulated ESP devices posting /data")
+    parser.add_argument("--dashboards", type=int, default=50, help="Simulated dashboards reading /latest")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1],
+                        help="Readings per device request; 1 uses /data, more use /data/batch")
+    parser.add_argument("--interval", type=float, default=0.0,
+                        help="Seconds between requests per client (0 = as fast as possible)")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per server")
+    parser.add_argument("--client-procs", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    print(f"{args.devices} devices posting readings, {args.dashboards} dashboards reading /latest, "
+          f"{args.duration:g}s per server")
+    print(f"{'server':>8} {'batch':>6} {'route':>17} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    results = []
+    for name in args.servers:
+        for batch_size in args.batch_sizes:
+            summary = run_server(name, batch_size, args)
+            results.append(summary)
+            for route, stats in summary["routes"].items():
+                print(f"{name:>8} {batch_size:>6} {route:>17} {stats['requests_per_sec']:>9.0f} "
+                      f"{stats['p50_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+            print(f"{name:>8} {batch_size:>6} {'readings stored/s':>17} {summary['readings_per_sec']:>9.0f}"
+                  f"   errors: {summary['errors']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# backend/api_server.py
+"""
+Production server for the sensor API: the same routes as server.py on an
+asyncio server (uvicorn), sharing state through SensorService, with live
+updates streamed without a thread per client and latency histograms per route
+"""
+
+import argparse
+import json
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from request_metrics import RequestMetrics
+from sensor_service import DEFAULT_DEVICE, BatchError, create_service
+
+service = create_service()
+metrics = RequestMetrics()
+
+app = FastAPI()
+
+# ✅ Allow CORS for the dashboard
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+class LatencyMiddleware:
+    """Time from request arrival to response start, recorded per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                metrics.observe(f"{scope['method']} {getattr(route, 'path', scope['path'])}",
+                                (time.perf_counter() - start) * 1000)
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
+
+
+app.add_middleware(LatencyMiddleware)
+
+
+# ✅ ESP devices post readings here
+# Ingesting takes the service lock and appends to the history files, so it runs in the threadpool
+@app.post("/data")
+async def receive_data(request: Request):
+    try:
+        reading = json.loads(await request.body())
+    except ValueError:
+        return JSONResponse({"error": "Invalid JSON"}, status_code=400)
+    await run_in_threadpool(service.ingest, reading)
+    return {"message": "Data received"}
+
+
+# ✅ Buffered readings from many devices in one request
+@app.post("/data/batch")
+async def receive_batch(request: Request):
+    try:
+        payload = json.loads(await request.body())
+        return await run_in_threadpool(service.ingest_batch, payload)
+    except (BatchError, ValueError) as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+
+@app.get("/latest")
+async def get_latest_data(device: str = None):
+    if device is None:
+        return service.snapshot()[0]
+    state = service.device_state(device)
+    if state is None:
+        return JSONResponse({"error": "Unknown device"}, status_code=404)
+    return state["reading"]
+
+
+@app.get("/devices/latest")
+async def get_device_states():
+    return service.device_state()
+
+
+@app.get("/sos")
+async def get_sos():
+    return {"sos": service.snapshot()[1]}
+
+
+@app.post("/sos/activate")
+async def activate_sos():
+    await run_in_threadpool(service.set_sos, True)
+    print("🚨 SOS Activated manually!")
+    return {"message": "SOS Activated"}
+
+
+@app.post("/sos/deactivate")
+async def deactivate_sos():
+    await run_in_threadpool(service.set_sos, False)
+    print("✅ SOS Deactivated manually!")
+    return {"message": "SOS Deactivated"}
+
+
+# ✅ Server-Sent Events: current state on connect, then every change as it happens
+@app.get("/events")
+async def stream_events():
+    subscriber = service.live.subscribe()
+    return StreamingResponse(service.live.astream(subscriber, service.initial_events()),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/events/stats")
+async def get_event_stats():
+    return service.live.get_stats()
+
+
+# Plain def: numpy work runs in the threadpool instead of on the event loop
+@app.get("/history")
+def get_history(request: Request):
+    args = request.query_params
+    try:
+        end = float(args.get("to", time.time()))
+        start = float(args.get("from", end - 3600))
+        step = float(args["step"]) if args.get("step") else None
+        return service.store.history(args.get("device", DEFAULT_DEVICE), start, end, step)
+    except KeyError:
+        return JSONResponse({"error": "Unknown device"}, status_code=404)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+
+@app.get("/devices")
+def get_devices():
+    return service.store.get_stats()
+
+
+@app.get("/metrics/latency")
+async def get_latency():
+    return metrics.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Production sensor API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--log-level", default="warning", help="uvicorn log level (access logs cost throughput)")
+    args = parser.parse_args()
+
+    # One process by design: the latest state, history store and SSE fan-out live in it,
+    # and the event loop serves thousands of device and dashboard connections concurrently
+    uvicorn.run(app, host=args.host, port=args.port, log_level=args.log_level,
+                access_log=False, timeout_keep_alive=30, ws="none")
+
+
+if __name__ == "__main__":
+    main()
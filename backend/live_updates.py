@@ -0,0 +1,133 @@
+# backend/live_updates.py
+"""
+Server-Sent Events fan-out for sensor and SOS state. Each client has a small
+pending set keyed by event type, so a burst of readings collapses into the
+newest one while alerts are queued and always delivered
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+HEARTBEAT_SECONDS = 15.0
+
+
+class LiveSubscriber:
+    """Pending events for one connected client"""
+
+    def __init__(self, max_alerts=50):
+        self.pending = {}  # event type -> latest data (latest wins)
+        self.alerts = deque(maxlen=max_alerts)  # never coalesced
+        self.condition = threading.Condition()
+        self.closed = False
+        self.on_push = None  # wakes an asyncio stream; called from the publishing thread
+
+    def push(self, event, data, coalesce=True):
+        """Queue an event; returns True if it replaced one the client had not received yet"""
+        with self.condition:
+            if coalesce:
+                replaced = event in self.pending
+                self.pending[event] = data
+            else:
+                replaced = False
+                self.alerts.append((event, data))
+            self.condition.notify()
+        if self.on_push:
+            self.on_push()
+        return replaced
+
+    def take(self, timeout):
+        """Wait for events; returns a list of (event, data), empty on timeout"""
+        with self.condition:
+            if not self.pending and not self.alerts and not self.closed:
+                self.condition.wait(timeout)
+            events = list(self.alerts) + list(self.pending.items())
+            self.alerts.clear()
+            self.pending.clear()
+        return events
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.on_push:
+            self.on_push()
+
+
+class LiveBroadcaster:
+    """Publishes state changes to every subscribed SSE stream"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.published = 0
+        self.coalesced = 0
+
+    def subscribe(self):
+        subscriber = LiveSubscriber()
+        with self.lock:
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+        subscriber.close()
+
+    def publish(self, event, data, coalesce=True):
+        with self.lock:
+            subscribers = list(self.subscribers)
+            self.published += 1
+        for subscriber in subscribers:
+            if subscriber.push(event, data, coalesce):
+                self.coalesced += 1
+
+    def stream(self, subscriber, initial=()):
+        """SSE generator for a Flask Response; sends the current state first, then changes"""
+        try:
+            yield "retry: 2000\n\n"
+            for event, data in initial:
+                yield format_event(event, data)
+            while not subscriber.closed:
+                events = subscriber.take(HEARTBEAT_SECONDS)
+                if not events:
+                    # Comment line keeps proxies from timing out and detects gone clients
+                    yield f": keepalive {time.time():.0f}\n\n"
+                    continue
+                yield "".join(format_event(event, data) for event, data in events)
+        finally:
+            self.unsubscribe(subscriber)
+
+    async def astream(self, subscriber, initial=()):
+        """Same stream for an asyncio server: waits on an event instead of holding a thread"""
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        subscriber.on_push = lambda: loop.call_soon_threadsafe(ready.set)
+        ready.set()  # pick up anything published between subscribe() and now
+        try:
+            yield "retry: 2000\n\n"
+            for event, data in initial:
+                yield format_event(event, data)
+            while not subscriber.closed:
+                try:
+                    await asyncio.wait_for(ready.wait(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield f": keepalive {time.time():.0f}\n\n"
+                    continue
+                ready.clear()
+                events = subscriber.take(0)
+                if events:
+                    yield "".join(format_event(event, data) for event, data in events)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def get_stats(self):
+        with self.lock:
+            clients = len(self.subscribers)
+        return {"clients": clients, "published": self.published, "coalesced": self.coalesced}
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
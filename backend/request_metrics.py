@@ -0,0 +1,73 @@
+# backend/request_metrics.py
+"""
+Fixed-bucket request latency histograms, cheap enough to record on every
+request and safe to update from many threads
+"""
+
+import bisect
+import threading
+
+# Upper bounds in milliseconds; the last bucket catches everything slower
+BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+
+class LatencyHistogram:
+    def __init__(self, bounds=BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, fraction):
+        """Estimate by linear interpolation inside the bucket holding the percentile"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.bounds, self.counts):
+            if count and seen + count >= rank:
+                upper = min(bound, self.max_ms)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.max_ms
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.5), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "p99_ms": round(self.percentile(0.99), 3),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {("+Inf" if bound == float("inf") else str(bound)): count
+                        for bound, count in zip(self.bounds, self.counts)},
+        }
+
+
+class RequestMetrics:
+    """One histogram per route ("POST /data", "GET /latest", ...)"""
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, route, ms):
+        with self.lock:
+            histogram = self.histograms.get(route)
+            if histogram is None:
+                histogram = self.histograms[route] = LatencyHistogram()
+            histogram.observe(ms)
+
+    def snapshot(self):
+        with self.lock:
+            return {route: histogram.snapshot() for route, histogram in sorted(self.histograms.items())}
@@ -1,33 +1,88 @@
+import os
+import sys
 import cv2
 import base64
 import asyncio
 import websockets
 import argparse
-from ultralytics import YOLO
+import time
+from collections import deque
+
+# The detection engine lives next to camera_sender.py in the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from detection_engine import DetectionEngine, draw_detections
+from frame_protocol import build_metadata, metadata_text
+from jpeg_encoder import BACKEND_AUTO, BACKENDS, SUBSAMPLINGS, JpegEncoder
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--server", type=str, required=True, help="WebSocket server URL, e.g. ws://localhost:8000/ws")
 parser.add_argument("--token", type=str, required=True, help="Auth token (must match .env)")
-args = parser.parse_args()
-
-model = YOLO("yolov8n.pt")  # Replace with custom model if trained
-cap = cv2.VideoCapture(0)
+parser.add_argument("--model", type=str, default="yolo", help="Detection model: yolo, fake or module:Class")
+parser.add_argument("--weights", type=str, default="yolov8n.pt", help="YOLO weights (replace with custom model if trained)")
+parser.add_argument("--detect-every", type=int, default=1, help="Run detection on every Nth frame")
+parser.add_argument("--overlay", choices=["burn", "metadata"], default="burn",
+                    help="Draw boxes into frames, or send clean frames plus a metadata message")
+parser.add_argument("--encoder", choices=BACKENDS, default=BACKEND_AUTO,
+                    help="JPEG encoder: libjpeg-turbo when installed (auto), turbojpeg or opencv")
+parser.add_argument("--subsampling", choices=SUBSAMPLINGS, default="420", help="JPEG chroma subsampling")
+parser.add_argument("--encode-workers", type=int, default=2, help="Frames encoded in parallel")
 
-async def send_video():
+async def send_video(args, cap, detector, encoder):
     async with websockets.connect(f"{args.server}?role=sender&token={args.token}") as ws:
+        sequence = 0
+        start_time = time.time()
+        # Frames encoding on the pool, sent in capture order (metadata first, if any)
+        pending = deque()
         while True:
-            ret, frame = cap.read()
+            ret, frame = await asyncio.to_thread(cap.read)
             if not ret:
                 continue
+            sequence += 1
 
-            # Run YOLO detection
-            results = model(frame, imgsz=640, conf=0.25)
-            annotated = results[0].plot()
+            # Queue YOLO detection in the process pool and use the latest finished result
+            detector.submit("camera-0", frame, sequence)
+            result = detector.get_latest("camera-0")
 
-            # Encode frame to JPEG -> base64
-            _, buffer = cv2.imencode(".jpg", annotated)
-            jpg_as_text = base64.b64encode(buffer).decode("utf-8")
+            if args.overlay == "metadata":
+                # Viewers draw the boxes; the metadata shares the frame's sequence number
+                metadata = build_metadata(
+                    result["detections"] if result else [],
+                    sequence / (time.time() - start_time),
+                    frame.shape[1],
+                    frame.shape[0],
+                    result["sequence"] if result else None,
+                )
+                metadata_msg = metadata_text("camera-0", sequence, metadata, time.time() * 1000)
+                annotated = frame
+            else:
+                metadata_msg = None
+                annotated = draw_detections(frame, result["detections"]) if result else frame
 
-            await ws.send(jpg_as_text)
+            # Encode frame to JPEG on the pool while the next frame is captured
+            pending.append((metadata_msg, asyncio.wrap_future(encoder.submit(annotated))))
+            while pending and (len(pending) > args.encode_workers or pending[0][1].done()):
+                metadata_msg, encoded = pending.popleft()
+                jpeg = await encoded
+                if metadata_msg:
+                    await ws.send(metadata_msg)
+                if jpeg:
+                    await ws.send(base64.b64encode(jpeg).decode("utf-8"))
 
-asyncio.run(send_video())
+if __name__ == "__main__":
+    # Worker processes re-import this module, so only the parent opens the camera
+    args = parser.parse_args()
+    cap = cv2.VideoCapture(0)
+    detector = DetectionEngine(
+        model=args.model,
+        model_options={"weights": args.weights, "conf": 0.25} if args.model == "yolo" else {},
+        frame_skip=args.detect_every,
+    )
+    detector.start()
+    # Quality 95 is what cv2.imencode used by default here
+    encoder = JpegEncoder(backend=args.encoder, subsampling=args.subsampling, quality=95,
+                          workers=args.encode_workers)
+    try:
+        asyncio.run(send_video(args, cap, detector, encoder))
+    finally:
+        encoder.close()
+        detector.close()
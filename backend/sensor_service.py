@@ -0,0 +1,180 @@
+# backend/sensor_service.py
+"""
+Sensor and SOS state shared by the Flask dev server (server.py) and the
+production async server (api_server.py): one lock guards the latest reading
+and SOS flag, and every change goes to the history store, live subscribers
+and the camera clip triggers
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+
+from live_updates import LiveBroadcaster
+from sensor_store import METRICS, SensorStore
+
+# event_clips lives next to camera_server.py in the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from event_clips import trigger_remote
+
+DEFAULT_DEVICE = "default"
+MAX_BATCH = 1000
+MAX_DEVICE_ID_LENGTH = 64
+DEVICE_ID_PATTERN = re.compile(r"[A-Za-z0-9_.-]+")
+MAX_CLOCK_SKEW = 300  # seconds a device timestamp may run ahead of the server
+
+
+class BatchError(ValueError):
+    """The batch as a whole is unusable (not a list, too large)"""
+
+
+def validate_batch(payload, now):
+    """Split a batch into per-device (timestamps, readings); bad entries are reported, not fatal"""
+    readings = payload.get("readings") if isinstance(payload, dict) else payload
+    if not isinstance(readings, list):
+        raise BatchError("Expected a list of readings or {\"readings\": [...]}")
+    if len(readings) > MAX_BATCH:
+        raise BatchError(f"At most {MAX_BATCH} readings per batch")
+
+    by_device = {}
+    errors = []
+    for index, reading in enumerate(readings):
+        if not isinstance(reading, dict):
+            errors.append({"index": index, "error": "not an object"})
+            continue
+        device_id = reading.get("device_id")
+        if (not isinstance(device_id, str) or len(device_id) > MAX_DEVICE_ID_LENGTH
+                or not DEVICE_ID_PATTERN.fullmatch(device_id)):
+            errors.append({"index": index, "error": "invalid device_id"})
+            continue
+        timestamp = reading.get("timestamp", now)
+        if isinstance(timestamp, bool) or not isinstance(timestamp, (int, float)):
+            errors.append({"index": index, "error": "invalid timestamp"})
+            continue
+        if timestamp > 1e11:
+            timestamp /= 1000  # milliseconds
+        if timestamp > now + MAX_CLOCK_SKEW:
+            errors.append({"index": index, "error": "timestamp in the future"})
+            continue
+        if any(not (reading.get(metric) is None or (isinstance(reading[metric], (int, float))
+                                                    and not isinstance(reading[metric], bool)))
+               for metric in METRICS):
+            errors.append({"index": index, "error": "non-numeric value"})
+            continue
+        if not isinstance(reading.get("status", ""), str):
+            errors.append({"index": index, "error": "invalid status"})
+            continue
+        timestamps, device_readings = by_device.setdefault(device_id, ([], []))
+        timestamps.append(float(timestamp))
+        device_readings.append(reading)
+    return by_device, errors
+
+
+class SensorService:
+    def __init__(self, store, live, clip_trigger_urls=()):
+        self.store = store
+        self.live = live
+        self.clip_trigger_urls = list(clip_trigger_urls)
+        self.lock = threading.Lock()
+        self.latest = {"status": "waiting", "temperature": 0, "humidity": 0}
+        self.latest_timestamp = 0.0
+        self.sos = False
+        # device_id -> {"reading", "timestamp", "received"} of its newest reading
+        self.devices = {}
+
+    def _update_device(self, device_id, timestamp, reading, now):
+        """Track a device's newest reading; returns True if it switched into crash"""
+        # A clock running ahead (up to MAX_CLOCK_SKEW) must not make every later reading look late
+        timestamp = min(timestamp, now)
+        state = self.devices.get(device_id)
+        previous_status = state["reading"].get("status") if state else None
+        crashed = reading.get("status") == "crash" and previous_status != "crash"
+        if state and timestamp < state["timestamp"]:
+            if not crashed:
+                return False  # late buffered reading: history only
+            timestamp = state["timestamp"]  # a late crash still switches the device into crash
+        self.devices[device_id] = {"reading": reading, "timestamp": timestamp, "received": now}
+        if timestamp >= self.latest_timestamp:
+            self.latest = reading
+            self.latest_timestamp = timestamp
+        return crashed
+
+    def ingest(self, reading):
+        """Store a reading posted by a device and push it to live clients"""
+        now = time.time()
+        # Held across store and publish so concurrent posts reach both in the same order
+        with self.lock:
+            crashed = False
+            if isinstance(reading, dict):
+                device_id = str(reading.get("device_id", DEFAULT_DEVICE))
+                self.store.append(device_id, reading, now)
+                crashed = self._update_device(device_id, now, reading, now)
+            else:
+                self.latest = reading
+            self.live.publish("sensor", reading)
+            # Only the switch into crash raises an alert and cuts a clip, not every crash report after it
+            if crashed:
+                self.live.publish("alert", {"type": "crash", "data": reading, "time": now}, coalesce=False)
+        if crashed:
+            self.trigger_clips("crash", reading)
+
+    def ingest_batch(self, payload):
+        """Validate and store readings from many devices; returns a summary for the response"""
+        now = time.time()
+        by_device, errors = validate_batch(payload, now)
+        crashes = []
+        with self.lock:
+            for device_id, (timestamps, readings) in by_device.items():
+                self.store.append_many(device_id, timestamps, readings)
+                for timestamp, reading in sorted(zip(timestamps, readings), key=lambda item: item[0]):
+                    if self._update_device(device_id, timestamp, reading, now):
+                        crashes.append(reading)
+            # One coalesced update per batch rather than one per reading
+            if by_device:
+                self.live.publish("sensor", self.latest)
+            for reading in crashes:
+                self.live.publish("alert", {"type": "crash", "data": reading, "time": now}, coalesce=False)
+        for reading in crashes:
+            self.trigger_clips("crash", reading)
+        return {"accepted": sum(len(timestamps) for timestamps, _ in by_device.values()),
+                "rejected": len(errors), "devices": len(by_device), "errors": errors[:20]}
+
+    def device_state(self, device_id=None):
+        """Newest reading per device, or of one device"""
+        with self.lock:
+            if device_id is not None:
+                return self.devices.get(device_id)
+            return dict(self.devices)
+
+    def set_sos(self, active):
+        with self.lock:
+            self.sos = active
+            self.live.publish("sos", {"sos": active})
+            if active:
+                self.live.publish("alert", {"type": "sos", "time": time.time()}, coalesce=False)
+        if active:
+            self.trigger_clips("sos")
+
+    def snapshot(self):
+        """(latest reading, SOS flag) read together"""
+        with self.lock:
+            return self.latest, self.sos
+
+    def initial_events(self):
+        latest, sos = self.snapshot()
+        return [("sensor", latest), ("sos", {"sos": sos})]
+
+    def trigger_clips(self, reason, details=None):
+        # Background threads so devices and dashboards never wait on the camera servers
+        for url in self.clip_trigger_urls:
+            threading.Thread(target=trigger_remote, args=(url, reason, details), daemon=True).start()
+
+
+def create_service():
+    """Service configured from the environment (SENSOR_DATA_DIR, CLIP_TRIGGER_URLS)"""
+    data_dir = os.getenv("SENSOR_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sensor_data"))
+    # e.g. CLIP_TRIGGER_URLS=ws://127.0.0.1:7777?token=StrongPassword123&role=admin,http://127.0.0.1:8000/clips
+    urls = [url for url in os.getenv("CLIP_TRIGGER_URLS", "").split(",") if url]
+    return SensorService(SensorStore(data_dir), LiveBroadcaster(), urls)
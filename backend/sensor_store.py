@@ -0,0 +1,413 @@
+# backend/sensor_store.py
+"""
+Time-series store for sensor readings: growable numpy columns per device,
+an append-only file per device and 1 min / 1 h rollups kept up to date on
+every append, so downsampled history over months is a few array operations
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+METRICS = ("temperature", "humidity")
+CRASH_STATUS = "crash"
+
+# On-disk record, packed: 17 bytes per reading
+RECORD_DTYPE = np.dtype([("timestamp", "<f8"), ("temperature", "<f4"), ("humidity", "<f4"), ("status", "u1")])
+FILE_SUFFIX = ".bin"
+STATUS_FILE = "statuses.json"
+# Status strings get codes 0..MAX_STATUSES-1 in order of first appearance; any further ones share OTHER_STATUS
+MAX_STATUSES = 255
+OTHER_STATUS = 255
+
+ROLLUP_WIDTHS = {"1m": 60, "1h": 3600}
+MAX_POINTS = 2000
+
+
+class Columns:
+    """Named numpy arrays sharing one length, grown by doubling"""
+
+    def __init__(self, dtypes, capacity=1024):
+        self.dtypes = dtypes
+        self.size = 0
+        self.arrays = {name: np.empty(capacity, dtype=dtype) for name, dtype in dtypes.items()}
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, name):
+        return self.arrays[name][:self.size]
+
+    def _reserve(self, extra):
+        capacity = len(next(iter(self.arrays.values())))
+        if self.size + extra <= capacity:
+            return
+        capacity = max(capacity * 2, self.size + extra)
+        for name, array in self.arrays.items():
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            self.arrays[name] = grown
+
+    def append(self, row):
+        self._reserve(1)
+        for name, value in row.items():
+            self.arrays[name][self.size] = value
+        self.size += 1
+
+    def extend(self, columns):
+        count = len(next(iter(columns.values())))
+        self._reserve(count)
+        for name, values in columns.items():
+            self.arrays[name][self.size:self.size + count] = values
+        self.size += count
+
+    def insert(self, index, row):
+        self._reserve(1)
+        for name, array in self.arrays.items():
+            array[index + 1:self.size + 1] = array[index:self.size]
+            array[index] = row[name]
+        self.size += 1
+
+
+def _rollup_dtypes():
+    dtypes = {"bucket": np.int64, "count": np.int64, "crashes": np.int64}
+    for metric in METRICS:
+        dtypes.update({f"{metric}_n": np.int64, f"{metric}_min": np.float64,
+                       f"{metric}_max": np.float64, f"{metric}_sum": np.float64})
+    return dtypes
+
+
+def _aggregate(columns, groups):
+    """Reduce aggregate rows sharing a group id (rows must be sorted by group)"""
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]]) if len(groups) else np.empty(0, dtype=np.int64)
+    result = {"group": groups[starts]}
+    for name, values in columns.items():
+        if not len(values):
+            result[name] = values
+        elif name.endswith("_min"):
+            result[name] = np.fmin.reduceat(values, starts)
+        elif name.endswith("_max"):
+            result[name] = np.fmax.reduceat(values, starts)
+        else:
+            result[name] = np.add.reduceat(values, starts)
+    return result
+
+
+class Rollup:
+    """Fixed-width buckets (count, crashes, min/max/sum per metric) maintained incrementally"""
+
+    def __init__(self, width):
+        self.width = width
+        self.columns = Columns(_rollup_dtypes(), capacity=64)
+
+    def add(self, timestamp, values, crashed):
+        position = self._position(int(timestamp // self.width))
+        arrays = self.columns.arrays
+        arrays["count"][position] += 1
+        arrays["crashes"][position] += crashed
+        for metric in METRICS:
+            value = values.get(metric)
+            if value is None or math.isnan(value):
+                continue
+            arrays[f"{metric}_n"][position] += 1
+            arrays[f"{metric}_sum"][position] += value
+            arrays[f"{metric}_min"][position] = min(arrays[f"{metric}_min"][position], value)
+            arrays[f"{metric}_max"][position] = max(arrays[f"{metric}_max"][position], value)
+
+    def merge(self, aggregated):
+        """Fold pre-aggregated rows (from _aggregate over this width's buckets) into the rollup"""
+        arrays = self.columns.arrays
+        for i, bucket in enumerate(aggregated["group"].tolist()):
+            position = self._position(bucket)
+            for name, values in aggregated.items():
+                if name == "group":
+                    continue
+                if name.endswith("_min"):
+                    arrays[name][position] = min(arrays[name][position], values[i])
+                elif name.endswith("_max"):
+                    arrays[name][position] = max(arrays[name][position], values[i])
+                else:
+                    arrays[name][position] += values[i]
+
+    def _position(self, bucket):
+        """Row index of a bucket, appending or inserting an empty one if needed"""
+        buckets = self.columns["bucket"]
+        position = len(buckets) - 1
+        if not len(buckets) or bucket > buckets[-1]:
+            position = None
+        elif bucket != buckets[-1]:
+            # Late reading (buffered device): find or insert its bucket
+            position = int(np.searchsorted(buckets, bucket))
+            if buckets[position] != bucket:
+                self.columns.insert(position, self._empty_row(bucket))
+
+        if position is None:
+            self.columns.append(self._empty_row(bucket))
+            position = len(self.columns) - 1
+        return position
+
+    @staticmethod
+    def _empty_row(bucket):
+        row = {"bucket": bucket, "count": 0, "crashes": 0}
+        for metric in METRICS:
+            row.update({f"{metric}_n": 0, f"{metric}_min": np.inf, f"{metric}_max": -np.inf, f"{metric}_sum": 0.0})
+        return row
+
+    def rebuild(self, raw):
+        """Recompute from sorted raw columns in one vectorized pass"""
+        aggregated = _aggregate(_raw_aggregates(raw), (raw["timestamp"] // self.width).astype(np.int64))
+        aggregated["bucket"] = aggregated.pop("group")
+        self.columns = Columns(_rollup_dtypes(), capacity=max(64, len(aggregated["bucket"])))
+        self.columns.extend(aggregated)
+
+
+def _raw_aggregates(raw):
+    """Raw readings expressed as one-reading aggregate rows"""
+    columns = {"count": np.ones(len(raw["timestamp"]), dtype=np.int64),
+               "crashes": raw["crashed"].astype(np.int64)}
+    for metric in METRICS:
+        values = raw[metric].astype(np.float64)
+        present = ~np.isnan(values)
+        columns[f"{metric}_n"] = present.astype(np.int64)
+        columns[f"{metric}_min"] = np.where(present, values, np.inf)
+        columns[f"{metric}_max"] = np.where(present, values, -np.inf)
+        columns[f"{metric}_sum"] = np.where(present, values, 0.0)
+    return columns
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _json_floats(values):
+    return [None if not math.isfinite(v) else round(v, 3) for v in values.tolist()]
+
+
+class DeviceSeries:
+    """Raw columns and rollups for one device"""
+
+    def __init__(self):
+        self.raw = Columns({"timestamp": np.float64, "temperature": np.float32, "humidity": np.float32,
+                            "status": np.uint8, "crashed": np.bool_})
+        self.rollups = {name: Rollup(width) for name, width in ROLLUP_WIDTHS.items()}
+        self.sorted = True
+
+    def append(self, timestamp, values, status_code, crashed):
+        if len(self.raw) and timestamp < self.raw["timestamp"][-1]:
+            self.sorted = False
+        self.raw.append({"timestamp": timestamp, "temperature": values["temperature"],
+                         "humidity": values["humidity"], "status": status_code, "crashed": crashed})
+        for rollup in self.rollups.values():
+            rollup.add(timestamp, values, crashed)
+
+    def extend(self, batch):
+        """Append a batch of readings given as columns sorted by timestamp"""
+        timestamps = batch["timestamp"]
+        if len(self.raw) and timestamps[0] < self.raw["timestamp"][-1]:
+            self.sorted = False
+        self.raw.extend(batch)
+        rows = _raw_aggregates(batch)
+        for rollup in self.rollups.values():
+            rollup.merge(_aggregate(rows, (timestamps // rollup.width).astype(np.int64)))
+
+    def ensure_sorted(self):
+        if self.sorted:
+            return
+        order = np.argsort(self.raw["timestamp"], kind="stable")
+        for name in list(self.raw.arrays):
+            self.raw.arrays[name][:self.raw.size] = self.raw[name][order]
+        self.sorted = True
+
+
+class SensorStore:
+    """Per-device time series with append-only persistence and precomputed rollups"""
+
+    def __init__(self, root):
+        self.root = root
+        self.devices = {}
+        self.files = {}
+        self.statuses = []  # status code -> status string
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    def _device_path(self, device_id):
+        # Percent-encoding is reversible, so "esp:1" and "esp/1" never share a file; plain IDs are unchanged
+        return os.path.join(self.root, quote(device_id, safe="") + FILE_SUFFIX)
+
+    def _load(self):
+        status_path = os.path.join(self.root, STATUS_FILE)
+        if os.path.exists(status_path):
+            with open(status_path) as f:
+                self.statuses = json.load(f)
+        crash_code = self.statuses.index(CRASH_STATUS) if CRASH_STATUS in self.statuses else -1
+
+        for name in sorted(os.listdir(self.root)):
+            if not name.endswith(FILE_SUFFIX):
+                continue
+            path = os.path.join(self.root, name)
+            usable = os.path.getsize(path) // RECORD_DTYPE.itemsize  # ignore a torn last record
+            records = np.fromfile(path, dtype=RECORD_DTYPE, count=usable)
+            records = records[np.argsort(records["timestamp"], kind="stable")]
+
+            series = DeviceSeries()
+            series.raw = Columns(series.raw.dtypes, capacity=max(1024, len(records) * 2))
+            series.raw.extend({"timestamp": records["timestamp"], "temperature": records["temperature"],
+                               "humidity": records["humidity"], "status": records["status"],
+                               "crashed": records["status"] == crash_code})
+            for rollup in series.rollups.values():
+                rollup.rebuild(series.raw)
+            self.devices[unquote(name[:-len(FILE_SUFFIX)])] = series
+
+    def _status_code(self, status):
+        status = str(status)
+        if status in self.statuses:
+            return self.statuses.index(status)
+        # The last free code is kept for "crash", which must stay distinguishable after a reload
+        free = MAX_STATUSES - len(self.statuses) - (CRASH_STATUS not in self.statuses)
+        if free <= 0 and status != CRASH_STATUS:
+            return OTHER_STATUS
+        statuses = self.statuses + [status]
+        path = os.path.join(self.root, STATUS_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(statuses, f)
+        os.replace(path + ".tmp", path)
+        self.statuses = statuses
+        return len(statuses) - 1
+
+    def append(self, device_id, reading, timestamp=None):
+        """Store one reading ({"status", "temperature", "humidity"}) for a device"""
+        timestamp = time.time() if timestamp is None else float(timestamp)
+        values = {metric: _as_float(reading.get(metric)) for metric in METRICS}
+        status = reading.get("status", "")
+        crashed = status == CRASH_STATUS
+
+        with self.lock:
+            code = self._status_code(status)
+            series = self.devices.get(device_id)
+            if series is None:
+                series = self.devices[device_id] = DeviceSeries()
+            series.append(timestamp, values, code, crashed)
+
+            record = np.array([(timestamp, values["temperature"], values["humidity"], code)], dtype=RECORD_DTYPE)
+            f = self.files.get(device_id)
+            if f is None:
+                f = self.files[device_id] = open(self._device_path(device_id), "ab")
+            f.write(record.tobytes())
+            f.flush()
+
+    def append_many(self, device_id, timestamps, readings):
+        """Store a batch of readings for one device with one vectorized update and one file write"""
+        with self.lock:
+            codes = [self._status_code(reading.get("status", "")) for reading in readings]
+            records = np.empty(len(readings), dtype=RECORD_DTYPE)
+            records["timestamp"] = timestamps
+            for metric in METRICS:
+                records[metric] = [_as_float(reading.get(metric)) for reading in readings]
+            records["status"] = codes
+            records = records[np.argsort(records["timestamp"], kind="stable")]
+
+            series = self.devices.get(device_id)
+            if series is None:
+                series = self.devices[device_id] = DeviceSeries()
+            crash_code = self.statuses.index(CRASH_STATUS) if CRASH_STATUS in self.statuses else -1
+            series.extend({"timestamp": records["timestamp"], "temperature": records["temperature"],
+                           "humidity": records["humidity"], "status": records["status"],
+                           "crashed": records["status"] == crash_code})
+
+            f = self.files.get(device_id)
+            if f is None:
+                f = self.files[device_id] = open(self._device_path(device_id), "ab")
+            f.write(records.tobytes())
+            f.flush()
+
+    def history(self, device_id, start, end, step=None):
+        """Downsampled series for [start, end] (epoch seconds) in buckets of `step` seconds"""
+        # float() accepts "inf" and "nan"; neither can be turned into buckets
+        if not all(math.isfinite(value) for value in (start, end, end - start, float(step or 0))):
+            raise ValueError("'from', 'to' and 'step' must be finite numbers")
+        if end <= start:
+            raise ValueError("'to' must be after 'from'")
+        # Never return more than MAX_POINTS buckets, whatever step was asked for
+        step = math.ceil(max(float(step or 0), (end - start) / MAX_POINTS, 1.0))
+        for width in sorted(ROLLUP_WIDTHS.values(), reverse=True):
+            if step > width:
+                step = math.ceil(step / width) * width
+                break
+        # Buckets are aligned to multiples of step so rollup buckets tile them exactly
+        origin = start // step * step
+
+        with self.lock:
+            series = self.devices.get(device_id)
+            if series is None:
+                raise KeyError(device_id)
+
+            # Use the coarsest precomputed level whose buckets tile the requested step
+            source = "raw"
+            for name, width in sorted(ROLLUP_WIDTHS.items(), key=lambda item: -item[1]):
+                if step % width == 0:
+                    source = name
+                    break
+
+            if source == "raw":
+                series.ensure_sorted()
+                times = series.raw["timestamp"]
+                lo, hi = np.searchsorted(times, [start, end], side="left")
+                window = {name: series.raw[name][lo:hi] for name in ("timestamp", "crashed") + METRICS}
+                times = window["timestamp"]
+                rows = _raw_aggregates(window)
+            else:
+                rollup = series.rollups[source]
+                buckets = rollup.columns["bucket"]
+                width = rollup.width
+                lo, hi = np.searchsorted(buckets, [start // width, math.ceil(end / width)], side="left")
+                times = buckets[lo:hi] * width
+                rows = {name: rollup.columns[name][lo:hi].copy() for name in rollup.columns.dtypes if name != "bucket"}
+
+        aggregated = _aggregate(rows, ((times - origin) // step).astype(np.int64))
+        result = {
+            "device_id": device_id,
+            "from": start,
+            "to": end,
+            "step": step,
+            "source": source,
+            "t": (origin + aggregated["group"] * step).tolist(),
+            "count": aggregated["count"].tolist(),
+            "crashes": aggregated["crashes"].tolist(),
+        }
+        for metric in METRICS:
+            n = aggregated[f"{metric}_n"]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                average = aggregated[f"{metric}_sum"] / n
+            result[metric] = {
+                "min": _json_floats(aggregated[f"{metric}_min"]),
+                "max": _json_floats(aggregated[f"{metric}_max"]),
+                "avg": _json_floats(average),
+            }
+        return result
+
+    def device_ids(self):
+        with self.lock:
+            return sorted(self.devices)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                device_id: {"readings": len(series.raw),
+                            **{f"{name}_buckets": len(rollup.columns) for name, rollup in series.rollups.items()}}
+                for device_id, series in self.devices.items()
+            }
+
+    def close(self):
+        with self.lock:
+            for f in self.files.values():
+                f.close()
+            self.files.clear()
@@ -1,41 +1,113 @@
 # backend/server.py
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 
+from request_metrics import RequestMetrics
+from sensor_service import DEFAULT_DEVICE, BatchError, create_service
+
 app = Flask(__name__)
 CORS(app)  # Allow frontend requests
 
-latest_data = {"status": "waiting", "temperature": 0, "humidity": 0}
-sos_status = False
+# Latest reading, SOS flag, history store and live updates behind one lock (see sensor_service.py);
+# api_server.py serves the same routes on an async server for production
+service = create_service()
+store = service.store
+live = service.live
+metrics = RequestMetrics()
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_latency(response):
+    if request.url_rule is not None:
+        metrics.observe(f"{request.method} {request.url_rule.rule}",
+                        (time.perf_counter() - g.request_start) * 1000)
+    return response
+
 
 @app.route("/data", methods=["POST"])
 def receive_data():
-    global latest_data
-    latest_data = request.json
-    print("📡 Data received:", latest_data)
+    reading = request.json
+    print("📡 Data received:", reading)
+    service.ingest(reading)
     return jsonify({"message": "Data received"}), 200
 
+@app.route("/data/batch", methods=["POST"])
+def receive_batch():
+    # {"readings": [{"device_id", "timestamp", "status", "temperature", "humidity"}, ...]}
+    try:
+        result = service.ingest_batch(request.get_json(silent=True))
+    except BatchError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result), 200
+
 @app.route("/latest", methods=["GET"])
 def get_latest_data():
-    return jsonify(latest_data)
+    device_id = request.args.get("device")
+    if device_id is None:
+        return jsonify(service.snapshot()[0])
+    state = service.device_state(device_id)
+    if state is None:
+        return jsonify({"error": "Unknown device"}), 404
+    return jsonify(state["reading"])
+
+@app.route("/devices/latest", methods=["GET"])
+def get_device_states():
+    return jsonify(service.device_state())
+
+@app.route("/events", methods=["GET"])
+def stream_events():
+    # Server-Sent Events: current state on connect, then every change as it happens
+    subscriber = live.subscribe()
+    return Response(live.stream(subscriber, service.initial_events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/events/stats", methods=["GET"])
+def get_event_stats():
+    return jsonify(live.get_stats())
+
+@app.route("/history", methods=["GET"])
+def get_history():
+    # /history?from=<epoch s>&to=<epoch s>&step=<s>&device=<id>; defaults to the last hour by minute
+    try:
+        end = float(request.args.get("to", time.time()))
+        start = float(request.args.get("from", end - 3600))
+        step = request.args.get("step", type=float)
+        return jsonify(store.history(request.args.get("device", DEFAULT_DEVICE), start, end, step))
+    except KeyError:
+        return jsonify({"error": "Unknown device"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/devices", methods=["GET"])
+def get_devices():
+    return jsonify(store.get_stats())
+
+@app.route("/metrics/latency", methods=["GET"])
+def get_latency():
+    return jsonify(metrics.snapshot())
 
 @app.route("/sos", methods=["GET"])
 def get_sos():
-    return jsonify({"sos": sos_status})
+    return jsonify({"sos": service.snapshot()[1]})
 
 @app.route("/sos/activate", methods=["POST"])
 def activate_sos():
-    global sos_status
-    sos_status = True
+    service.set_sos(True)
     print("🚨 SOS Activated manually!")
     return jsonify({"message": "SOS Activated"})
 
 @app.route("/sos/deactivate", methods=["POST"])
 def deactivate_sos():
-    global sos_status
-    sos_status = False
+    service.set_sos(False)
     print("✅ SOS Deactivated manually!")
     return jsonify({"message": "SOS Deactivated"})
 
 if __name__ == "__main__":
+    # Development server; use `python api_server.py` in production
     app.run(host="0.0.0.0", port=5000, debug=True)
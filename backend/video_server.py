@@ -1,13 +1,26 @@
 import os
+import sys
 import json
+import time
+import asyncio
+from collections import deque
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
+# The recorder lives next to camera_server.py in the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from camera_recorder import FrameRecorder
+from event_clips import ClipExtractor
+
 load_dotenv()
 SECRET_TOKEN = os.getenv("SECRET_TOKEN", "StrongPassword123")
+RECORD_DIR = os.getenv("RECORD_DIR")
+CLIP_DIR = os.getenv("CLIP_DIR")
+CLIP_PRE_SECONDS = float(os.getenv("CLIP_PRE_SECONDS", "10"))
+CLIP_POST_SECONDS = float(os.getenv("CLIP_POST_SECONDS", "5"))
 
 app = FastAPI()
 
@@ -28,28 +41,141 @@ async def get_index():
 # Serve static files (React build, etc.)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+VIEWER_QUEUE_SIZE = int(os.getenv("VIEWER_QUEUE_SIZE", "2"))
+# A viewer that cannot take one message within this many seconds is disconnected
+VIEWER_SEND_TIMEOUT = float(os.getenv("VIEWER_SEND_TIMEOUT", "5"))
+# A viewer with this many crash alerts still unsent is disconnected rather than lose any of them
+VIEWER_ALERT_BACKLOG = int(os.getenv("VIEWER_ALERT_BACKLOG", "100"))
+
+# Outbound priority classes, highest first
+PRIORITY_ALERT = 0   # crash alerts: queued, never dropped (the viewer is closed if they back up)
+PRIORITY_SENSOR = 1  # sensor readings: latest wins
+PRIORITY_VIDEO = 2   # frames and detections: bounded, oldest dropped under pressure
+PRIORITY_NAMES = ("alert", "sensor", "video")
+
+
+class ViewerChannel:
+    """Per-viewer outbound scheduler: one queue per priority class drained by its own writer task"""
+
+    def __init__(self, websocket: WebSocket, max_queue: int = VIEWER_QUEUE_SIZE):
+        self.websocket = websocket
+        self.queues = (deque(), deque(maxlen=1), deque(maxlen=max_queue))
+        self.ready = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+        self.closed = False
+        self.sent = [0, 0, 0]
+        self.dropped = [0, 0, 0]
+
+    def enqueue(self, message: str, priority: int = PRIORITY_VIDEO):
+        """Never blocks and never raises, so ingestion paths are isolated from slow viewers"""
+        if self.closed:
+            return
+        queue = self.queues[priority]
+        if priority == PRIORITY_ALERT and len(queue) >= VIEWER_ALERT_BACKLOG:
+            print(f"⚠️ Viewer has {len(queue)} unsent alerts, disconnecting")
+            self.close()
+            # Dropping the connection ends the viewer's receive loop, which unregisters it
+            asyncio.ensure_future(self.abort())
+            return
+        if len(queue) == queue.maxlen:
+            self.dropped[priority] += 1
+        queue.append(message)
+        self.ready.set()
+
+    def next_message(self):
+        for priority, queue in enumerate(self.queues):
+            if queue:
+                return priority, queue.popleft()
+        return None, None
+
+    async def run(self):
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                while True:
+                    # Re-check from the top after every send so an alert overtakes queued video
+                    priority, message = self.next_message()
+                    if message is None:
+                        break
+                    await asyncio.wait_for(self.websocket.send_text(message), VIEWER_SEND_TIMEOUT)
+                    self.sent[priority] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Viewer writer stopped: {e!r}")
+            self.closed = True
+            # Dropping the connection ends the viewer's receive loop, which unregisters it
+            await self.abort()
+
+    async def abort(self):
+        try:
+            await self.websocket.close(code=1011)
+        except Exception:
+            pass
+
+    def close(self):
+        self.closed = True
+        self.task.cancel()
+
+    def get_stats(self):
+        return {
+            "sent": dict(zip(PRIORITY_NAMES, self.sent)),
+            "dropped": dict(zip(PRIORITY_NAMES, self.dropped)),
+            "queued": dict(zip(PRIORITY_NAMES, (len(queue) for queue in self.queues))),
+            "closed": self.closed,
+        }
+
+
+def broadcast(message: str, priority: int):
+    for channel in list(channels.values()):
+        channel.enqueue(message, priority)
+
+
+# Optional footage archive; frames are decoded and written on the recorder's thread
+recorder = None
+if RECORD_DIR:
+    recorder = FrameRecorder(RECORD_DIR)
+    recorder.start()
+
+# Optional crash/SOS clips cut from an in-memory pre-roll of the camera
+clips = None
+if CLIP_DIR:
+    clips = ClipExtractor(CLIP_DIR, pre_seconds=CLIP_PRE_SECONDS, post_seconds=CLIP_POST_SECONDS)
+    clips.start()
+
 # Active connections
 senders = []
 viewers = []
+channels = {}  # viewer websocket -> ViewerChannel
 latest_sensor_data = {}
+# Late-joiner cache: last serialized video frame and detections, sent to new viewers at once
+latest_video_msg = None
+latest_detections_msg = None
 
 # ✅ ESP8266 posts sensor data here
 @app.post("/data")
 async def receive_sensor_data(request: Request):
     global latest_sensor_data
     body = await request.json()
+    previous_status = latest_sensor_data.get("status")
     latest_sensor_data = body
 
-    # Broadcast sensor data to all viewers
-    data_msg = json.dumps({"type": "sensor", "data": latest_sensor_data})
-    for viewer in viewers:
-        await viewer.send_text(data_msg)
+    # Alert and clip when the stream switches into crash, not on every crash report
+    if body.get("status") == "crash" and previous_status != "crash":
+        broadcast(json.dumps({"type": "alert", "alert": "crash", "data": body}), PRIORITY_ALERT)
+        if clips:
+            clips.trigger("crash", details=body)
+
+    # Queue sensor data for every viewer; their writer tasks do the sending
+    broadcast(json.dumps({"type": "sensor", "data": latest_sensor_data}), PRIORITY_SENSOR)
 
     return {"status": "ok", "received": latest_sensor_data}
 
 # ✅ WebSocket: both sender (YOLO) & viewers (frontend)
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
+    global latest_video_msg, latest_detections_msg
     role = websocket.query_params.get("role")
     token = websocket.query_params.get("token")
 
@@ -66,20 +192,38 @@ async def websocket_endpoint(websocket: WebSocket):
             print("📹 Sender connected")
             while True:
                 frame = await websocket.receive_text()
-                # Forward frame to all viewers
-                data_msg = json.dumps({"type": "video", "frame": frame})
-                for viewer in viewers:
-                    await viewer.send_text(data_msg)
+                if frame.startswith("{"):
+                    # Detection metadata for the next frame; viewers draw the overlay
+                    try:
+                        metadata = json.loads(frame)
+                    except ValueError:
+                        continue
+                    metadata["type"] = "detections"
+                    data_msg = latest_detections_msg = json.dumps(metadata)
+                else:
+                    # Forward frame to all viewers
+                    data_msg = latest_video_msg = json.dumps({"type": "video", "frame": frame})
+                    now = time.time() * 1000
+                    if recorder:
+                        recorder.record("camera-0", now, frame)
+                    if clips:
+                        clips.add_frame("camera-0", now, frame)
+                broadcast(data_msg, PRIORITY_VIDEO)
 
         elif role == "viewer":
             viewers.append(websocket)
+            channel = channels[websocket] = ViewerChannel(websocket)
             print("👀 Viewer connected")
 
-            # On connect, send last known sensor data
+            # Instant first paint from the cache instead of waiting for the next frame
+            if latest_detections_msg:
+                channel.enqueue(latest_detections_msg)
+            if latest_video_msg:
+                channel.enqueue(latest_video_msg)
+
+            # On connect, send last known sensor data (ahead of the cached frame)
             if latest_sensor_data:
-                await websocket.send_text(
-                    json.dumps({"type": "sensor", "data": latest_sensor_data})
-                )
+                channel.enqueue(json.dumps({"type": "sensor", "data": latest_sensor_data}), PRIORITY_SENSOR)
 
             while True:
                 # Keep connection alive
@@ -92,3 +236,30 @@ async def websocket_endpoint(websocket: WebSocket):
             senders.remove(websocket)
         if role == "viewer" and websocket in viewers:
             viewers.remove(websocket)
+        channel = channels.pop(websocket, None)
+        if channel:
+            channel.close()
+
+
+# ✅ Manual or remote clip trigger (backend/server.py forwards crash and SOS events here)
+@app.post("/clips")
+async def trigger_clip(request: Request):
+    if not clips:
+        return {"status": "disabled"}
+    body = await request.json()
+    return clips.trigger(str(body.get("reason", "manual")), details=body.get("details"))
+
+
+@app.get("/clips")
+async def list_clips():
+    return clips.clips() if clips else []
+
+
+@app.get("/stats")
+async def get_stats():
+    return {
+        "senders": len(senders),
+        "recorder": recorder.get_stats() if recorder else None,
+        "clips": clips.get_stats() if clips else None,
+        "viewers": [channel.get_stats() for channel in channels.values()],
+    }
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite for the Camera Relay and Sensor APIs
+Runs on localhost only: relay fan-out throughput and latency across frame
+sizes, viewer and camera counts, CameraSender encode fps, and Flask vs
+async sensor API throughput. Results go to JSON, and --compare prints the
+change against a previous run so regressions show up between versions
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from argparse import Namespace
+
+from frame_sources import SyntheticSource
+import relay_loadtest
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(ROOT_DIR, 'backend')
+
+# Full matrix, and a quick one for a smoke run on a laptop or CI
+PRESETS = {
+    'full': {
+        'frame_sizes': [10_000, 50_000, 200_000],
+        'viewers': [1, 10, 50],
+        'cameras': [1, 4],
+        'fanout_duration': 5,
+        'resolutions': [(640, 360), (1280, 720), (1920, 1080)],
+        'encode_duration': 3,
+        'api_servers': ['flask', 'async'],
+        'api_batch_sizes': [1, 50],
+        'api_duration': 10,
+    },
+    'quick': {
+        'frame_sizes': [20_000],
+        'viewers': [1, 10],
+        'cameras': [1],
+        'fanout_duration': 2,
+        'resolutions': [(1280, 720)],
+        'encode_duration': 1,
+        'api_servers': ['flask', 'async'],
+        'api_batch_sizes': [1],
+        'api_duration': 3,
+    },
+}
+
+# Metrics compared between runs, and whether higher is better
+COMPARED = {
+    'frames_per_sec': True,
+    'delivery_ratio': True,
+    'latency_p50_ms': False,
+    'latency_p99_ms': False,
+    'fps': True,
+    'total_per_sec': True,
+    'readings_per_sec': True,
+}
+
+
+def bench_fanout(preset: dict, args) -> list:
+    """Single relay worker (one CameraWebSocketServer) driven by relay_loadtest's senders and viewers"""
+    results = []
+    for frame_size in preset['frame_sizes']:
+        for cameras in preset['cameras']:
+            for viewers in preset['viewers']:
+                level = Namespace(cameras=cameras, viewers=viewers, fps=args.fps, frame_size=frame_size,
+                                  duration=preset['fanout_duration'], warmup=1, client_procs=args.client_procs,
+                                  host='127.0.0.1', port=args.port, token='StrongPassword123')
+                result = relay_loadtest.run_level(level, workers=1)
+                result.update(frame_size=frame_size, cameras=cameras, viewers=viewers)
+                results.append(result)
+                print(f"  fanout  {frame_size // 1000:>4} KB {cameras:>3} cams {viewers:>4} viewers  "
+                      f"{result['frames_per_sec']:>8.0f} frames/s  {result['delivery_ratio']:>5.0%}  "
+                      f"p50 {result['latency_p50_ms']:>6.1f} ms  p99 {result['latency_p99_ms']:>6.1f} ms")
+    return results
+
+
+def bench_encode(preset: dict, args) -> list:
+    """CameraSender.encode_frame (JPEG + base64, as text senders ship it) and the tile codec on synthetic frames"""
+    from camera_sender import CameraSender
+    from frame_protocol import CODEC_JPEG, CODEC_TILES, FORMAT_BINARY, FORMAT_TEXT
+
+    results = []
+    for width, height in preset['resolutions']:
+        source = SyntheticSource(width=width, height=height, realtime=False)
+        frames = [source.read()[1] for _ in range(30)]
+        for codec in (CODEC_JPEG, CODEC_TILES):
+            transport = FORMAT_TEXT if codec == CODEC_JPEG else FORMAT_BINARY
+            sender = CameraSender('ws://127.0.0.1:0', 'token', 'admin', 'bench', width=width, height=height,
+                                  enable_detection=False, transport=transport, codec=codec)
+            device = sender.devices[0]
+            if codec == CODEC_JPEG:
+                encode = sender.encode_frame  # avg_bytes is then the base64 text message
+            else:
+                # Keyframes every keyframe_interval seconds as in a live sender, tile updates in between
+                encode = lambda frame: sender.build_message(device, frame, time.time(), count + 1)
+            count = size = 0
+            encode(frames[0])  # warm up the encoder
+            start = time.perf_counter()
+            while time.perf_counter() - start < preset['encode_duration']:
+                size += len(encode(frames[count % len(frames)]))
+                count += 1
+            elapsed = time.perf_counter() - start
+            result = {'resolution': f"{width}x{height}", 'encoder': sender.encoder.backend, 'codec': codec,
+                      'fps': count / elapsed, 'ms_per_frame': elapsed * 1000 / count, 'avg_bytes': size // count}
+            results.append(result)
+            print(f"  encode  {result['resolution']:>10} {result['encoder']:>10} {codec:>5}  "
+                  f"{result['fps']:>8.1f} fps  {result['ms_per_frame']:>6.2f} ms/frame  {result['avg_bytes']:>8} bytes")
+    return results
+
+
+def bench_api(preset: dict, args) -> list:
+    """Sensor API throughput through backend/api_benchmark.py (Flask dev server vs async server)"""
+    sys.path.insert(0, BACKEND_DIR)
+    import api_benchmark
+
+    results = []
+    api_args = Namespace(devices=args.devices, dashboards=args.dashboards, interval=0.0,
+                         duration=preset['api_duration'], client_procs=args.client_procs, port=args.port + 1)
+    for server in preset['api_servers']:
+        for batch_size in preset['api_batch_sizes']:
+            summary = api_benchmark.run_server(server, batch_size, api_args)
+            results.append(summary)
+            print(f"  api     {server:>8} batch {batch_size:>4}  {summary['total_per_sec']:>8.0f} req/s  "
+                  f"{summary['readings_per_sec']:>8.0f} readings/s  errors {summary['errors']}")
+    return results
+
+
+SUITES = {'fanout': bench_fanout, 'encode': bench_encode, 'api': bench_api}
+
+# Parameters identifying a result within its suite, for --compare
+RESULT_KEYS = {
+    'fanout': ('frame_size', 'cameras', 'viewers'),
+    'encode': ('resolution', 'encoder', 'codec'),
+    'api': ('server', 'batch_size'),
+}
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'commit': commit or None,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(previous: dict, current: dict):
+    """Print the relative change of every shared metric; flag regressions beyond the threshold"""
+    print(f"\nCompared with {previous['environment'].get('commit')} ({previous['environment'].get('timestamp')}):")
+    for suite, results in current['suites'].items():
+        keys = RESULT_KEYS[suite]
+        baseline = {tuple(r.get(k) for k in keys): r for r in previous.get('suites', {}).get(suite, [])}
+        for result in results:
+            old = baseline.get(tuple(result.get(k) for k in keys))
+            if not old:
+                continue
+            changes = []
+            for metric, higher_is_better in COMPARED.items():
+                if metric in result and old.get(metric):
+                    change = (result[metric] - old[metric]) / old[metric]
+                    worse = -change if higher_is_better else change
+                    flag = ' ⚠️' if worse > current['config']['threshold'] else ''
+                    changes.append(f"{metric} {change:+.0%}{flag}")
+            label = ' '.join(f"{k}={result.get(k)}" for k in keys)
+            print(f"  {suite:<7} {label:<40} {', '.join(changes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Camera relay and sensor API benchmark suite')
+    parser.add_argument('--suites', nargs='+', choices=list(SUITES), default=list(SUITES),
+                        help='Suites to run, in order')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='full')
+    parser.add_argument('--fps', type=float, default=15, help='Frames per second per camera in the fan-out suite')
+    parser.add_argument('--devices', type=int, default=100, help='Simulated devices in the API suite')
+    parser.add_argument('--dashboards', type=int, default=20, help='Simulated dashboards in the API suite')
+    parser.add_argument('--client-procs', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='Client processes generating load')
+    parser.add_argument('--port', type=int, default=7890, help='Relay port (the API suite uses port + 1)')
+    parser.add_argument('--output', default='benchmark-results.json', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Previous results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative change counted as a regression when comparing')
+    args = parser.parse_args()
+
+    preset = PRESETS[args.preset]
+    report = {'environment': environment(), 'config': dict(vars(args), matrix=preset), 'suites': {}}
+    print(f"Benchmarks ({args.preset}) at {report['environment']['commit']} on {report['environment']['cpus']} CPUs")
+    for suite in args.suites:
+        print(f"{suite}:")
+        report['suites'][suite] = SUITES[suite](preset, args)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
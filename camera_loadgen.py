@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Load Generator for the Camera Server
+Hundreds of virtual senders replay frames from a source (synthetic pattern,
+video file or image directory) on a fixed schedule while virtual viewers
+subscribe to them; reports end-to-end latency percentiles, throughput and
+drop rates. Needs no camera, so it runs on CI boxes
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import websockets
+
+from frame_protocol import pack_frame, unpack_frame
+from frame_sources import SYNTHETIC, open_source
+from jpeg_encoder import JpegEncoder
+from relay_loadtest import percentile, wait_for_port
+
+
+def encode_clip(source: str, seed: int, frames: int, width: int, height: int, quality: int) -> list:
+    """Pre-encode a short loop per sender so the load generator spends its CPU on sockets"""
+    if source == SYNTHETIC:
+        source = f"{SYNTHETIC}:{seed}"
+    capture = open_source(source, width, height, realtime=False)
+    encoder = JpegEncoder(quality=quality)
+    clip = []
+    try:
+        for _ in range(frames):
+            ok, frame = capture.read()
+            if not ok:
+                break
+            clip.append(encoder.encode(frame))
+    finally:
+        capture.release()
+    if not clip:
+        raise ValueError(f"Source {source} produced no frames")
+    return clip
+
+
+async def run_sender(url: str, camera_id: str, fps: float, clip: list, start_at: float, stop_at: float,
+                     result: dict):
+    async with websockets.connect(f"{url}&user_type=sender&camera_id={camera_id}&format=binary",
+                                  max_size=None) as ws:
+        # Deterministic timing: frame n is due at start_at + n / fps, however late the loop runs
+        await asyncio.sleep(max(0.0, start_at - time.monotonic()))
+        sequence = 0
+        while True:
+            due = start_at + sequence / fps
+            now = time.monotonic()
+            if due >= stop_at:
+                break
+            if due > now:
+                await asyncio.sleep(due - now)
+            elif now - due > 1.0 / fps:
+                result['late'] += 1  # the generator itself fell behind; its numbers are suspect
+            sequence += 1
+            await ws.send(pack_frame(camera_id, sequence, clip[sequence % len(clip)]))
+            result['sent'] += 1
+
+
+async def run_viewer(url: str, cameras: list, measure_from: float, measure_to: float, result: dict):
+    last_sequence = {}
+    async with websockets.connect(f"{url}&format=binary&cameras={','.join(cameras)}", max_size=None) as ws:
+        while time.monotonic() < measure_to:
+            try:
+                message = await asyncio.wait_for(ws.recv(), timeout=max(0.01, measure_to - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+            if not isinstance(message, bytes):
+                continue
+            header, _ = unpack_frame(message)
+            # Gaps in a camera's sequence are frames the server dropped for this viewer
+            previous = last_sequence.get(header.camera_id)
+            last_sequence[header.camera_id] = header.sequence
+            if time.monotonic() < measure_from:
+                continue
+            if previous is not None and header.sequence > previous + 1:
+                result['dropped'] += header.sequence - previous - 1
+            result['frames'] += 1
+            result['bytes'] += len(message)
+            result['latency_ms'].append(time.time() * 1000 - header.timestamp)
+
+
+async def run_clients(shard: dict) -> dict:
+    start = time.monotonic()
+    measure_from = start + shard['warmup']
+    measure_to = measure_from + shard['duration']
+    result = {'sent': 0, 'late': 0, 'frames': 0, 'bytes': 0, 'dropped': 0, 'latency_ms': []}
+
+    viewers = [asyncio.ensure_future(run_viewer(shard['url'], cameras, measure_from, measure_to, result))
+               for cameras in shard['subscriptions']]
+    # Senders start after viewers subscribed, staggered so frames do not all land in the same tick
+    start_at = time.monotonic() + 0.5
+    senders = [
+        asyncio.ensure_future(run_sender(shard['url'], camera_id, shard['fps'], shard['clips'][i % len(shard['clips'])],
+                                         start_at + i / len(shard['cameras']) / shard['fps'], measure_to, result))
+        for i, camera_id in enumerate(shard['cameras'])
+    ]
+    outcomes = await asyncio.gather(*viewers, *senders, return_exceptions=True)
+    result['errors'] = sum(1 for outcome in outcomes if isinstance(outcome, Exception))
+    return result
+
+
+def client_main(shard: dict) -> dict:
+    # Each client process encodes its own clips from the shared source settings
+    shard['clips'] = [encode_clip(shard['source'], seed, shard['clip_frames'], shard['width'], shard['height'],
+                                  shard['quality'])
+                      for seed in range(min(len(shard['cameras']), shard['distinct_clips']) or 1)]
+    return asyncio.run(run_clients(shard))
+
+
+def subscriptions(viewer: int, cameras: int, per_viewer: int) -> list:
+    """Camera IDs a viewer subscribes to: a window of per_viewer cameras starting at its own offset"""
+    per_viewer = min(per_viewer or cameras, cameras)
+    return [f"load-cam-{(viewer + i) % cameras}" for i in range(per_viewer)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Camera server load generator')
+    parser.add_argument('--url', help='Existing server, e.g. ws://127.0.0.1:7777 (default: start camera_relay.py)')
+    parser.add_argument('--relay-workers', type=int, default=1, help='Workers for the relay started without --url')
+    parser.add_argument('--senders', type=int, default=100, help='Virtual cameras')
+    parser.add_argument('--viewers', type=int, default=200, help='Virtual viewers')
+    parser.add_argument('--cameras-per-viewer', type=int, default=4,
+                        help='Cameras each viewer subscribes to (0 = all)')
+    parser.add_argument('--source', default=SYNTHETIC, help='synthetic, a video file or an image directory')
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=360)
+    parser.add_argument('--quality', type=int, default=70)
+    parser.add_argument('--clip-frames', type=int, default=30, help='Frames encoded per clip and looped')
+    parser.add_argument('--distinct-clips', type=int, default=4, help='Different clips per client process')
+    parser.add_argument('--fps', type=float, default=10, help='Frames per second per sender')
+    parser.add_argument('--duration', type=float, default=10, help='Measurement window in seconds')
+    parser.add_argument('--warmup', type=float, default=2, help='Seconds before measuring')
+    parser.add_argument('--client-procs', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='Client processes generating load')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7791)
+    parser.add_argument('--token', default='StrongPassword123')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+    if not args.fps > 0:
+        parser.error('--fps must be positive')
+
+    relay = None
+    url = args.url
+    if not url:
+        relay = subprocess.Popen(
+            [sys.executable, 'camera_relay.py', '--workers', str(args.relay_workers), '--host', args.host,
+             '--port', str(args.port), '--token', args.token,
+             '--broker', f"unix:///tmp/camera-loadgen-{os.getpid()}.sock"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        url = f"ws://{args.host}:{args.port}"
+    try:
+        if relay:
+            wait_for_port(args.host, args.port)
+            time.sleep(1.0)  # let every worker attach to the broker
+
+        shards = []
+        for i in range(args.client_procs):
+            shards.append({
+                'url': f"{url}?token={args.token}&role=admin",
+                'cameras': [f"load-cam-{c}" for c in range(i, args.senders, args.client_procs)],
+                'subscriptions': [subscriptions(v, args.senders, args.cameras_per_viewer)
+                                  for v in range(i, args.viewers, args.client_procs)],
+                'source': args.source,
+                'width': args.width,
+                'height': args.height,
+                'quality': args.quality,
+                'clip_frames': args.clip_frames,
+                'distinct_clips': args.distinct_clips,
+                'fps': args.fps,
+                'warmup': args.warmup,
+                'duration': args.duration
+            })
+
+        per_viewer = min(args.cameras_per_viewer or args.senders, args.senders)
+        print(f"{args.senders} senders x {args.fps:g} fps ({args.width}x{args.height} from {args.source}), "
+              f"{args.viewers} viewers x {per_viewer} cameras, {args.duration:g}s")
+        with multiprocessing.get_context('spawn').Pool(args.client_procs) as pool:
+            results = pool.map(client_main, shards)
+    finally:
+        if relay:
+            relay.terminate()
+            relay.wait(timeout=10)
+
+    frames = sum(r['frames'] for r in results)
+    dropped = sum(r['dropped'] for r in results)
+    latency = [sample for r in results for sample in r['latency_ms']]
+    offered = args.senders * args.fps
+    summary = {
+        'offered_frames_per_sec': offered,
+        'sent_frames_per_sec': sum(r['sent'] for r in results) / (args.warmup + args.duration),
+        'delivered_frames_per_sec': frames / args.duration,
+        'expected_deliveries_per_sec': args.viewers * per_viewer * args.fps,
+        'mbytes_per_sec': sum(r['bytes'] for r in results) / args.duration / 1e6,
+        'drop_rate': dropped / (frames + dropped) if frames + dropped else 0.0,
+        'late_sends': sum(r['late'] for r in results),
+        'connection_errors': sum(r['errors'] for r in results),
+        'latency_p50_ms': percentile(latency, 0.5),
+        'latency_p95_ms': percentile(latency, 0.95),
+        'latency_p99_ms': percentile(latency, 0.99),
+        'latency_max_ms': max(latency) if latency else 0.0
+    }
+
+    print(f"  delivered:  {summary['delivered_frames_per_sec']:.0f} frames/s of "
+          f"{summary['expected_deliveries_per_sec']:.0f} expected ({summary['mbytes_per_sec']:.1f} MB/s)")
+    print(f"  dropped:    {summary['drop_rate']:.2%} of viewer deliveries")
+    print(f"  latency:    p50 {summary['latency_p50_ms']:.1f} ms, p95 {summary['latency_p95_ms']:.1f} ms, "
+          f"p99 {summary['latency_p99_ms']:.1f} ms, max {summary['latency_max_ms']:.1f} ms")
+    if summary['late_sends'] or summary['connection_errors']:
+        print(f"  ⚠️ generator: {summary['late_sends']} late sends, {summary['connection_errors']} connection errors "
+              f"(add --client-procs or lower the load)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'results': summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
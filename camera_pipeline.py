@@ -0,0 +1,186 @@
+"""
+Pipeline Building Blocks for Camera Sender
+Bounded ring buffers that drop stale frames, per-stage latency counters and
+the change detector that gates transmission of static scenes
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Hashable, Optional
+
+import numpy as np
+
+
+class FrameRing:
+    """Thread-safe bounded buffer; when full the oldest item is dropped (and handed to on_drop)
+
+    With a key function the capacity applies per key and get() takes the keys in turn, so a busy
+    camera never pushes another camera's frames out of a shared ring
+    """
+
+    def __init__(self, capacity: int = 2, on_put: Optional[Callable[[], None]] = None,
+                 on_drop: Optional[Callable[[Any], None]] = None, key: Optional[Callable[[Any], Hashable]] = None):
+        self.capacity = capacity
+        self.key = key
+        self.queues: OrderedDict = OrderedDict()  # key -> deque of items; the first key is served next
+        self.condition = threading.Condition()
+        self.on_put = on_put
+        self.on_drop = on_drop
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item: Any):
+        evicted = None
+        key = self.key(item) if self.key else None
+        with self.condition:
+            items = self.queues.get(key)
+            if items is None:
+                items = self.queues[key] = deque(maxlen=self.capacity)
+            if len(items) == self.capacity:
+                self.dropped += 1
+                evicted = items[0]
+            items.append(item)
+            self.condition.notify()
+        if evicted is not None and self.on_drop:
+            self.on_drop(evicted)
+        if self.on_put:
+            self.on_put()
+
+    def _pop(self) -> Any:
+        if not self.queues:
+            return None
+        key, items = next(iter(self.queues.items()))
+        item = items.popleft()
+        if items:
+            self.queues.move_to_end(key)
+        else:
+            del self.queues[key]
+        return item
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """Pop the oldest item (of the next key in turn), waiting up to timeout; returns None on timeout or close"""
+        with self.condition:
+            if not self.queues and not self.closed:
+                self.condition.wait(timeout)
+            return self._pop()
+
+    def get_nowait(self) -> Any:
+        with self.condition:
+            return self._pop()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __len__(self):
+        return sum(len(items) for items in self.queues.values())
+
+
+class StageStats:
+    """Latency counters for one pipeline stage"""
+
+    def __init__(self, name: str, window: int = 100):
+        self.name = name
+        self.samples: deque = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def time(self):
+        """Context manager recording the duration of the enclosed block"""
+        return _StageTimer(self)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            recent = sorted(self.samples)
+            count = self.count
+            total = self.total
+            peak = self.max
+        return {
+            'count': count,
+            'avg_ms': total / count * 1000 if count else 0.0,
+            'p50_ms': recent[len(recent) // 2] * 1000 if recent else 0.0,
+            'p95_ms': recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000 if recent else 0.0,
+            'max_ms': peak * 1000
+        }
+
+
+class _StageTimer:
+    __slots__ = ('stats', 'start')
+
+    def __init__(self, stats: StageStats):
+        self.stats = stats
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.record(time.perf_counter() - self.start)
+        return False
+
+
+class ChangeDetector:
+    """Cheap scene-change test on a subsampled grayscale copy of the frame"""
+
+    def __init__(self, sensitivity: float = 0.005, pixel_threshold: int = 15,
+                 keepalive: float = 2.0, sample_width: int = 80):
+        self.sensitivity = sensitivity  # fraction of sampled pixels that must change
+        self.pixel_threshold = pixel_threshold  # grayscale delta counted as a change
+        self.keepalive = keepalive  # seconds between frames sent for an unchanged scene
+        self.sample_width = sample_width
+
+        self.reference: Optional[np.ndarray] = None
+        self.last_sent = 0.0
+        self.last_change = 0.0
+        self.suppressed = 0
+        self.keepalives = 0
+
+    def sample(self, frame: np.ndarray) -> np.ndarray:
+        step = max(1, frame.shape[1] // self.sample_width)
+        small = frame[::step, ::step]
+        if small.ndim == 3:
+            return small.mean(axis=2, dtype=np.float32)
+        return small.astype(np.float32)
+
+    def should_send(self, frame: np.ndarray, now: Optional[float] = None) -> bool:
+        """True if the scene changed since the last sent frame or a keepalive is due"""
+        now = time.monotonic() if now is None else now
+        gray = self.sample(frame)
+
+        # Compare against the last *sent* frame so slow drift still accumulates into a change
+        if self.reference is None or self.reference.shape != gray.shape:
+            changed = True
+        else:
+            changed_fraction = np.count_nonzero(np.abs(gray - self.reference) > self.pixel_threshold) / gray.size
+            self.last_change = changed_fraction
+            changed = changed_fraction >= self.sensitivity
+
+        if not changed and now - self.last_sent < self.keepalive:
+            self.suppressed += 1
+            return False
+
+        if not changed:
+            self.keepalives += 1
+        self.reference = gray
+        self.last_sent = now
+        return True
+
+    def snapshot(self) -> dict:
+        return {
+            'suppressed': self.suppressed,
+            'keepalives': self.keepalives,
+            'last_change': round(float(self.last_change), 4),
+            'sensitivity': self.sensitivity
+        }
@@ -0,0 +1,278 @@
+"""
+Frame Recorder for Camera System
+Appends each camera's JPEG frames to rolling segment files from a dedicated
+writer thread, with a compact timestamp -> offset index per segment and
+memory-mapped, zero-copy playback
+"""
+
+import base64
+import logging
+import mmap
+import os
+import queue
+import re
+import struct
+import threading
+import time
+from bisect import bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Segment record: timestamp (ms since epoch), JPEG length, then the JPEG bytes
+RECORD = struct.Struct('!dI')
+# Index entry: timestamp (ms since epoch), offset of the record in the segment file
+INDEX_ENTRY = struct.Struct('!dQ')
+INDEX_DTYPE = np.dtype([('timestamp', '>f8'), ('offset', '>u8')])
+
+SEGMENT_SUFFIX = '.seg'
+INDEX_SUFFIX = '.idx'
+
+
+def camera_directory(root: str, camera_id: str) -> str:
+    """Filesystem-safe directory for a camera's segments"""
+    return os.path.join(root, re.sub(r'[^A-Za-z0-9_.-]', '_', camera_id))
+
+
+def frame_jpeg(frame):
+    """JPEG bytes from raw bytes, base64 text or an object with a .jpeg property"""
+    jpeg = getattr(frame, 'jpeg', frame)
+    if isinstance(jpeg, str):
+        jpeg = base64.b64decode(jpeg)
+    return jpeg
+
+
+class SegmentWriter:
+    """Open segment and index files for one camera"""
+
+    def __init__(self, directory: str, start: float):
+        self.start = start
+        base = os.path.join(directory, f"{int(start):013d}")
+        self.path = base + SEGMENT_SUFFIX
+        self.data = open(self.path, 'ab')
+        self.index = open(base + INDEX_SUFFIX, 'ab')
+        self.size = self.data.tell()
+
+    def append(self, records: List[Tuple[float, bytes]]):
+        """Write a batch of frames with one bulk write per file"""
+        data_chunks = []
+        index_chunks = []
+        offset = self.size
+        for timestamp, jpeg in records:
+            index_chunks.append(INDEX_ENTRY.pack(timestamp, offset))
+            data_chunks.append(RECORD.pack(timestamp, len(jpeg)))
+            data_chunks.append(jpeg)
+            offset += RECORD.size + len(jpeg)
+        # Data before index, so every index entry a reader sees points at flushed data
+        self.data.write(b''.join(data_chunks))
+        self.data.flush()
+        self.index.write(b''.join(index_chunks))
+        self.index.flush()
+        self.size = offset
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+class FrameRecorder:
+    """Records frames off the relay's hot path through a bounded queue and a writer thread"""
+
+    def __init__(self, root: str, segment_bytes: int = 64 * 1024 * 1024, segment_seconds: float = 300,
+                 max_bytes_per_camera: int = 2 * 1024 * 1024 * 1024, max_age: Optional[float] = 7 * 24 * 3600,
+                 queue_size: int = 512, batch_size: int = 64):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.max_bytes_per_camera = max_bytes_per_camera
+        self.max_age = max_age
+        self.batch_size = batch_size
+
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.writers: Dict[str, SegmentWriter] = {}
+        self.thread: Optional[threading.Thread] = None
+        self.running = False
+
+        # Statistics
+        self.recorded = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self.segments_deleted = 0
+
+    def start(self):
+        os.makedirs(self.root, exist_ok=True)
+        self.running = True
+        self.thread = threading.Thread(target=self._write_loop, name='recorder', daemon=True)
+        self.thread.start()
+        logger.info(f"🎞️ Recording frames to {self.root}")
+
+    def close(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=5.0)
+        for writer in self.writers.values():
+            writer.close()
+        self.writers.clear()
+
+    def record(self, camera_id: str, timestamp: float, frame) -> bool:
+        """Queue a frame without blocking; `frame` is JPEG bytes, base64 text or an object with .jpeg"""
+        try:
+            self.queue.put_nowait((camera_id, timestamp, frame))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _write_loop(self):
+        while self.running or not self.queue.empty():
+            try:
+                batch = [self.queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            by_camera: Dict[str, List[Tuple[float, bytes]]] = {}
+            for camera_id, timestamp, frame in batch:
+                # Base64 frames are decoded here rather than on the relay's event loop
+                by_camera.setdefault(camera_id, []).append((timestamp, frame_jpeg(frame)))
+
+            for camera_id, records in by_camera.items():
+                try:
+                    self._write_camera(camera_id, records)
+                except OSError as e:
+                    logger.error(f"Error recording camera {camera_id}: {e}")
+
+    def _write_camera(self, camera_id: str, records: List[Tuple[float, bytes]]):
+        pending = []
+        for timestamp, jpeg in records:
+            writer = self.writers.get(camera_id)
+            if writer and (writer.size >= self.segment_bytes
+                           or timestamp - writer.start >= self.segment_seconds * 1000):
+                if pending:
+                    writer.append(pending)
+                    pending = []
+                writer.close()
+                writer = None
+                self.apply_retention(camera_id)
+            if writer is None:
+                directory = camera_directory(self.root, camera_id)
+                os.makedirs(directory, exist_ok=True)
+                writer = self.writers[camera_id] = SegmentWriter(directory, timestamp)
+            pending.append((timestamp, jpeg))
+            self.recorded += 1
+            self.bytes_written += RECORD.size + len(jpeg)
+        if pending:
+            self.writers[camera_id].append(pending)
+
+    def apply_retention(self, camera_id: str):
+        """Delete a camera's oldest closed segments beyond the size or age limit"""
+        directory = camera_directory(self.root, camera_id)
+        current = self.writers.get(camera_id)
+        segments = sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+        sizes = {name: os.path.getsize(os.path.join(directory, name)) for name in segments}
+        total = sum(sizes.values())
+        cutoff = time.time() - self.max_age if self.max_age else None
+
+        for name in segments:
+            path = os.path.join(directory, name)
+            if current and path == current.path:
+                break
+            too_big = total > self.max_bytes_per_camera
+            too_old = cutoff is not None and os.path.getmtime(path) < cutoff
+            if not (too_big or too_old):
+                break
+            os.remove(path)
+            index_path = path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX
+            if os.path.exists(index_path):
+                os.remove(index_path)
+            total -= sizes[name]
+            self.segments_deleted += 1
+
+    def get_stats(self) -> dict:
+        return {
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'queued': self.queue.qsize(),
+            'bytes_written': self.bytes_written,
+            'segments_deleted': self.segments_deleted
+        }
+
+
+class FrameArchive:
+    """Read side: O(log n) time seeks and zero-copy frame views over memory-mapped segments"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def cameras(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+    def segment_starts(self, camera_id: str) -> Tuple[List[float], List[str]]:
+        directory = camera_directory(self.root, camera_id)
+        if not os.path.isdir(directory):
+            return [], []
+        names = sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+        return [float(name[:-len(SEGMENT_SUFFIX)]) for name in names], [os.path.join(directory, n) for n in names]
+
+    @staticmethod
+    def _load_index(segment_path: str) -> np.ndarray:
+        with open(segment_path[:-len(SEGMENT_SUFFIX)] + INDEX_SUFFIX, 'rb') as f:
+            raw = f.read()
+        # Ignore a trailing partial entry from a write in progress
+        usable = len(raw) - len(raw) % INDEX_ENTRY.size
+        return np.frombuffer(raw[:usable], dtype=INDEX_DTYPE)
+
+    @staticmethod
+    def _map(segment_path: str) -> Optional[mmap.mmap]:
+        with open(segment_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read_range(self, camera_id: str, start: float, end: float) -> Iterator[Tuple[float, memoryview]]:
+        """Yield (timestamp, JPEG view) for frames with start <= timestamp <= end, in order"""
+        starts, paths = self.segment_starts(camera_id)
+        first = max(0, bisect_right(starts, start) - 1)
+
+        for i in range(first, len(paths)):
+            if starts[i] > end:
+                break
+            index = self._load_index(paths[i])
+            if not len(index):
+                continue
+            lo = int(np.searchsorted(index['timestamp'], start, side='left'))
+            hi = int(np.searchsorted(index['timestamp'], end, side='right'))
+            if lo >= hi:
+                continue
+
+            mapped = self._map(paths[i])
+            if mapped is None:
+                continue
+            view = memoryview(mapped)
+            for timestamp, offset in index[lo:hi].tolist():
+                _, length = RECORD.unpack_from(view, offset)
+                body = offset + RECORD.size
+                if body + length > len(view):
+                    break  # frame still being written
+                yield timestamp, view[body:body + length]
+
+    def frame_at(self, camera_id: str, timestamp: float) -> Optional[Tuple[float, memoryview]]:
+        """The last frame recorded at or before `timestamp`"""
+        starts, paths = self.segment_starts(camera_id)
+        i = bisect_right(starts, timestamp) - 1
+        while i >= 0:
+            index = self._load_index(paths[i])
+            position = int(np.searchsorted(index['timestamp'], timestamp, side='right')) - 1
+            if position >= 0:
+                frame_time = float(index['timestamp'][position])
+                return next(self.read_range(camera_id, frame_time, frame_time), None)
+            i -= 1
+        return None
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Multi-Process Relay for Camera System
+Runs several CameraWebSocketServer workers that share one port and exchange
+sender frames over a pub/sub bus, so senders and viewers can attach to any worker
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import struct
+import sys
+from typing import Callable, List, Optional, Set, Tuple, Union
+
+from camera_recorder import FrameRecorder
+from camera_server import CameraWebSocketServer
+from event_clips import ClipExtractor
+from renditions import RenditionPool, parse_renditions
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# payload length, is_text, role length, camera_id length
+ENVELOPE = struct.Struct('!IBBB')
+
+DEFAULT_BROKER = 'unix:///tmp/camera-relay.sock'
+
+OnMessage = Callable[[str, str, Union[str, bytes]], None]
+
+
+def pack_envelope(role: str, camera_id: str, message: Union[str, bytes]) -> bytes:
+    """Frame a sender message with its routing info for the bus"""
+    is_text = isinstance(message, str)
+    payload = message.encode('utf-8') if is_text else message
+    role_bytes = role.encode('utf-8')
+    camera_bytes = camera_id.encode('utf-8')
+    header = ENVELOPE.pack(len(payload), is_text, len(role_bytes), len(camera_bytes))
+    return b''.join((header, role_bytes, camera_bytes, payload))
+
+
+async def read_envelope(reader: asyncio.StreamReader) -> Tuple[bytes, bytes]:
+    """Read one envelope; returns (header, body) without decoding the payload"""
+    header = await reader.readexactly(ENVELOPE.size)
+    payload_length, _, role_length, camera_length = ENVELOPE.unpack(header)
+    body = await reader.readexactly(role_length + camera_length + payload_length)
+    return header, body
+
+
+def unpack_envelope(header: bytes, body: bytes) -> Tuple[str, str, Union[str, bytes]]:
+    _, is_text, role_length, camera_length = ENVELOPE.unpack(header)
+    role = body[:role_length].decode('utf-8')
+    camera_id = body[role_length:role_length + camera_length].decode('utf-8')
+    payload = body[role_length + camera_length:]
+    return role, camera_id, payload.decode('utf-8') if is_text else payload
+
+
+def parse_address(address: str) -> Tuple[str, Union[str, Tuple[str, int]]]:
+    """'unix:///path' or 'tcp://host:port'"""
+    if address.startswith('unix://'):
+        return 'unix', address[len('unix://'):]
+    if address.startswith('tcp://'):
+        host, _, port = address[len('tcp://'):].rpartition(':')
+        return 'tcp', (host, int(port))
+    raise ValueError(f"Unsupported bus address: {address}")
+
+
+class LocalBus:
+    """In-process stand-in for the broker: every attached relay sees every other relay's frames"""
+
+    def __init__(self):
+        self.members: List['LocalBusClient'] = []
+
+    def attach(self, on_message: OnMessage) -> 'LocalBusClient':
+        client = LocalBusClient(self, on_message)
+        self.members.append(client)
+        return client
+
+
+class LocalBusClient:
+    def __init__(self, bus: LocalBus, on_message: OnMessage):
+        self.bus = bus
+        self.on_message = on_message
+        self.published = 0
+
+    def publish(self, role: str, camera_id: str, message: Union[str, bytes]):
+        self.published += 1
+        for member in self.bus.members:
+            if member is not self:
+                member.on_message(role, camera_id, message)
+
+    async def close(self):
+        self.bus.members.remove(self)
+
+
+class BrokerBus:
+    """Bus client for a relay worker connected to the broker over a Unix or TCP socket"""
+
+    def __init__(self, address: str = DEFAULT_BROKER, max_buffer: int = 8 * 1024 * 1024):
+        self.address = address
+        self.max_buffer = max_buffer
+        self.on_message: Optional[OnMessage] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.reader_task: Optional[asyncio.Task] = None
+
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+
+    async def connect(self, on_message: OnMessage):
+        self.on_message = on_message
+        await self._open()
+        self.reader_task = asyncio.ensure_future(self._read_loop())
+
+    async def _open(self):
+        kind, target = parse_address(self.address)
+        if kind == 'unix':
+            reader, self.writer = await asyncio.open_unix_connection(target)
+        else:
+            reader, self.writer = await asyncio.open_connection(*target)
+        self.reader = reader
+        logger.info(f"🔗 Connected to relay broker at {self.address}")
+
+    def publish(self, role: str, camera_id: str, message: Union[str, bytes]):
+        """Non-blocking publish; drops the frame if the broker connection is backed up"""
+        writer = self.writer
+        if writer is None or writer.is_closing():
+            self.dropped += 1
+            return
+        if writer.transport.get_write_buffer_size() > self.max_buffer:
+            self.dropped += 1
+            return
+        writer.write(pack_envelope(role, camera_id, message))
+        self.published += 1
+
+    async def _read_loop(self):
+        while True:
+            try:
+                while True:
+                    header, body = await read_envelope(self.reader)
+                    self.received += 1
+                    try:
+                        self.on_message(*unpack_envelope(header, body))
+                    except Exception as e:
+                        logger.error(f"Error relaying bus frame: {e}")
+            except asyncio.CancelledError:
+                raise
+            except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+                logger.warning(f"Relay broker connection lost: {e}")
+
+            # Reconnect until the broker comes back
+            self.writer = None
+            while True:
+                await asyncio.sleep(1.0)
+                try:
+                    await self._open()
+                    break
+                except OSError:
+                    continue
+
+    async def close(self):
+        if self.reader_task:
+            self.reader_task.cancel()
+        if self.writer:
+            self.writer.close()
+
+    def get_stats(self) -> dict:
+        return {'published': self.published, 'received': self.received, 'dropped': self.dropped}
+
+
+class RelayBroker:
+    """Forwards every envelope from one worker to all the others"""
+
+    def __init__(self, address: str = DEFAULT_BROKER, max_buffer: int = 8 * 1024 * 1024):
+        self.address = address
+        self.max_buffer = max_buffer
+        self.workers: List[asyncio.StreamWriter] = []
+        self.handlers: Set[asyncio.Task] = set()  # one handle_worker task per attached worker
+        self.forwarded = 0
+        self.dropped = 0
+
+    async def start(self):
+        kind, target = parse_address(self.address)
+        if kind == 'unix':
+            if os.path.exists(target):
+                os.unlink(target)
+            server = await asyncio.start_unix_server(self.handle_worker, target)
+        else:
+            server = await asyncio.start_server(self.handle_worker, *target)
+        logger.info(f"📡 Relay broker listening on {self.address}")
+        return server
+
+    async def handle_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        self.workers.append(writer)
+        logger.info(f"🔗 Relay worker attached (total: {len(self.workers)})")
+        try:
+            while True:
+                header, body = await read_envelope(reader)
+                for other in self.workers:
+                    if other is writer:
+                        continue
+                    # A backed-up worker loses frames instead of stalling the others
+                    if other.transport.get_write_buffer_size() > self.max_buffer:
+                        self.dropped += 1
+                        continue
+                    other.write(header)
+                    other.write(body)
+                    self.forwarded += 1
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            pass  # close(); the stream server's done callback would log a cancelled handler as an error
+        finally:
+            self.handlers.discard(task)
+            self.workers.remove(writer)
+            writer.close()
+            logger.info(f"❌ Relay worker detached (total: {len(self.workers)})")
+
+    async def close(self, server: asyncio.AbstractServer):
+        """Stop listening, detach every worker and remove the Unix socket"""
+        server.close()
+        handlers = list(self.handlers)
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        await server.wait_closed()
+        kind, target = parse_address(self.address)
+        if kind == 'unix' and os.path.exists(target):
+            os.unlink(target)
+
+
+async def run_worker(host: str, port: int, token: str, broker: str, record_dir: Optional[str] = None,
+                     clip_dir: Optional[str] = None, metrics_port: Optional[int] = None,
+                     renditions: Optional[dict] = None, rendition_workers: int = 2):
+    """One relay worker process: a CameraWebSocketServer on a shared port plus a bus client"""
+    recorder = None
+    if record_dir:
+        recorder = FrameRecorder(record_dir)
+        recorder.start()
+    # Every worker sees every camera over the bus, so whichever one receives a trigger cuts the clip
+    clips = None
+    if clip_dir:
+        clips = ClipExtractor(clip_dir)
+        clips.start()
+    bus = BrokerBus(broker)
+    server_instance = CameraWebSocketServer(host, port, token, bus=bus, reuse_port=True,
+                                            recorder=recorder, clips=clips, metrics_port=metrics_port,
+                                            renditions=RenditionPool(renditions, rendition_workers))
+    await bus.connect(server_instance.receive_remote)
+    server = await server_instance.start_server(announce=False)
+    logger.info(f"👷 Relay worker {os.getpid()} serving ws://{host}:{port}")
+    try:
+        await server.wait_closed()
+    finally:
+        await bus.close()
+        if recorder:
+            recorder.close()
+        if clips:
+            clips.close()
+
+
+def worker_main(host: str, port: int, token: str, broker: str, record_dir: Optional[str] = None,
+                clip_dir: Optional[str] = None, metrics_port: Optional[int] = None,
+                renditions: Optional[dict] = None, rendition_workers: int = 2):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent handles Ctrl+C
+    try:
+        asyncio.run(run_worker(host, port, token, broker, record_dir, clip_dir, metrics_port, renditions,
+                               rendition_workers))
+    except Exception as e:
+        logger.error(f"Relay worker error: {e}")
+
+
+def stop_on_sigterm(signum, frame):
+    # Shut down like Ctrl+C so workers are terminated instead of left holding the shared port
+    raise KeyboardInterrupt
+
+
+async def run_broker_until_stopped(broker: RelayBroker, stop: asyncio.Event):
+    server = await broker.start()
+    try:
+        await stop.wait()
+    finally:
+        await broker.close(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multi-process camera relay')
+    parser.add_argument('--host', default='127.0.0.1', help='WebSocket bind address')
+    parser.add_argument('--port', type=int, default=7777, help='WebSocket port shared by all workers')
+    parser.add_argument('--token', default='StrongPassword123', help='Authentication token')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Relay worker processes')
+    parser.add_argument('--broker', default=DEFAULT_BROKER,
+                        help='Bus address: unix:///path or tcp://host:port')
+    parser.add_argument('--no-broker', action='store_true',
+                        help='Do not run a broker here; attach workers to one on another host')
+    parser.add_argument('--record-dir', help='Record frames from locally attached senders to this directory')
+    parser.add_argument('--clip-dir', help='Write crash/SOS event clips to this directory')
+    parser.add_argument('--metrics-port', type=int,
+                        help='Serve /metrics on 127.0.0.1; worker N listens on this port + N')
+    parser.add_argument('--renditions', nargs='+', metavar='NAME=WIDTH@FPS[:QUALITY]',
+                        help='Scaled-down renditions viewers can choose (default: thumb=320@5:70 small=640@10:75)')
+    parser.add_argument('--rendition-workers', type=int, default=2,
+                        help='Threads per worker rendering renditions')
+    args = parser.parse_args()
+    try:
+        renditions = parse_renditions(args.renditions) if args.renditions else None
+    except ValueError as e:
+        parser.error(str(e))
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+
+    context = multiprocessing.get_context('spawn')
+    loop = asyncio.new_event_loop()
+    stop = asyncio.Event()
+
+    broker_task = None
+    if not args.no_broker:
+        broker = RelayBroker(args.broker)
+        broker_task = loop.create_task(run_broker_until_stopped(broker, stop))
+        loop.run_until_complete(asyncio.sleep(0.2))  # let the broker bind before workers attach
+
+    processes = []
+    for index in range(args.workers):
+        # Each worker has its own counters, so each gets its own metrics port to scrape
+        metrics_port = args.metrics_port + index if args.metrics_port else None
+        process = context.Process(target=worker_main,
+                                  args=(args.host, args.port, args.token, args.broker, args.record_dir, args.clip_dir,
+                                        metrics_port, renditions, args.rendition_workers),
+                                  daemon=True)
+        process.start()
+        processes.append(process)
+
+    print("\n" + "="*60)
+    print(f"📹 CAMERA RELAY READY: {args.workers} workers on ws://{args.host}:{args.port}")
+    print(f"Bus: {args.broker}")
+    print("Press Ctrl+C to stop the relay")
+    print("="*60 + "\n")
+
+    try:
+        if broker_task:
+            loop.run_until_complete(broker_task)
+        else:
+            for process in processes:
+                process.join()
+    except KeyboardInterrupt:
+        logger.info("Relay interrupted by user")
+    finally:
+        stop.set()
+        if broker_task:
+            loop.run_until_complete(broker_task)
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=2)
+        loop.close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n👋 Camera relay stopped by user")
+    except Exception as e:
+        logger.error(f"Relay error: {e}")
+        sys.exit(1)
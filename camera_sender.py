@@ -12,74 +12,183 @@ import websockets
 import argparse
 import time
 import logging
-from typing import Optional
+import operator
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
 import numpy as np
 
+from adaptive_quality import QualityController
+from camera_pipeline import ChangeDetector, FrameRing, StageStats
+from detection_engine import DetectionEngine, draw_detections
+from frame_protocol import (CODEC_JPEG, CODEC_TILES, CODECS, FORMAT_BINARY, FORMAT_TEXT, FORMATS, MSG_FRAME,
+                            MSG_TILES, build_metadata, metadata_text, pack_frame, pack_metadata, pack_tiles,
+                            peek_key_sequence)
+from frame_sources import open_source
+from jpeg_encoder import BACKEND_AUTO, BACKENDS, SUBSAMPLINGS, JpegEncoder
+from sender_connection import SenderConnection
+from tile_codec import TileEncoder
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Overlay modes: draw into the pixels, or send clean frames plus a metadata message
+OVERLAY_BURN = 'burn'
+OVERLAY_METADATA = 'metadata'
+OVERLAY_MODES = (OVERLAY_BURN, OVERLAY_METADATA)
+
+class CameraDevice:
+    """One capture device driven by a sender: its own capture thread, sequence numbers, motion gate and tiles"""
+    
+    def __init__(self, camera_id: str, source: Union[int, str], change_detector: Optional[ChangeDetector] = None,
+                 tile_encoder: Optional[TileEncoder] = None):
+        self.camera_id = camera_id
+        self.source = source  # device index, or a frame_sources spec (synthetic, image directory, video file)
+        self.change_detector = change_detector
+        self.tile_encoder = tile_encoder  # codec=tiles: keyframes plus changed tiles
+        self.cap: Optional[cv2.VideoCapture] = None
+        self.thread: Optional[threading.Thread] = None
+        self.sequence = 0
+        self.frame_count = 0
+        self.last_sent = 0  # newest sequence on the wire; older frames finishing late are stale
+        self.key_sent: Optional[int] = None  # sequence of the last keyframe on the wire (codec=tiles)
+    
+    def snapshot(self) -> dict:
+        return {
+            'source': self.source,
+            'sequence': self.sequence,
+            'last_sent': self.last_sent,
+            'motion': self.change_detector.snapshot() if self.change_detector else None,
+            'tiles': self.tile_encoder.snapshot() if self.tile_encoder else None
+        }
+
 class CameraSender:
     def __init__(self, server_url: str, token: str, role: str, camera_id: str, 
-                 camera_index: int = 0, width: int = 1280, height: int = 720, 
-                 fps: int = 15, enable_detection: bool = True):
+                 camera_index: Union[int, str] = 0, width: int = 1280, height: int = 720, 
+                 fps: int = 15, enable_detection: bool = True, transport: str = FORMAT_TEXT,
+                 workers: int = 2, detection_model: str = 'fake', detection_options: Optional[dict] = None,
+                 detection_workers: int = 1, detect_every: int = 1, detection_budget: float = 0.5,
+                 overlay: str = OVERLAY_BURN, adaptive: bool = False, target_kbps: float = 2000,
+                 target_latency_ms: float = 200, motion_gate: bool = False, motion_sensitivity: float = 0.005,
+                 motion_threshold: int = 15, keepalive: float = 2.0, encoder: str = BACKEND_AUTO,
+                 subsampling: str = '420', cameras: Optional[Dict[str, Union[int, str]]] = None,
+                 codec: str = CODEC_JPEG, tile_size: int = 64, keyframe_interval: float = 2.0,
+                 heartbeat: float = 1.0, reconnect_max: float = 1.0, replay_frames: int = 2):
         self.server_url = server_url
         self.token = token
         self.role = role
-        self.camera_id = camera_id
-        self.camera_index = camera_index
         self.width = width
         self.height = height
         self.fps = fps
         self.enable_detection = enable_detection
+        self.transport = transport
+        self.workers = workers
+        self.overlay = overlay
         
-        self.cap: Optional[cv2.VideoCapture] = None
-        self.websocket: Optional[websockets.WebSocketServerProtocol] = None
+        # JPEG encoding runs on the processing workers, each with its own encoder and buffer
+        self.encoder = JpegEncoder(backend=encoder, subsampling=subsampling)
+        
+        # Persistent connection: heartbeats, reconnects with backoff and a replay buffer (set up on connect)
+        self.heartbeat = heartbeat
+        self.reconnect_max = reconnect_max
+        self.replay_frames = replay_frames
+        self.connection: Optional[SenderConnection] = None
         self.running = False
         
-        # YOLO detection (optional)
-        self.net = None
-        self.output_layers = None
-        self.classes = None
+        # Object detection (optional), run out of process by the detection engine
+        self.detection_model = detection_model
+        self.detection_options = detection_options or {}
+        self.detection_workers = detection_workers
+        self.detect_every = detect_every
+        self.detection_budget = detection_budget
+        self.detector: Optional[DetectionEngine] = None
         
         # FPS tracking
-        self.frame_count = 0
         self.start_time = time.time()
         
+        # Pipeline: capture thread -> capture ring -> worker pool -> send ring -> asyncio sender
+        self.capture_ring: Optional[FrameRing] = None
+        self.send_ring: Optional[FrameRing] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.stage_stats = {
+            name: StageStats(name)
+            for name in ('capture', 'process', 'encode', 'send', 'glass_to_wire')
+        }
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.stale_dropped = 0
+        self.orphaned_dropped = 0  # tile updates whose keyframe never went out
+        
+        # Adaptive quality: closed loop over send buffer depth, RTT and server-reported drops
+        self.controller: Optional[QualityController] = None
+        if adaptive:
+            self.controller = QualityController(target_kbps=target_kbps, target_latency_ms=target_latency_ms,
+                                                max_fps=fps)
+        self.server_feedback: Dict[str, dict] = {}  # camera_id -> latest feedback from the server
+        
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec}")
+        if codec == CODEC_TILES and transport != FORMAT_BINARY:
+            raise ValueError("Tile updates need the binary transport")
+        self.codec = codec
+        
+        # Capture devices sharing this process, its worker pool, detector and connection
+        # Motion gating: skip processing/encoding/sending frames of an unchanged scene
+        # Tiles: send only the parts of the scene that changed since the last keyframe
+        self.devices: List[CameraDevice] = [
+            CameraDevice(device_id, source,
+                         ChangeDetector(sensitivity=motion_sensitivity, pixel_threshold=motion_threshold,
+                                        keepalive=keepalive) if motion_gate else None,
+                         TileEncoder(self.encoder, tile_size=tile_size, keyframe_interval=keyframe_interval,
+                                     pixel_threshold=motion_threshold) if codec == CODEC_TILES else None)
+            for device_id, source in (cameras or {camera_id: camera_index}).items()
+        ]
+        if len(self.devices) > 1 and transport != FORMAT_BINARY:
+            raise ValueError("Multiple cameras share one connection and need the binary transport")
+        self.camera_id = self.devices[0].camera_id  # registered camera for the connection
+        
     def initialize_camera(self) -> bool:
-        """Initialize the camera capture"""
-        try:
-            self.cap = cv2.VideoCapture(self.camera_index)
-            if not self.cap.isOpened():
-                logger.error(f"Failed to open camera {self.camera_index}")
-                return False
+        """Initialize the camera capture for every device"""
+        for device in self.devices:
+            try:
+                device.cap = open_source(device.source, self.width, self.height, self.fps)
+                if not device.cap.isOpened():
+                    logger.error(f"Failed to open camera {device.source}")
+                    return False
+                    
+                # Set camera properties
+                device.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+                device.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+                device.cap.set(cv2.CAP_PROP_FPS, self.fps)
                 
-            # Set camera properties
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
-            self.cap.set(cv2.CAP_PROP_FPS, self.fps)
-            
-            # Verify settings
-            actual_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            actual_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            actual_fps = self.cap.get(cv2.CAP_PROP_FPS)
-            
-            logger.info(f"Camera initialized: {actual_width}x{actual_height} @ {actual_fps} FPS")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error initializing camera: {e}")
-            return False
+                # Verify settings
+                actual_width = int(device.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                actual_height = int(device.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                actual_fps = device.cap.get(cv2.CAP_PROP_FPS)
+                
+                logger.info(f"Camera {device.camera_id} initialized: {actual_width}x{actual_height} @ {actual_fps} FPS")
+                
+            except Exception as e:
+                logger.error(f"Error initializing camera {device.source}: {e}")
+                return False
+        return True
     
     def initialize_detection(self) -> bool:
-        """Initialize YOLO object detection (optional)"""
+        """Initialize object detection (optional)"""
         if not self.enable_detection:
             return True
             
         try:
-            # Try to load YOLOv4 or YOLOv3 weights (if available)
-            # For now, we'll use a simple detection placeholder
-            logger.info("Object detection initialized (placeholder)")
+            self.detector = DetectionEngine(
+                model=self.detection_model,
+                model_options=self.detection_options,
+                workers=self.detection_workers,
+                frame_skip=self.detect_every,
+                cpu_budget=self.detection_budget
+            )
+            self.detector.start()
+            logger.info(f"Object detection initialized ({self.detection_model})")
             return True
             
         except Exception as e:
@@ -87,33 +196,35 @@ class CameraSender:
             self.enable_detection = False
             return True
     
-    def detect_objects(self, frame: np.ndarray) -> np.ndarray:
+    def detect_objects(self, device: CameraDevice, frame: np.ndarray, sequence: int = 0) -> np.ndarray:
         """Perform object detection on frame"""
-        if not self.enable_detection:
+        if not self.enable_detection or not self.detector:
             return frame
-            
-        # Placeholder for object detection
-        # In a real implementation, you would run YOLO here
-        height, width = frame.shape[:2]
         
-        # Draw a simple detection box as demo
-        cv2.rectangle(frame, (50, 50), (200, 150), (0, 255, 0), 2)
-        cv2.putText(frame, "Demo Detection", (55, 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        # Hand the frame to the shared engine without waiting and draw the camera's most recent result
+        self.detector.submit(device.camera_id, frame, sequence)
+        result = self.detector.get_latest(device.camera_id)
+        if result and self.overlay == OVERLAY_BURN:
+            draw_detections(frame, result['detections'])
         
         return frame
     
-    def add_overlay(self, frame: np.ndarray) -> np.ndarray:
+    def update_fps(self, device: CameraDevice) -> float:
+        """Count a processed frame of a device and return its running FPS"""
+        device.frame_count += 1
+        elapsed_time = time.time() - self.start_time
+        return device.frame_count / elapsed_time if elapsed_time > 0 else 0
+    
+    def add_overlay(self, device: CameraDevice, frame: np.ndarray) -> np.ndarray:
         """Add FPS and info overlay to frame"""
         # Calculate FPS
-        self.frame_count += 1
-        elapsed_time = time.time() - self.start_time
-        current_fps = self.frame_count / elapsed_time if elapsed_time > 0 else 0
+        current_fps = self.update_fps(device)
         
         # Add overlay text
         overlay_text = [
             f"FPS: {current_fps:.1f}",
             f"Role: {self.role}",
-            f"Camera: {self.camera_id}",
+            f"Camera: {device.camera_id}",
             f"Resolution: {frame.shape[1]}x{frame.shape[0]}"
         ]
         
@@ -125,117 +236,356 @@ class CameraSender:
         
         return frame
     
+    def encode_jpeg(self, frame: np.ndarray) -> bytes:
+        """Encode frame to raw JPEG bytes"""
+        try:
+            quality = self.controller.quality if self.controller else 80
+            return self.encoder.encode(frame, quality)
+            
+        except Exception as e:
+            logger.error(f"Error encoding frame: {e}")
+            return b""
+    
     def encode_frame(self, frame: np.ndarray) -> str:
         """Encode frame to base64 JPEG"""
+        # Convert to base64
+        return base64.b64encode(self.encode_jpeg(frame)).decode('utf-8')
+    
+    def build_message(self, device: CameraDevice, frame: np.ndarray, capture_time: float,
+                      sequence: int) -> Union[str, bytes]:
+        """Serialize a frame for the negotiated transport"""
+        if self.transport != FORMAT_BINARY:
+            return self.encode_frame(frame)
+        if device.tile_encoder:
+            return self.build_tile_message(device, frame, capture_time, sequence)
+        
+        jpeg = self.encode_jpeg(frame)
+        if not jpeg:
+            return b""
+        # Traced for the relay's latency metrics; the sent offset is filled in by the send loop
+        encoded_ms = (time.time() - capture_time) * 1000
+        return bytearray(pack_frame(device.camera_id, sequence, jpeg, capture_time * 1000,
+                                    trace=(encoded_ms, encoded_ms)))
+    
+    def build_tile_message(self, device: CameraDevice, frame: np.ndarray, capture_time: float,
+                           sequence: int) -> bytes:
+        """A keyframe, or only the tiles that changed since the last one"""
         try:
-            # Encode frame as JPEG
-            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            
-            # Convert to base64
-            frame_base64 = base64.b64encode(buffer).decode('utf-8')
-            return frame_base64
-            
+            quality = self.controller.quality if self.controller else 80
+            encoded = device.tile_encoder.encode(frame, sequence, quality)
         except Exception as e:
             logger.error(f"Error encoding frame: {e}")
-            return ""
+            return b""
+        
+        encoded_ms = (time.time() - capture_time) * 1000
+        if encoded.keyframe:
+            if not encoded.jpeg:
+                device.tile_encoder.request_keyframe()
+                return b""
+            return bytearray(pack_frame(device.camera_id, sequence, encoded.jpeg, capture_time * 1000,
+                                        trace=(encoded_ms, encoded_ms)))
+        return bytearray(pack_tiles(device.camera_id, sequence, encoded.key_sequence, frame.shape[1], frame.shape[0],
+                                    device.tile_encoder.tile_size, encoded.tiles, capture_time * 1000,
+                                    trace=(encoded_ms, encoded_ms)))
+    
+    def build_metadata_message(self, device: CameraDevice, frame: np.ndarray, capture_time: float,
+                               sequence: int) -> Union[str, bytes]:
+        """Serialize detections and FPS as a side-channel message for the same sequence"""
+        result = self.detector.get_latest(device.camera_id) if self.detector else None
+        metadata = build_metadata(
+            result['detections'] if result else [],
+            self.update_fps(device),
+            frame.shape[1],
+            frame.shape[0],
+            result['sequence'] if result else None
+        )
+        if self.transport == FORMAT_BINARY:
+            return pack_metadata(device.camera_id, sequence, metadata, capture_time * 1000)
+        return metadata_text(device.camera_id, sequence, metadata, capture_time * 1000)
+    
+    @property
+    def websocket(self) -> Optional[websockets.WebSocketClientProtocol]:
+        return self.connection.websocket if self.connection else None
     
     async def connect_websocket(self) -> bool:
-        """Connect to WebSocket server"""
-        try:
-            # Build WebSocket URL with query parameters
-            ws_url = f"{self.server_url}?token={self.token}&role={self.role}&user_type=sender&camera_id={self.camera_id}"
-            
-            logger.info(f"Connecting to {ws_url}")
-            self.websocket = await websockets.connect(ws_url)
+        """Connect to WebSocket server; the connection keeps reconnecting in the background from then on"""
+        # Build WebSocket URL with query parameters
+        ws_url = f"{self.server_url}?token={self.token}&role={self.role}&user_type=sender&camera_id={self.camera_id}&format={self.transport}"
+        if len(self.devices) > 1:
+            # One multiplexed connection; the server routes each frame by its header's camera ID
+            ws_url += f"&cameras={','.join(device.camera_id for device in self.devices)}"
+        if self.controller:
+            ws_url += "&feedback=1"
+        
+        logger.info(f"Connecting to {ws_url}")
+        self.connection = SenderConnection(ws_url, heartbeat=self.heartbeat, heartbeat_timeout=2 * self.heartbeat,
+                                           reconnect_max=self.reconnect_max, replay_frames=self.replay_frames,
+                                           on_connect=self.request_keyframes, on_rejected=self.connection_rejected)
+        if await self.connection.start():
             logger.info("WebSocket connected successfully")
             return True
-            
-        except Exception as e:
-            logger.error(f"WebSocket connection failed: {e}")
-            return False
+        return False
     
-    async def send_frame(self, frame_data: str) -> bool:
-        """Send frame data via WebSocket"""
-        try:
-            if self.websocket and hasattr(self.websocket, 'closed') and not self.websocket.closed:
-                await self.websocket.send(frame_data)
-                return True
-            else:
-                return False
-                
-        except Exception as e:
-            logger.error(f"Error sending frame: {e}")
-            return False
+    def connection_rejected(self, reason: str):
+        """Wrong token, role or parameters: stop the sender"""
+        self.running = False
     
-    async def capture_and_send(self):
-        """Main capture and send loop"""
-        if not self.cap:
-            logger.error("Camera not initialized")
-            return
-            
-        frame_interval = 1.0 / self.fps
-        last_frame_time = 0
-        
-        logger.info(f"Starting capture loop at {self.fps} FPS")
+    def request_keyframes(self):
+        """The server may have restarted without the keyframes earlier tile updates build on"""
+        for device in self.devices:
+            if device.tile_encoder:
+                device.tile_encoder.request_keyframe()
+    
+    def capture_loop(self, device: CameraDevice):
+        """Capture thread (one per device): read frames continuously and keep only the freshest ones"""
+        next_frame_time = time.monotonic()
         
         while self.running:
-            current_time = time.time()
+            frame_interval = 1.0 / (self.controller.fps if self.controller else self.fps)
+            read_start = time.perf_counter()
+            ret, frame = device.cap.read()
+            if not ret:
+                logger.warning(f"Failed to capture frame from {device.camera_id}")
+                time.sleep(0.1)
+                continue
             
-            # Control frame rate
-            if current_time - last_frame_time < frame_interval:
-                await asyncio.sleep(0.01)
+            # Keep draining the device buffer but only forward frames at the target rate
+            now = time.monotonic()
+            if now < next_frame_time:
                 continue
-                
-            # Capture frame
-            ret, frame = self.cap.read()
-            if not ret:
-                logger.warning("Failed to capture frame")
-                await asyncio.sleep(0.1)
+            next_frame_time = max(next_frame_time + frame_interval, now)
+            
+            if device.change_detector and not device.change_detector.should_send(frame, now):
+                continue
+            
+            self.stage_stats['capture'].record(time.perf_counter() - read_start)
+            device.sequence += 1
+            self.capture_ring.put((device, device.sequence, time.time(), frame))
+    
+    def process_loop(self):
+        """Worker: detect, overlay and encode frames from the capture ring"""
+        while self.running:
+            item = self.capture_ring.get(timeout=0.5)
+            if item is None:
                 continue
+            device, sequence, capture_time, frame = item
             
-            # Process frame
             try:
-                # Apply object detection
-                frame = self.detect_objects(frame)
+                with self.stage_stats['process'].time():
+                    # Apply object detection
+                    frame = self.detect_objects(device, frame, sequence)
+                    
+                    # Add overlay information, or describe it in a metadata message
+                    if self.overlay == OVERLAY_METADATA:
+                        metadata = self.build_metadata_message(device, frame, capture_time, sequence)
+                    else:
+                        metadata = None
+                        frame = self.add_overlay(device, frame)
                 
-                # Add overlay information
-                frame = self.add_overlay(frame)
+                with self.stage_stats['encode'].time():
+                    scale = self.controller.scale if self.controller else 1.0
+                    if scale < 1.0:
+                        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                    frame_data = self.build_message(device, frame, capture_time, sequence)
                 
-                # Encode frame
-                frame_data = self.encode_frame(frame)
-                if not frame_data:
+                if frame_data:
+                    self.send_ring.put((device, sequence, capture_time, frame_data, metadata))
+                    
+            except Exception as e:
+                logger.error(f"Error processing frame: {e}")
+    
+    def send_evicted(self, item: tuple):
+        """Send ring overflow: updates after an evicted keyframe cannot be rebuilt, so start over with a new one"""
+        device, _, _, frame_data, _ = item
+        if device.tile_encoder and frame_data[1] == MSG_FRAME:
+            device.tile_encoder.request_keyframe()
+    
+    async def send_loop(self, frame_ready: asyncio.Event):
+        """Asyncio sender: ship the newest encoded frame of each camera, skipping anything stale"""
+        last_stats_log = time.time()
+        
+        while self.running:
+            try:
+                await asyncio.wait_for(frame_ready.wait(), timeout=0.5)
+            except asyncio.TimeoutError:
+                continue
+            frame_ready.clear()
+            
+            while self.running:
+                item = self.send_ring.get_nowait()
+                if item is None:
+                    break
+                device, sequence, capture_time, frame_data, metadata = item
+                
+                # Workers may finish out of order; never send a frame older than one already sent
+                if sequence <= device.last_sent:
+                    self.stale_dropped += 1
+                    # Tile updates after a dropped keyframe cannot be rebuilt; start over with a new one
+                    if device.tile_encoder and frame_data[1] == MSG_FRAME:  # second header byte: message type
+                        device.tile_encoder.request_keyframe()
                     continue
                 
-                # Send frame
-                success = await self.send_frame(frame_data)
-                if not success:
-                    # Try to reconnect (limit reconnection attempts)
-                    if not hasattr(self, '_reconnect_count'):
-                        self._reconnect_count = 0
-                    
-                    if self._reconnect_count < 3:
-                        logger.info("Attempting to reconnect...")
-                        self._reconnect_count += 1
-                        if await self.connect_websocket():
-                            logger.info("Reconnected successfully")
-                            self._reconnect_count = 0  # Reset counter on success
-                        else:
-                            await asyncio.sleep(2)
+                if device.tile_encoder:
+                    if frame_data[1] == MSG_FRAME:
+                        device.key_sent = sequence
+                    elif frame_data[1] == MSG_TILES:
+                        key_sequence = peek_key_sequence(frame_data)
+                        if key_sequence != device.key_sent:
+                            # The keyframe this update paints over never went out; the relay would drop it too
+                            self.orphaned_dropped += 1
+                            if device.key_sent is None or key_sequence > device.key_sent:
+                                device.tile_encoder.request_keyframe()
                             continue
-                    else:
-                        logger.error("Max reconnection attempts reached. Stopping.")
-                        self.running = False
-                        break
                 
-                last_frame_time = current_time
+                send_start = time.perf_counter()
                 
-            except Exception as e:
-                logger.error(f"Error processing frame: {e}")
-                await asyncio.sleep(0.1)
+                # Metadata goes first so viewers have the overlay when the frame with its sequence lands;
+                # while the relay is unreachable both are buffered and replayed after the reconnect
+                messages = (metadata, frame_data) if metadata else (frame_data,)
+                replayable = not (device.tile_encoder and frame_data[1] != MSG_FRAME)
+                sent = await self.connection.send(device.camera_id, capture_time, messages, replayable)
+                device.last_sent = sequence
+                if not sent:
+                    continue
+                
+                self.stage_stats['send'].record(time.perf_counter() - send_start)
+                self.stage_stats['glass_to_wire'].record(time.time() - capture_time)
+                self.frames_sent += 1
+                self.bytes_sent += len(frame_data) + (len(metadata) if metadata else 0)
+            
+            if time.time() - last_stats_log >= 30:
+                last_stats_log = time.time()
+                logger.info(f"Pipeline stats: {self.get_stats()}")
+    
+    async def receive_loop(self):
+        """Read server feedback (per-camera viewer drop counters) across reconnects"""
+        while self.running:
+            websocket = self.websocket
+            if not websocket:
+                await asyncio.sleep(0.5)
+                continue
+            try:
+                async for message in websocket:
+                    try:
+                        data = json.loads(message)
+                    except (TypeError, ValueError):
+                        continue
+                    if data.get('type') == 'feedback':
+                        self.server_feedback[data.get('camera_id', self.camera_id)] = data
+            except websockets.exceptions.ConnectionClosed:
+                pass
+            await asyncio.sleep(0.5)
+    
+    async def measure_rtt(self) -> Optional[float]:
+        """Round-trip time of a WebSocket ping in ms, or None if unavailable"""
+        try:
+            start = time.perf_counter()
+            pong_waiter = await self.websocket.ping()
+            await asyncio.wait_for(pong_waiter, timeout=2.0)
+            return (time.perf_counter() - start) * 1000
+        except asyncio.TimeoutError:
+            return 2000.0
+        except Exception:
+            return None
+    
+    async def control_loop(self, interval: float = 1.0):
+        """Feed the quality controller once per interval"""
+        last_bytes = self.bytes_sent
+        last_feedback = {}
+        
+        while self.running:
+            await asyncio.sleep(interval)
+            
+            kbps = (self.bytes_sent - last_bytes) * 8 / 1000 / interval
+            last_bytes = self.bytes_sent
+            
+            rtt_ms = await self.measure_rtt()
+            
+            buffer_bytes = 0
+            transport = getattr(self.websocket, 'transport', None)
+            if transport:
+                buffer_bytes = transport.get_write_buffer_size()
+            
+            # Drop rate across all of this sender's cameras and their viewers since the previous feedback
+            feedback = {
+                key: sum(camera.get(key, 0) for camera in self.server_feedback.values())
+                for key in ('enqueued', 'dropped')
+            }
+            enqueued = feedback['enqueued'] - last_feedback.get('enqueued', 0)
+            dropped = feedback['dropped'] - last_feedback.get('dropped', 0)
+            drop_rate = dropped / enqueued if enqueued > 0 else 0.0
+            last_feedback = feedback
+            
+            action = self.controller.update(kbps, rtt_ms, buffer_bytes, drop_rate)
+            if action:
+                logger.info(f"Adaptive quality: {action} ({self.controller.decisions[-1]['reason']})")
+    
+    async def capture_and_send(self):
+        """Main capture and send pipeline"""
+        if not all(device.cap for device in self.devices):
+            logger.error("Camera not initialized")
+            return
+        
+        logger.info(f"Starting capture pipeline for {len(self.devices)} camera(s) at {self.fps} FPS "
+                    f"with {self.workers} workers")
+        
+        # Rings hold the two freshest frames of each camera and serve the cameras in turn; workers and the
+        # sender are shared by all cameras
+        loop = asyncio.get_running_loop()
+        frame_ready = asyncio.Event()
+        by_device = operator.itemgetter(0)
+        self.capture_ring = FrameRing(capacity=2, key=by_device)
+        self.send_ring = FrameRing(capacity=2, on_put=lambda: loop.call_soon_threadsafe(frame_ready.set),
+                                   on_drop=self.send_evicted, key=by_device)
+        
+        for device in self.devices:
+            device.thread = threading.Thread(target=self.capture_loop, args=(device,),
+                                             name=f'capture-{device.camera_id}', daemon=True)
+            device.thread.start()
+        
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='process')
+        for _ in range(self.workers):
+            self.executor.submit(self.process_loop)
+        
+        background = []
+        if self.controller:
+            background.append(asyncio.ensure_future(self.receive_loop()))
+            background.append(asyncio.ensure_future(self.control_loop()))
+        
+        try:
+            await self.send_loop(frame_ready)
+        finally:
+            self.running = False
+            for task in background:
+                task.cancel()
+            self.capture_ring.close()
+            self.send_ring.close()
+            self.executor.shutdown(wait=False)
+    
+    def get_stats(self) -> dict:
+        """Get per-stage latency and drop counters"""
+        return {
+            'frames_sent': self.frames_sent,
+            'fps': self.frames_sent / (time.time() - self.start_time),
+            'stages': {name: stats.snapshot() for name, stats in self.stage_stats.items()},
+            'bytes_sent': self.bytes_sent,
+            'encoder': self.encoder.get_stats(),
+            'detection': self.detector.get_stats() if self.detector else None,
+            'quality': self.controller.snapshot() if self.controller else None,
+            'cameras': {device.camera_id: device.snapshot() for device in self.devices},
+            'connection': self.connection.get_stats() if self.connection else None,
+            'dropped': {
+                'capture': self.capture_ring.dropped if self.capture_ring else 0,
+                'send': self.send_ring.dropped if self.send_ring else 0,
+                'stale': self.stale_dropped,
+                'orphaned': self.orphaned_dropped
+            }
+        }
     
     async def start(self):
         """Start the camera sender"""
-        logger.info(f"Starting Camera Sender for {self.role} - {self.camera_id}")
+        logger.info(f"Starting Camera Sender for {self.role} - "
+                    f"{', '.join(device.camera_id for device in self.devices)}")
         
         # Initialize camera
         if not self.initialize_camera():
@@ -247,10 +597,8 @@ class CameraSender:
             logger.error("Failed to initialize detection")
             return
         
-        # Connect to WebSocket
-        if not await self.connect_websocket():
-            logger.error("Failed to connect to WebSocket")
-            return
+        # Connect to WebSocket; while the relay is unreachable frames are buffered and retried
+        await self.connect_websocket()
         
         # Start capture loop
         self.running = True
@@ -266,11 +614,19 @@ class CameraSender:
         logger.info("Stopping camera sender...")
         self.running = False
         
-        if self.cap:
-            self.cap.release()
+        for device in self.devices:
+            if device.thread:
+                device.thread.join(timeout=1.0)
+        
+        if self.detector:
+            self.detector.close()
+        
+        for device in self.devices:
+            if device.cap:
+                device.cap.release()
             
-        if self.websocket:
-            await self.websocket.close()
+        if self.connection:
+            await self.connection.close()
         
         logger.info("Camera sender stopped")
 
@@ -286,6 +642,11 @@ def main():
                        help='Camera identifier')
     parser.add_argument('--camera-index', type=int, default=0,
                        help='Camera device index')
+    parser.add_argument('--source',
+                       help='Instead of a device: synthetic[:seed], an image directory or a video file')
+    parser.add_argument('--cameras', nargs='+', metavar='ID=SOURCE',
+                       help='Drive several devices or sources over one connection, e.g. dock-1=0 dock-2=1 '
+                            'test=synthetic:3 (needs --transport binary)')
     parser.add_argument('--width', type=int, default=1280,
                        help='Camera width')
     parser.add_argument('--height', type=int, default=720,
@@ -294,20 +655,103 @@ def main():
                        help='Target FPS')
     parser.add_argument('--no-detection', action='store_true',
                        help='Disable object detection')
+    parser.add_argument('--transport', choices=FORMATS, default=FORMAT_TEXT,
+                       help='Frame transport: base64 JSON text or binary header + JPEG')
+    parser.add_argument('--overlay', choices=OVERLAY_MODES, default=OVERLAY_BURN,
+                       help='Burn detections/FPS into frames or send them as metadata messages')
+    parser.add_argument('--adaptive', action='store_true',
+                       help='Adapt JPEG quality, resolution and FPS to bandwidth/latency targets')
+    parser.add_argument('--target-kbps', type=float, default=2000,
+                       help='Bandwidth target per camera for --adaptive')
+    parser.add_argument('--target-latency-ms', type=float, default=200,
+                       help='Round-trip latency target for --adaptive')
+    parser.add_argument('--motion-gate', action='store_true',
+                       help='Only send frames when the scene changes (plus keepalives)')
+    parser.add_argument('--motion-sensitivity', type=float, default=0.005,
+                       help='Fraction of sampled pixels that must change to send a frame')
+    parser.add_argument('--motion-threshold', type=int, default=15,
+                       help='Grayscale difference counted as a changed pixel')
+    parser.add_argument('--keepalive', type=float, default=2.0,
+                       help='Seconds between keepalive frames for an unchanged scene')
+    parser.add_argument('--encoder', choices=BACKENDS, default=BACKEND_AUTO,
+                       help='JPEG encoder: libjpeg-turbo when installed (auto), turbojpeg or opencv')
+    parser.add_argument('--subsampling', choices=SUBSAMPLINGS, default='420',
+                       help='JPEG chroma subsampling; 444 keeps colour detail at a higher bitrate')
+    parser.add_argument('--codec', choices=CODECS, default=CODEC_JPEG,
+                       help='Whole JPEG frames, or keyframes plus only the changed tiles (needs --transport binary)')
+    parser.add_argument('--tile-size', type=int, default=64,
+                       help='Tile edge in pixels for --codec tiles (a multiple of 16)')
+    parser.add_argument('--keyframe-interval', type=float, default=2.0,
+                       help='Seconds between full keyframes for --codec tiles')
+    parser.add_argument('--heartbeat', type=float, default=1.0,
+                       help='Seconds between heartbeat pings; a relay silent for two heartbeats is reconnected')
+    parser.add_argument('--reconnect-max', type=float, default=1.0,
+                       help='Longest delay in seconds between reconnect attempts (exponential backoff with jitter)')
+    parser.add_argument('--replay-frames', type=int, default=2,
+                       help='Newest frames per camera kept while disconnected and replayed after reconnecting')
+    parser.add_argument('--workers', type=int, default=2,
+                       help='Processing/encoding worker threads')
+    parser.add_argument('--model', default='fake',
+                       help="Detection model: fake, yolo or module:Class")
+    parser.add_argument('--weights', default='yolov8n.pt',
+                       help='Model weights for --model yolo')
+    parser.add_argument('--detection-workers', type=int, default=1,
+                       help='Detection worker processes')
+    parser.add_argument('--detect-every', type=int, default=1,
+                       help='Run detection on every Nth frame (minimum stride)')
+    parser.add_argument('--detection-budget', type=float, default=0.5,
+                       help='Fraction of wall time each detection worker may be busy before the stride grows')
     
     args = parser.parse_args()
     
+    cameras = None
+    if args.cameras:
+        cameras = {camera_id: source for camera_id, _, source in
+                   (entry.partition('=') for entry in args.cameras)}
+        if not all(cameras) or not all(cameras.values()):
+            parser.error('--cameras entries must look like camera-id=source')
+        if len(cameras) > 1 and args.transport != FORMAT_BINARY:
+            parser.error('--cameras with more than one camera needs --transport binary')
+    if args.codec == CODEC_TILES and args.transport != FORMAT_BINARY:
+        parser.error('--codec tiles needs --transport binary')
+    if args.fps <= 0:
+        parser.error('--fps must be positive')
+    
     # Create camera sender
     sender = CameraSender(
         server_url=args.server,
         token=args.token,
         role=args.role,
         camera_id=args.camera_id,
-        camera_index=args.camera_index,
+        camera_index=args.source or args.camera_index,
         width=args.width,
         height=args.height,
         fps=args.fps,
-        enable_detection=not args.no_detection
+        enable_detection=not args.no_detection,
+        transport=args.transport,
+        workers=args.workers,
+        detection_model=args.model,
+        detection_options={'weights': args.weights} if args.model == 'yolo' else {},
+        detection_workers=args.detection_workers,
+        detect_every=args.detect_every,
+        detection_budget=args.detection_budget,
+        overlay=args.overlay,
+        adaptive=args.adaptive,
+        target_kbps=args.target_kbps,
+        target_latency_ms=args.target_latency_ms,
+        motion_gate=args.motion_gate,
+        motion_sensitivity=args.motion_sensitivity,
+        motion_threshold=args.motion_threshold,
+        keepalive=args.keepalive,
+        encoder=args.encoder,
+        subsampling=args.subsampling,
+        cameras=cameras,
+        codec=args.codec,
+        tile_size=args.tile_size,
+        keyframe_interval=args.keyframe_interval,
+        heartbeat=args.heartbeat,
+        reconnect_max=args.reconnect_max,
+        replay_frames=args.replay_frames
     )
     
     # Run the sender
@@ -7,29 +7,443 @@ Handles video streaming between supervisor cameras and admin viewers
 import asyncio
 import websockets
 import json
+import base64
 import logging
-from typing import Dict, Set
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Union
 from urllib.parse import parse_qs, urlparse
 import signal
 import sys
 import functools
+from fnmatch import fnmatchcase
+
+from camera_recorder import FrameRecorder, frame_jpeg
+from event_clips import ClipExtractor, retained_size
+from frame_protocol import (CODEC_JPEG, CODEC_TILES, CODECS, FORMAT_BINARY, FORMAT_TEXT, FORMATS, MSG_FRAME,
+                            MSG_METADATA, MSG_TILES, decode_metadata, metadata_text, pack_frame, pack_metadata,
+                            peek_camera_id, unpack_frame, unpack_tiles)
+from jpeg_encoder import JpegEncoder
+from renditions import FULL, RenditionPool, parse_renditions
+from relay_metrics import (STAGE_DELIVERY, STAGE_ENCODE, STAGE_FANOUT, STAGE_INGEST, STAGE_NETWORK, STAGE_RELAY,
+                           STAGE_SENDER_QUEUE, MetricsHTTPServer, MetricsWriter, StageHistograms)
+from tile_codec import assemble, decode_jpeg
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Encodes frames rebuilt from tile updates for viewers, recordings and clips that need whole JPEGs
+REASSEMBLY_ENCODER = JpegEncoder(quality=85)
+
+class RelayFrame:
+    """A frame received from a sender, serialized at most once per transport format"""
+
+    __slots__ = ('camera_id', 'sequence', 'timestamp', 'capture_ms', 'trace', 'base', 'update', 'rendition',
+                 '_jpeg', '_base64', '_binary', '_text', '_tiles', '_image')
+
+    def __init__(self, camera_id: str, sequence: int, timestamp: float,
+                 jpeg=None, base64_data: Optional[str] = None, binary: Optional[bytes] = None,
+                 capture_ms: Optional[float] = None, trace: Optional[tuple] = None,
+                 base: Optional['RelayFrame'] = None, update=None, tiles: Optional[bytes] = None,
+                 rendition: Optional[str] = None):
+        self.camera_id = camera_id
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.capture_ms = capture_ms  # sender's wall-clock capture time (binary senders only)
+        self.trace = trace  # sender stage offsets from frame_protocol.TRACE, if the sender traced
+        self.base = base  # keyframe a tile update paints over
+        self.update = update  # frame_protocol.TileUpdate of a tile update
+        self.rendition = rendition  # name of the scaled-down rendition this frame is (renditions.py)
+        self._jpeg = jpeg
+        self._base64 = base64_data
+        self._binary = binary
+        self._text: Optional[str] = None
+        self._tiles = tiles  # tile update message for viewers that negotiated codec=tiles
+        self._image = None
+
+    @property
+    def jpeg(self):
+        """Raw JPEG bytes (view into the sender message when it arrived as binary)"""
+        if self._jpeg is None:
+            if self.update is None:
+                self._jpeg = base64.b64decode(self._base64)
+            else:
+                # Tile update: rebuilt on top of the decoded keyframe, only once somebody needs a whole JPEG
+                try:
+                    self._jpeg = REASSEMBLY_ENCODER.encode(assemble(self.base.image, self.update))
+                except ValueError as e:
+                    logger.warning(f"Could not rebuild frame {self.sequence} of {self.camera_id}: {e}")
+                    self._jpeg = self.base.jpeg
+        return self._jpeg
+
+    @property
+    def assembled(self) -> bool:
+        """False for a tile update whose whole JPEG has not been rebuilt yet"""
+        return self._jpeg is not None or self.update is None
+
+    @property
+    def image(self):
+        """Decoded frame; decoded once per keyframe however many tile updates build on it"""
+        if self._image is None:
+            self._image = decode_jpeg(self.jpeg)
+            if self._image is None:
+                raise ValueError(f"Could not decode keyframe {self.sequence}")
+        return self._image
+
+    @property
+    def base64_data(self) -> str:
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.jpeg).decode('ascii')
+        return self._base64
+
+    @property
+    def binary(self) -> bytes:
+        """Binary message for viewers that negotiated format=binary"""
+        if self._binary is None:
+            self._binary = pack_frame(self.camera_id, self.sequence, self.jpeg, self.timestamp)
+        return self._binary
+
+    @property
+    def text(self) -> str:
+        """JSON message for legacy base64 viewers"""
+        if self._text is None:
+            message = {
+                'type': 'frame',
+                'camera_id': self.camera_id,
+                'sequence': self.sequence,
+                'timestamp': self.timestamp,
+                'data': self.base64_data
+            }
+            if self.rendition:
+                message['rendition'] = self.rendition
+            self._text = json.dumps(message)
+        return self._text
+
+    def serialize(self, transport_format: str, codec: str = CODEC_JPEG) -> Union[str, bytes]:
+        if codec == CODEC_TILES and self._tiles is not None:
+            return self._tiles
+        return self.binary if transport_format == FORMAT_BINARY else self.text
+    
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the serializations and decoded image materialized so far, not by the base keyframe"""
+        # A memoryview JPEG points into the sender's binary message and costs nothing extra
+        jpeg = None if isinstance(self._jpeg, memoryview) else self._jpeg
+        image = self._image.nbytes if self._image is not None else 0
+        return image + sum(len(part) for part in (jpeg, self._base64, self._binary, self._text, self._tiles)
+                           if part is not None)
+
+def rebuild(frames: List[RelayFrame]):
+    """Reassembly pool: rebuild the whole JPEGs of tile updates"""
+    for frame in frames:
+        frame_jpeg(frame)
+
+class RelayMetadata:
+    """Detection metadata from a sender, sharing the sequence number of its frame"""
+
+    __slots__ = ('camera_id', 'sequence', 'timestamp', 'metadata', '_binary', '_text')
+
+    def __init__(self, camera_id: str, sequence: int, timestamp: float, metadata: dict,
+                 binary: Optional[bytes] = None):
+        self.camera_id = camera_id
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.metadata = metadata
+        self._binary = binary
+        self._text: Optional[str] = None
+
+    def serialize(self, transport_format: str, codec: str = CODEC_JPEG) -> Union[str, bytes]:
+        if transport_format == FORMAT_BINARY:
+            if self._binary is None:
+                self._binary = pack_metadata(self.camera_id, self.sequence, self.metadata, self.timestamp)
+            return self._binary
+        if self._text is None:
+            self._text = metadata_text(self.camera_id, self.sequence, self.metadata, self.timestamp)
+        return self._text
+    
+    @property
+    def nbytes(self) -> int:
+        return 256 + sum(len(part) for part in (self._binary, self._text) if part is not None)
+
+class ViewerChannel:
+    """Bounded per-camera outbound queues and a writer task for a single viewer"""
+
+    def __init__(self, websocket, connection_info: dict, max_queue: int = 2):
+        self.websocket = websocket
+        self.info = connection_info
+        self.format = connection_info.get('format', FORMAT_TEXT)
+        self.codec = connection_info.get('codec', CODEC_JPEG)
+        self.rendition = connection_info.get('rendition', FULL)
+        self.address = str(websocket.remote_address)
+        remote = websocket.remote_address
+        self.label = f"{remote[0]}:{remote[1]}" if remote else self.address  # metrics label
+        self.max_queue = max_queue
+        
+        # Camera IDs or shell-style patterns this viewer wants frames for
+        self.patterns: Set[str] = set(connection_info.get('cameras') or ['*'])
+        
+        # camera_id -> deque of (message, received_ms, capture_ms, frame); oldest messages fall off the left
+        # when the viewer lags ("latest frame wins") without one busy camera starving the others
+        self.queues: Dict[str, deque] = OrderedDict()
+        self.keyframes: Dict[str, int] = {}  # camera_id -> keyframe sequence last written (codec=tiles)
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        
+        self.sent = 0
+        self.dropped = 0
+        self.bytes_sent = 0
+        self.latency = StageHistograms()
+    
+    def start(self, on_sent=None):
+        self.task = asyncio.ensure_future(self.run(on_sent))
+    
+    def matches(self, camera_id: str) -> bool:
+        return any(fnmatchcase(camera_id, pattern) for pattern in self.patterns)
+    
+    def enqueue_replay(self, items: list, camera_id: str = ''):
+        """Queue cached frames and metadata for a camera in one go, ahead of live frames"""
+        if not items:
+            return
+        messages = [(item.serialize(self.format, self.codec), None, None,
+                     item if isinstance(item, RelayFrame) else None) for item in items]
+        queue = self.queues.get(camera_id)
+        if queue is None or len(queue) + len(messages) > queue.maxlen:
+            # A one-off deep queue; it is replaced by a regular one once drained
+            queue = deque(list(queue or []) + messages, maxlen=max(self.max_queue, len(messages)))
+        else:
+            queue.extend(messages)
+        self.queues[camera_id] = queue
+        self.ready.set()
+    
+    def enqueue(self, message: Union[str, bytes], camera_id: str = '', received_ms: Optional[float] = None,
+                capture_ms: Optional[float] = None, frame: Optional[RelayFrame] = None) -> bool:
+        """Queue a message without waiting on the network; returns True if an older one was dropped"""
+        queue = self.queues.get(camera_id)
+        if queue is None:
+            queue = self.queues[camera_id] = deque(maxlen=self.max_queue)
+        dropped = len(queue) == queue.maxlen
+        if dropped:
+            self.dropped += 1
+        queue.append((message, received_ms, capture_ms, frame))
+        self.ready.set()
+        return dropped
+    
+    def next_message(self) -> Optional[tuple]:
+        """Pop the next (message, received_ms, capture_ms, frame), round-robin across cameras"""
+        while self.queues:
+            camera_id, queue = next(iter(self.queues.items()))
+            if not queue:
+                del self.queues[camera_id]
+                continue
+            message = queue.popleft()
+            self.queues.move_to_end(camera_id)
+            return message
+        return None
+    
+    async def run(self, on_sent=None):
+        """Drain the queues to the viewer until the connection closes"""
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                while True:
+                    item = self.next_message()
+                    if item is None:
+                        break
+                    message, received_ms, capture_ms, frame = item
+                    if frame is not None and self.codec == CODEC_TILES:
+                        await self.send_keyframe(frame)
+                    await self.websocket.send(message)
+                    self.sent += 1
+                    self.bytes_sent += len(message)
+                    if received_ms is not None:
+                        now_ms = time.time() * 1000
+                        self.latency.observe(STAGE_RELAY, now_ms - received_ms)
+                        if capture_ms is not None:
+                            self.latency.observe(STAGE_DELIVERY, now_ms - capture_ms)
+                    if on_sent:
+                        on_sent()
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending frame to viewer {self.address}: {e}")
+    
+    async def send_keyframe(self, frame: RelayFrame):
+        """Tile updates only paint over their keyframe; write it first when the queue dropped it"""
+        keyframe = frame.base or frame
+        if frame.base is not None and self.keyframes.get(frame.camera_id) != keyframe.sequence:
+            message = keyframe.serialize(self.format, self.codec)
+            await self.websocket.send(message)
+            self.sent += 1
+            self.bytes_sent += len(message)
+        self.keyframes[frame.camera_id] = keyframe.sequence
+    
+    def close(self):
+        if self.task:
+            self.task.cancel()
+    
+    def get_stats(self) -> dict:
+        return {
+            'address': self.address,
+            'role': self.info.get('role'),
+            'format': self.format,
+            'codec': self.codec,
+            'rendition': self.rendition,
+            'subscriptions': sorted(self.patterns),
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'bytes_sent': self.bytes_sent,
+            'queued': self.queue_depth(),
+            'latency': self.latency.snapshot()
+        }
+    
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+class FrameCache:
+    """Recent serialized frames and metadata per camera for late joiners and resuming viewers"""
+
+    def __init__(self, max_frames: int = 1, max_bytes: int = 64 * 1024 * 1024, max_age: float = 30.0):
+        self.max_frames = max(1, max_frames)  # frames kept per camera (metadata rides along)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        
+        self.rings: Dict[str, deque] = {}  # camera_id -> deque of (received, item)
+        self.ring_bytes: Dict[str, int] = {}  # camera_id -> memory its ring held when last measured
+        self.total_bytes = 0
+        self.evicted = 0
+        self.next_sweep = time.monotonic() + self.max_age
+    
+    def add(self, item: Union[RelayFrame, RelayMetadata]):
+        now = time.monotonic()
+        ring = self.rings.setdefault(item.camera_id, deque())
+        ring.append((now, item))
+        
+        # Per-camera depth counts frames only; drop the oldest frame and anything before it
+        while sum(1 for _, entry in ring if isinstance(entry, RelayFrame)) > self.max_frames:
+            self._evict_oldest(ring)
+        while ring and now - ring[0][0] > self.max_age:
+            self._evict_oldest(ring)
+        # Cached frames keep growing (serialized per format, decoded, rebuilt from tiles), so measure on every add
+        self._measure(item.camera_id)
+        
+        # Global memory limit: evict the oldest entry across all cameras
+        while self.total_bytes > self.max_bytes:
+            oldest = min((camera_id for camera_id, r in self.rings.items() if r),
+                         key=lambda camera_id: self.rings[camera_id][0][0], default=None)
+            if oldest is None:
+                break
+            self._evict_oldest(self.rings[oldest])
+            self._measure(oldest)
+    
+    def _evict_oldest(self, ring: deque):
+        ring.popleft()
+        self.evicted += 1
+    
+    def _measure(self, camera_id: str):
+        """Re-measure a ring, counting the keyframes its tile updates keep alive"""
+        size = retained_size(item for _, item in self.rings.get(camera_id, ()))
+        self.total_bytes += size - self.ring_bytes.get(camera_id, 0)
+        self.ring_bytes[camera_id] = size
+    
+    def replay(self, camera_id: str, since: Optional[int] = None) -> list:
+        """Items to send a viewer: everything after `since`, or the latest frame with its metadata"""
+        ring = self.rings.get(camera_id)
+        if not ring:
+            return []
+        
+        cutoff = time.monotonic() - self.max_age
+        items = [item for received, item in ring if received >= cutoff]
+        if since is not None:
+            return [item for item in items if item.sequence > since]
+        
+        frames = [item for item in items if isinstance(item, RelayFrame)]
+        if not frames:
+            return []
+        latest = frames[-1]
+        return [item for item in items if item.sequence == latest.sequence]
+    
+    def sweep(self) -> list:
+        """Drop the rings of cameras that stopped sending; runs at most once per max_age, returns their IDs"""
+        now = time.monotonic()
+        if now < self.next_sweep:
+            return []
+        self.next_sweep = now + self.max_age
+        
+        # add() only ages out the ring of the camera it is adding to, so silent cameras are caught here
+        stale = []
+        for camera_id, ring in list(self.rings.items()):
+            while ring and now - ring[0][0] > self.max_age:
+                self._evict_oldest(ring)
+            self._measure(camera_id)
+            if not ring:
+                del self.rings[camera_id]
+                del self.ring_bytes[camera_id]
+                stale.append(camera_id)
+        return stale
+    
+    def get_stats(self) -> dict:
+        return {
+            'cameras': len(self.rings),
+            'items': sum(len(ring) for ring in self.rings.values()),
+            'bytes': self.total_bytes,
+            'evicted': self.evicted
+        }
+
 class CameraWebSocketServer:
-    def __init__(self, host='127.0.0.1', port=7777, token='StrongPassword123'):
+    def __init__(self, host='127.0.0.1', port=7777, token='StrongPassword123', viewer_queue_size=2,
+                 cache_frames=1, cache_bytes=64 * 1024 * 1024, cache_max_age=30.0, bus=None, reuse_port=False,
+                 recorder=None, clips=None, metrics_port=None, metrics_host='127.0.0.1', renditions=None):
         self.host = host
         self.port = port
         self.token = token
         
+        # Multi-worker relay: frames from local senders are published to the bus and
+        # frames from other workers arrive through receive_remote (see camera_relay.py)
+        self.bus = bus
+        self.reuse_port = reuse_port
+        
+        # Optional FrameRecorder (camera_recorder.py); writes happen on its own thread
+        self.recorder = recorder
+        # Optional ClipExtractor (event_clips.py): pre-roll of every camera seen by this relay
+        self.clips = clips
+        self.viewer_queue_size = viewer_queue_size
+        
         # Connection storage
         self.senders: Dict[str, websockets.WebSocketServerProtocol] = {}  # camera_id -> websocket
-        self.viewers: Dict[str, Set[websockets.WebSocketServerProtocol]] = {  # role -> set of websockets
-            'supervisor': set(),
-            'admin': set()
+        self.viewers: Dict[str, Dict[websockets.WebSocketServerProtocol, ViewerChannel]] = {  # role -> websocket -> channel
+            'supervisor': {},
+            'admin': {}
         }
+        self.sequences: Dict[str, int] = {}  # camera_id -> last sequence number assigned to text frames
+        self.detections: Dict[str, dict] = {}  # camera_id -> latest detection metadata
+        self.label_counts: Dict[str, Dict[str, int]] = {}  # camera_id -> label -> detections seen
+        self.camera_stats: Dict[str, Dict[str, int]] = {}  # camera_id -> frames/bytes in, enqueued/dropped out
+        self.camera_latency: Dict[str, StageHistograms] = {}  # camera_id -> stage latency histograms
+        self.camera_roles: Dict[str, str] = {}  # camera_id -> role its frames are broadcast to
+        self.keyframes: Dict[str, RelayFrame] = {}  # camera_id -> latest whole binary frame, the base of tile updates
+        self.subscribers: Dict[str, Set[ViewerChannel]] = {}  # camera_id -> subscribed viewer channels
+        
+        # Late-joiner cache: latest (or last few) serialized frames per camera
+        self.cache = FrameCache(cache_frames, cache_bytes, cache_max_age)
+        
+        # Scaled-down renditions for dashboard grids, rendered only while a viewer asks for them
+        self.renditions = renditions or RenditionPool()
+        
+        # Tile updates are rebuilt into whole JPEGs (decode, paste, re-encode) off the event loop
+        self.reassembly = ThreadPoolExecutor(max_workers=2, thread_name_prefix='reassemble')
+        # camera_id -> newest update waiting for the one being rebuilt (None if nothing waits)
+        self.reassembling: Dict[str, Optional[tuple]] = {}
+        
+        # Optional Prometheus-style endpoint (relay_metrics.py), local by default
+        self.metrics_server = None
+        if metrics_port:
+            self.metrics_server = MetricsHTTPServer(self.render_metrics, metrics_host, metrics_port)
         
         # Statistics
         self.stats = {
@@ -51,6 +465,19 @@ class CameraWebSocketServer:
             role = params.get('role', [None])[0]
             user_type = params.get('user_type', ['viewer'])[0]
             camera_id = params.get('camera_id', [None])[0]
+            transport_format = params.get('format', [FORMAT_TEXT])[0]
+            codec = params.get('codec', [CODEC_JPEG])[0]
+            rendition = params.get('rendition', [FULL])[0]
+            feedback = params.get('feedback', ['0'])[0] == '1'
+            
+            cameras = [c for c in params.get('cameras', [''])[0].split(',') if c]
+            
+            # Resuming viewers: resume=camera-1:120,camera-2:87 (last sequence seen per camera)
+            resume = {}
+            for entry in params.get('resume', [''])[0].split(','):
+                if entry:
+                    resume_camera, _, resume_sequence = entry.rpartition(':')
+                    resume[resume_camera] = int(resume_sequence)
             
             # Validate token
             if token != self.token:
@@ -60,14 +487,40 @@ class CameraWebSocketServer:
             if role not in ['supervisor', 'admin']:
                 return False, "Invalid role"
             
-            # Validate sender requirements
+            # Validate sender requirements; a multiplexed sender lists its cameras instead
             if user_type == 'sender' and not camera_id:
-                return False, "Camera ID required for senders"
+                if not cameras:
+                    return False, "Camera ID required for senders"
+                camera_id = cameras[0]
+            
+            sender_cameras = (cameras or [camera_id]) if user_type == 'sender' else []
+            if len(sender_cameras) > 1 and transport_format != FORMAT_BINARY:
+                return False, "Multiplexed senders need the binary format"
+            
+            # Validate transport format
+            if transport_format not in FORMATS:
+                return False, "Invalid format"
+            
+            # Viewers that rebuild frames from tile updates themselves; everyone else gets whole JPEGs
+            if codec not in CODECS:
+                return False, "Invalid codec"
+            if codec == CODEC_TILES and transport_format != FORMAT_BINARY:
+                return False, "Tile updates need the binary format"
+            
+            if rendition != FULL and rendition not in self.renditions.renditions:
+                return False, "Invalid rendition"
             
             return True, {
                 'role': role,
                 'user_type': user_type,
-                'camera_id': camera_id
+                'camera_id': camera_id,
+                'format': transport_format,
+                'codec': codec,
+                'rendition': rendition,
+                'feedback': feedback,
+                'cameras': cameras,
+                'sender_cameras': sender_cameras,
+                'resume': resume
             }
             
         except Exception as e:
@@ -77,14 +530,19 @@ class CameraWebSocketServer:
         """Register a new connection"""
         role = connection_info['role']
         user_type = connection_info['user_type']
-        camera_id = connection_info['camera_id']
         
         if user_type == 'sender':
-            self.senders[camera_id] = websocket
-            logger.info(f"📹 {role} sender registered for camera {camera_id}")
+            for camera_id in connection_info['sender_cameras']:
+                self.senders[camera_id] = websocket
+                self.index_camera(camera_id, role)
+                logger.info(f"📹 {role} sender registered for camera {camera_id}")
         else:
-            self.viewers[role].add(websocket)
-            logger.info(f"👀 {role} viewer registered (total: {len(self.viewers[role])})")
+            channel = ViewerChannel(websocket, connection_info, self.viewer_queue_size)
+            channel.start(self._count_frame_sent)
+            self.viewers[role][websocket] = channel
+            subscribed = self.index_channel(channel)
+            self.replay_cached(channel, subscribed, connection_info.get('resume', {}))
+            logger.info(f"👀 {role} viewer registered (total: {len(self.viewers[role])}, format: {connection_info['format']})")
         
         self.stats['connections'] += 1
     
@@ -92,52 +550,351 @@ class CameraWebSocketServer:
         """Unregister a connection"""
         role = connection_info['role']
         user_type = connection_info['user_type']
-        camera_id = connection_info['camera_id']
         
         try:
-            if user_type == 'sender' and camera_id in self.senders:
-                if self.senders[camera_id] == websocket:
-                    del self.senders[camera_id]
-                    logger.info(f"❌ {role} sender disconnected for camera {camera_id}")
+            if user_type == 'sender':
+                for camera_id in connection_info['sender_cameras']:
+                    if self.senders.get(camera_id) == websocket:
+                        del self.senders[camera_id]
+                        logger.info(f"❌ {role} sender disconnected for camera {camera_id}")
             else:
-                if websocket in self.viewers[role]:
-                    self.viewers[role].remove(websocket)
-                    logger.info(f"❌ {role} viewer disconnected")
+                channel = self.viewers[role].pop(websocket, None)
+                if channel:
+                    channel.close()
+                    for subscribers in self.subscribers.values():
+                        subscribers.discard(channel)
+                    logger.info(f"❌ {role} viewer disconnected (dropped {channel.dropped} frames)")
             
             self.stats['connections'] -= 1
             
         except Exception as e:
             logger.error(f"Error unregistering connection: {e}")
     
-    async def broadcast_frame(self, role: str, frame_data: str, camera_id: str):
+    def build_frame(self, frame_data: Union[str, bytes], camera_id: str) -> Union[RelayFrame, RelayMetadata, None]:
+        """Wrap a sender message for relaying without re-encoding the image"""
+        if isinstance(frame_data, str):
+            if frame_data.startswith('{'):
+                return self.build_text_metadata(frame_data, camera_id)
+            
+            # Legacy text sender: base64 JPEG, sequenced by the server
+            sequence = self.sequences.get(camera_id, 0) + 1
+            self.sequences[camera_id] = sequence
+            return RelayFrame(camera_id, sequence, asyncio.get_event_loop().time() * 1000,
+                              base64_data=frame_data)
+        
+        try:
+            header, payload = unpack_frame(frame_data)
+        except ValueError as e:
+            logger.warning(f"Dropping malformed binary frame from {camera_id}: {e}")
+            return None
+        
+        # Forward the sender's message untouched when it already carries the registered camera ID
+        binary = frame_data if header.camera_id == camera_id else None
+        
+        if header.msg_type == MSG_METADATA:
+            try:
+                metadata = decode_metadata(payload)
+            except ValueError as e:
+                logger.warning(f"Dropping malformed metadata from {camera_id}: {e}")
+                return None
+            return self.index_detections(
+                RelayMetadata(camera_id, header.sequence, header.timestamp, metadata, binary=binary))
+        
+        if header.msg_type == MSG_TILES:
+            return self.build_tile_frame(header, payload, frame_data if binary else None, camera_id)
+        
+        if header.msg_type != MSG_FRAME:
+            return None
+        
+        frame = RelayFrame(camera_id, header.sequence, header.timestamp, jpeg=payload, binary=binary,
+                           capture_ms=header.timestamp, trace=header.trace)
+        self.keyframes[camera_id] = frame
+        return frame
+    
+    def build_tile_frame(self, header, payload: memoryview, message: Optional[bytes],
+                         camera_id: str) -> Optional[RelayFrame]:
+        """Tie a tile update to the keyframe it paints over; updates without that keyframe are dropped"""
+        try:
+            update = unpack_tiles(payload)
+        except ValueError as e:
+            logger.warning(f"Dropping malformed tile update from {camera_id}: {e}")
+            return None
+        
+        base = self.keyframes.get(camera_id)
+        if base is None or base.sequence != update.key_sequence:
+            # The keyframe never reached this relay or was superseded; a new one follows within seconds
+            return None
+        
+        if message is None:
+            message = pack_frame(camera_id, header.sequence, payload, header.timestamp, msg_type=MSG_TILES)
+        return RelayFrame(camera_id, header.sequence, header.timestamp, capture_ms=header.timestamp,
+                          trace=header.trace, base=base, update=update, tiles=message)
+    
+    def build_text_metadata(self, message: str, camera_id: str) -> Optional[RelayMetadata]:
+        """Parse a JSON metadata message from a text sender"""
+        try:
+            data = json.loads(message)
+        except ValueError as e:
+            logger.warning(f"Dropping malformed metadata from {camera_id}: {e}")
+            return None
+        
+        if data.pop('type', None) != 'metadata':
+            return None
+        data.pop('camera_id', None)
+        sequence = int(data.pop('sequence', 0))
+        timestamp = data.pop('timestamp', asyncio.get_event_loop().time() * 1000)
+        
+        # The frame that follows belongs to this sequence number
+        self.sequences[camera_id] = sequence - 1
+        return self.index_detections(RelayMetadata(camera_id, sequence, timestamp, data))
+    
+    def index_detections(self, item: RelayMetadata) -> RelayMetadata:
+        """Remember the latest detections per camera and count labels seen"""
+        camera_id = item.camera_id
+        self.detections[camera_id] = dict(item.metadata, sequence=item.sequence, timestamp=item.timestamp)
+        counts = self.label_counts.setdefault(camera_id, {})
+        for label in item.metadata.get('labels', []):
+            counts[label] = counts.get(label, 0) + 1
+        return item
+    
+    def get_detections(self, camera_id: Optional[str] = None) -> dict:
+        """Latest detection metadata and label counts, for one camera or all"""
+        camera_ids = [camera_id] if camera_id else list(self.detections)
+        return {
+            cid: {'latest': self.detections.get(cid), 'label_counts': dict(self.label_counts.get(cid, {}))}
+            for cid in camera_ids
+        }
+    
+    async def broadcast_frame(self, role: str, frame_data: Union[str, bytes], camera_id: str):
         """Broadcast frame to all viewers of a specific role"""
+        frame = self.relay_frame(role, frame_data, camera_id)
+        
+        # Only frames from local senders are recorded, so relay workers never record twice
+        if self.recorder and isinstance(frame, RelayFrame):
+            self.recorder.record(camera_id, time.time() * 1000, frame)
+    
+    def receive_remote(self, role: str, camera_id: str, frame_data: Union[str, bytes]):
+        """Frame published on the bus by a sender attached to another relay worker"""
+        self.relay_frame(role, frame_data, camera_id)
+    
+    def relay_frame(self, role: str, frame_data: Union[str, bytes], camera_id: str):
+        """Fan a sender message out to subscribers without waiting on any of them"""
         if role not in self.viewers:
+            return None
+        
+        received_ms = time.time() * 1000
+        frame = self.build_frame(frame_data, camera_id)
+        if frame is None:
+            return None
+        
+        if self.camera_roles.get(camera_id) != role:
+            self.index_camera(camera_id, role)
+        
+        counters = self.camera_stats.get(camera_id)
+        if counters is None:
+            counters = self.camera_stats[camera_id] = {'frames': 0, 'bytes': 0, 'enqueued': 0, 'dropped': 0}
+        counters['frames'] += 1
+        counters['bytes'] += len(frame_data)
+        relayed = frame if isinstance(frame, RelayFrame) else None
+        capture_ms = relayed.capture_ms if relayed else None
+        
+        # Serialize once per format and codec and hand off to each subscriber's writer task
+        renditions = set()
+        whole = []  # viewers of whole frames waiting for a tile update to be rebuilt
+        for channel in list(self.subscribers.get(camera_id, ())):
+            if relayed and channel.rendition != FULL:
+                renditions.add(channel.rendition)
+                continue
+            if relayed and not relayed.assembled and channel.codec != CODEC_TILES:
+                whole.append(channel)
+                continue
+            counters['enqueued'] += 1
+            if channel.enqueue(frame.serialize(channel.format, channel.codec), camera_id, received_ms, capture_ms,
+                               relayed):
+                counters['dropped'] += 1
+        
+        if whole:
+            self.reassemble(relayed, whole, received_ms)
+        
+        # Only renditions somebody is subscribed to are rendered, each at its own FPS
+        for name in renditions:
+            self.renditions.submit(camera_id, name, relayed, functools.partial(self.deliver_rendition, received_ms))
+        
+        self.record_latency(camera_id, frame, received_ms, capture_ms)
+        
+        # Cache after fan-out so the size accounts for the formats already serialized
+        self.cache.add(frame)
+        for stale in self.cache.sweep():
+            self.keyframes.pop(stale, None)
+        if self.clips and isinstance(frame, RelayFrame):
+            self.clips.add_frame(camera_id, time.time() * 1000, frame)
+        return frame
+    
+    def reassemble(self, frame: RelayFrame, channels: List[ViewerChannel], received_ms: float):
+        """Rebuild a tile update on the reassembly pool; while one is in flight for the camera, the latest wins"""
+        camera_id = frame.camera_id
+        if camera_id in self.reassembling:
+            waiting = self.reassembling[camera_id]
+            if waiting:
+                self.camera_stats[camera_id]['dropped'] += len(waiting[1])
+            self.reassembling[camera_id] = (frame, channels, received_ms)
+            return
+        self.reassembling[camera_id] = None
+        future = asyncio.get_event_loop().run_in_executor(self.reassembly, frame_jpeg, frame)
+        future.add_done_callback(functools.partial(self.deliver_reassembled, frame, channels, received_ms))
+    
+    def deliver_reassembled(self, frame: RelayFrame, channels: List[ViewerChannel], received_ms: float,
+                            future: asyncio.Future):
+        camera_id = frame.camera_id
+        waiting = self.reassembling.pop(camera_id, None)
+        keyframe = self.keyframes.get(camera_id)
+        # Skipped when a newer keyframe has already gone out to these viewers
+        if not (future.cancelled() or future.exception() or keyframe is None or keyframe.sequence > frame.sequence):
+            counters = self.camera_stats[camera_id]
+            subscribers = self.subscribers.get(camera_id, ())
+            for channel in channels:
+                if channel in subscribers:
+                    counters['enqueued'] += 1
+                    if channel.enqueue(frame.serialize(channel.format, channel.codec), camera_id, received_ms,
+                                       frame.capture_ms, frame):
+                        counters['dropped'] += 1
+        if waiting:
+            self.reassemble(*waiting)
+    
+    def deliver_rendition(self, received_ms: Optional[float], camera_id: str, name: str, frame: RelayFrame,
+                          jpeg: bytes):
+        """A rendition came back from the pool: cache it and queue it for the viewers that chose it"""
+        rendered = RelayFrame(camera_id, frame.sequence, frame.timestamp, jpeg=jpeg, capture_ms=frame.capture_ms,
+                              rendition=name)
+        self.renditions.store(camera_id, name, rendered)
+        counters = self.camera_stats.get(camera_id, {})
+        for channel in list(self.subscribers.get(camera_id, ())):
+            if channel.rendition == name:
+                counters['enqueued'] = counters.get('enqueued', 0) + 1
+                if channel.enqueue(rendered.serialize(channel.format), camera_id, received_ms, frame.capture_ms):
+                    counters['dropped'] = counters.get('dropped', 0) + 1
+    
+    def record_latency(self, camera_id: str, frame, received_ms: float, capture_ms: Optional[float]):
+        """Per-camera stage histograms; sender clocks are assumed to be NTP-synced with the relay"""
+        latency = self.camera_latency.get(camera_id)
+        if latency is None:
+            latency = self.camera_latency[camera_id] = StageHistograms()
+        latency.observe(STAGE_FANOUT, time.time() * 1000 - received_ms)
+        if capture_ms is None:
+            return
+        latency.observe(STAGE_INGEST, received_ms - capture_ms)
+        if frame.trace:
+            encoded_ms, sent_ms = frame.trace
+            latency.observe(STAGE_ENCODE, encoded_ms)
+            latency.observe(STAGE_SENDER_QUEUE, sent_ms - encoded_ms)
+            latency.observe(STAGE_NETWORK, received_ms - capture_ms - sent_ms)
+    
+    def index_camera(self, camera_id: str, role: str):
+        """Build the subscriber set for a camera from its role's viewers"""
+        self.camera_roles[camera_id] = role
+        self.subscribers[camera_id] = {
+            channel for channel in self.viewers.get(role, {}).values() if channel.matches(camera_id)
+        }
+    
+    def index_channel(self, channel: ViewerChannel) -> List[str]:
+        """Sync a viewer's subscriptions into the camera index; returns newly subscribed cameras"""
+        added = []
+        for camera_id, role in self.camera_roles.items():
+            subscribers = self.subscribers.setdefault(camera_id, set())
+            if role == channel.info['role'] and channel.matches(camera_id):
+                if channel not in subscribers:
+                    subscribers.add(channel)
+                    added.append(camera_id)
+            else:
+                subscribers.discard(channel)
+        return added
+    
+    def update_subscription(self, channel: ViewerChannel, data: dict):
+        """Handle subscribe/unsubscribe messages: {"type": "subscribe", "cameras": ["camera-1", "lobby-*"]},
+        optionally choosing a rendition for the connection: {"type": "subscribe", "rendition": "thumb"}"""
+        cameras = data.get('cameras', [])
+        if isinstance(cameras, str):
+            cameras = [cameras]
+        rendition = data.get('rendition', channel.rendition)
+        error = None
+        if not isinstance(cameras, list) or not all(isinstance(camera, str) for camera in cameras):
+            # Anything else in the patterns would break matching for every later sender of the role
+            error = 'cameras must be a camera ID or pattern, or a list of them'
+        elif not isinstance(rendition, str) or (rendition != FULL and rendition not in self.renditions.renditions):
+            error = 'Invalid rendition'
+        if error:
+            channel.enqueue(json.dumps({'type': 'error', 'request': data['type'], 'message': error}), '')
             return
         
-        message = json.dumps({
-            'type': 'frame',
-            'camera_id': camera_id,
-            'timestamp': asyncio.get_event_loop().time() * 1000,
-            'data': frame_data
-        })
+        if data['type'] == 'subscribe':
+            if data.get('replace'):
+                channel.patterns = set()
+            channel.patterns.update(cameras)
+        else:
+            channel.patterns.difference_update(cameras)
         
-        # Get list of viewers to avoid modification during iteration
-        viewers = list(self.viewers[role])
-        disconnected = []
+        changed = rendition != channel.rendition
+        if changed:
+            channel.rendition = rendition
         
-        for viewer in viewers:
-            try:
-                await viewer.send(message)
-                self.stats['frames_sent'] += 1
-            except websockets.exceptions.ConnectionClosed:
-                disconnected.append(viewer)
-            except Exception as e:
-                logger.error(f"Error sending frame to viewer: {e}")
-                disconnected.append(viewer)
-        
-        # Remove disconnected viewers
-        for viewer in disconnected:
-            self.viewers[role].discard(viewer)
+        added = self.index_channel(channel)
+        subscribed = sorted(cid for cid, subscribers in self.subscribers.items() if channel in subscribers)
+        # A new rendition repaints every subscribed camera at the new size
+        self.replay_cached(channel, subscribed if changed else added, {})
+        
+        channel.enqueue(json.dumps({
+            'type': 'subscribed',
+            'patterns': sorted(channel.patterns),
+            'cameras': subscribed,
+            'rendition': channel.rendition
+        }), '')
+    
+    async def send_feedback(self, websocket, connection_info, interval: float = 1.0):
+        """Periodically tell a sender how its frames fare with viewers (for adaptive quality)"""
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                for camera_id in connection_info['sender_cameras']:
+                    counters = self.camera_stats.get(camera_id, {})
+                    await websocket.send(json.dumps({
+                        'type': 'feedback',
+                        'camera_id': camera_id,
+                        'viewers': len(self.subscribers.get(camera_id, ())),
+                        'enqueued': counters.get('enqueued', 0),
+                        'dropped': counters.get('dropped', 0)
+                    }))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+    
+    def replay_cached(self, channel: ViewerChannel, camera_ids: Iterable[str], resume: Dict[str, int]):
+        """Give a new subscriber an instant first paint, or the frames it missed while reconnecting"""
+        for camera_id in camera_ids:
+            items = self.cache.replay(camera_id, resume.get(camera_id))
+            if channel.rendition == FULL:
+                pending = [item for item in items if isinstance(item, RelayFrame) and not item.assembled]
+                if pending and channel.codec != CODEC_TILES:
+                    # Cached tile updates are rebuilt on the reassembly pool before whole-frame viewers get them
+                    future = asyncio.get_event_loop().run_in_executor(self.reassembly, rebuild, pending)
+                    future.add_done_callback(functools.partial(self.replay_rebuilt, channel, items, camera_id))
+                else:
+                    channel.enqueue_replay(items, camera_id)
+                continue
+            
+            # Renditions are cached on their own; without a recent one, render the latest cached frame
+            rendered = self.renditions.cached(camera_id, channel.rendition)
+            frames = [item for item in items if isinstance(item, RelayFrame)]
+            if rendered is not None:
+                channel.enqueue_replay([rendered], camera_id)
+            elif frames:
+                self.renditions.submit(camera_id, channel.rendition, frames[-1],
+                                       functools.partial(self.deliver_rendition, None))
+    
+    def replay_rebuilt(self, channel: ViewerChannel, items: list, camera_id: str, future: asyncio.Future):
+        if not future.cancelled() and not channel.websocket.closed:
+            channel.enqueue_replay(items, camera_id)
+    
+    def _count_frame_sent(self):
+        self.stats['frames_sent'] += 1
     
     async def handle_client(self, websocket, path):
         """Handle individual client connections"""
@@ -158,21 +915,42 @@ class CameraWebSocketServer:
         await self.register_connection(websocket, connection_info)
         logger.info(f"📝 Connection registered successfully")
         
+        feedback_task = None
+        if connection_info['user_type'] == 'sender' and connection_info['feedback']:
+            feedback_task = asyncio.ensure_future(self.send_feedback(websocket, connection_info))
+        
         try:
             # Handle messages
             async for message in websocket:
                 if connection_info['user_type'] == 'sender':
+                    camera_id = self.route_sender_message(connection_info, message)
+                    if camera_id is None:
+                        continue
                     # Forward frame to viewers
                     await self.broadcast_frame(
                         connection_info['role'], 
                         message, 
-                        connection_info['camera_id']
+                        camera_id
                     )
+                    if self.bus:
+                        self.bus.publish(connection_info['role'], camera_id, message)
                 else:
                     # Handle viewer messages (ping, etc.)
                     try:
                         data = json.loads(message)
-                        if data.get('type') == 'ping':
+                        if data.get('type') in ('subscribe', 'unsubscribe'):
+                            channel = self.viewers[connection_info['role']].get(websocket)
+                            if channel:
+                                self.update_subscription(channel, data)
+                        elif data.get('type') == 'event':
+                            if connection_info['role'] == 'admin':
+                                reply = {'type': 'clip', 'clip': self.trigger_clip(data)}
+                            else:
+                                # Clips write to disk; only the backend (role=admin) triggers them
+                                reply = {'type': 'error', 'request': 'event',
+                                         'message': 'Only admin connections can trigger clips'}
+                            await websocket.send(json.dumps(reply))
+                        elif data.get('type') == 'ping':
                             await websocket.send(json.dumps({
                                 'type': 'pong',
                                 'timestamp': asyncio.get_event_loop().time() * 1000
@@ -185,9 +963,32 @@ class CameraWebSocketServer:
         except Exception as e:
             logger.error(f"Error handling client: {e}")
         finally:
+            if feedback_task:
+                feedback_task.cancel()
             # Unregister connection
             await self.unregister_connection(websocket, connection_info)
     
+    def route_sender_message(self, connection_info: dict, message: Union[str, bytes]) -> Optional[str]:
+        """Camera a sender message belongs to; multiplexed senders tag each binary message with it"""
+        sender_cameras = connection_info['sender_cameras']
+        if len(sender_cameras) == 1 or isinstance(message, str):
+            return connection_info['camera_id']
+        try:
+            camera_id = peek_camera_id(message)
+        except (ValueError, UnicodeDecodeError) as e:
+            logger.warning(f"Dropping malformed binary frame from multiplexed sender: {e}")
+            return None
+        if camera_id not in sender_cameras:
+            logger.warning(f"Dropping frame for camera {camera_id} not registered by this sender")
+            return None
+        return camera_id
+    
+    def trigger_clip(self, data: dict) -> Optional[dict]:
+        """Cut an event clip across all cameras (crash status, SOS) if clips are enabled"""
+        if not self.clips:
+            return None
+        return self.clips.trigger(str(data.get('reason', 'manual')), details=data.get('details'))
+    
     def get_stats(self):
         """Get server statistics"""
         uptime = asyncio.get_event_loop().time() - self.stats['start_time']
@@ -197,26 +998,91 @@ class CameraWebSocketServer:
             'senders': len(self.senders),
             'viewers': {role: len(viewers) for role, viewers in self.viewers.items()},
             'frames_sent': self.stats['frames_sent'],
+            'cache': self.cache.get_stats(),
+            'recorder': self.recorder.get_stats() if self.recorder else None,
+            'clips': self.clips.get_stats() if self.clips else None,
+            'renditions': self.renditions.get_stats(),
+            'subscribers': {camera_id: len(channels) for camera_id, channels in self.subscribers.items()},
+            'camera_stats': {camera_id: dict(counters) for camera_id, counters in self.camera_stats.items()},
+            'camera_latency': {camera_id: latency.snapshot() for camera_id, latency in self.camera_latency.items()},
+            'frames_dropped': sum(channel.dropped for viewers in self.viewers.values() for channel in viewers.values()),
+            'viewer_stats': [channel.get_stats() for viewers in self.viewers.values() for channel in viewers.values()],
             'fps': self.stats['frames_sent'] / uptime if uptime > 0 else 0
         }
     
-    async def start_server(self):
+    def render_metrics(self) -> str:
+        """Prometheus text exposition of counters, gauges and stage latency histograms"""
+        writer = MetricsWriter()
+        uptime = asyncio.get_event_loop().time() - self.stats['start_time']
+        writer.sample('camera_relay_uptime_seconds', 'gauge', 'Seconds since the server started', round(uptime, 1))
+        writer.sample('camera_relay_connections', 'gauge', 'Open sender and viewer connections',
+                      self.stats['connections'])
+        writer.sample('camera_relay_frames_sent_total', 'counter', 'Messages written to viewers',
+                      self.stats['frames_sent'])
+        writer.sample('camera_relay_cache_bytes', 'gauge', 'Bytes held by the late-joiner cache',
+                      self.cache.total_bytes)
+        writer.sample('camera_relay_renditions_rendered_total', 'counter', 'Scaled-down renditions rendered',
+                      self.renditions.rendered)
+        writer.sample('camera_relay_renditions_pending', 'gauge', 'Renditions being rendered by the pool',
+                      len(self.renditions.pending))
+        
+        cameras = sorted(self.camera_stats.items())
+        for name, key, help_text in (
+                ('camera_relay_camera_frames_total', 'frames', 'Messages received from the camera'),
+                ('camera_relay_camera_bytes_total', 'bytes', 'Bytes received from the camera'),
+                ('camera_relay_camera_enqueued_total', 'enqueued', 'Messages queued for the camera\'s viewers'),
+                ('camera_relay_camera_dropped_total', 'dropped', 'Messages dropped by lagging viewers')):
+            for camera_id, counters in cameras:
+                writer.sample(name, 'counter', help_text, counters.get(key, 0), camera=camera_id)
+        for camera_id, _ in cameras:
+            writer.sample('camera_relay_camera_subscribers', 'gauge', 'Viewers subscribed to the camera',
+                          len(self.subscribers.get(camera_id, ())), camera=camera_id)
+        for camera_id, latency in sorted(self.camera_latency.items()):
+            writer.stages('camera_relay_camera_latency_ms', 'Per-camera frame latency by stage in ms', latency,
+                          camera=camera_id)
+        
+        channels = [(role, channel) for role, viewers in self.viewers.items() for channel in viewers.values()]
+        for name, kind, help_text, value in (
+                ('camera_relay_viewer_sent_total', 'counter', 'Messages written to the viewer',
+                 lambda channel: channel.sent),
+                ('camera_relay_viewer_bytes_total', 'counter', 'Bytes written to the viewer',
+                 lambda channel: channel.bytes_sent),
+                ('camera_relay_viewer_dropped_total', 'counter', 'Messages dropped for the viewer',
+                 lambda channel: channel.dropped),
+                ('camera_relay_viewer_queue_depth', 'gauge', 'Messages waiting for the viewer',
+                 lambda channel: channel.queue_depth())):
+            for role, channel in channels:
+                writer.sample(name, kind, help_text, value(channel), viewer=channel.label, role=role)
+        for role, channel in channels:
+            writer.stages('camera_relay_viewer_latency_ms', 'Per-viewer frame latency by stage in ms',
+                          channel.latency, viewer=channel.label, role=role)
+        return writer.text()
+    
+    async def start_server(self, announce=True):
         """Start the WebSocket server"""
         logger.info(f"Starting WebSocket server on {self.host}:{self.port}")
         
-        # Start the server
+        # Start the server (several worker processes may share the port with reuse_port)
+        extra = {'reuse_port': True} if self.reuse_port else {}
         server = await websockets.serve(
             functools.partial(self.handle_client),
             self.host,
             self.port,
             ping_interval=20,
-            ping_timeout=10
+            ping_timeout=10,
+            **extra
         )
         
+        if self.metrics_server:
+            await self.metrics_server.start()
+        
         logger.info("✅ Camera WebSocket server started successfully")
         logger.info(f"🌐 Server URL: ws://{self.host}:{self.port}")
         logger.info(f"🔑 Authentication token: {self.token}")
         
+        if not announce:
+            return server
+        
         # Print usage instructions
         print("\n" + "="*60)
         print("📹 CAMERA SYSTEM READY")
@@ -235,13 +1101,41 @@ class CameraWebSocketServer:
     async def stop_server(self, server):
         """Stop the WebSocket server"""
         logger.info("Stopping WebSocket server...")
+        if self.metrics_server:
+            self.metrics_server.close()
+        self.renditions.close()
+        self.reassembly.shutdown(wait=False)
         server.close()
         await server.wait_closed()
         logger.info("WebSocket server stopped")
 
 async def main():
+    # Optional recording: CAMERA_RECORD_DIR=/var/lib/camera-archive python camera_server.py
+    recorder = None
+    record_dir = os.getenv('CAMERA_RECORD_DIR')
+    if record_dir:
+        recorder = FrameRecorder(record_dir)
+        recorder.start()
+    
+    # Optional event clips: CAMERA_CLIP_DIR=/var/lib/camera-clips python camera_server.py
+    clips = None
+    clip_dir = os.getenv('CAMERA_CLIP_DIR')
+    if clip_dir:
+        clips = ClipExtractor(clip_dir, pre_seconds=float(os.getenv('CAMERA_CLIP_PRE_SECONDS', '10')),
+                              post_seconds=float(os.getenv('CAMERA_CLIP_POST_SECONDS', '5')))
+        clips.start()
+    
+    # Optional metrics endpoint: CAMERA_METRICS_PORT=9108 python camera_server.py, then GET /metrics
+    metrics_port = int(os.getenv('CAMERA_METRICS_PORT', '0')) or None
+    
+    # Optional rendition sizes: CAMERA_RENDITIONS=thumb=320@5,small=640@10 python camera_server.py
+    rendition_specs = os.getenv('CAMERA_RENDITIONS')
+    renditions = RenditionPool(parse_renditions(rendition_specs.split(',')) if rendition_specs else None,
+                               workers=int(os.getenv('CAMERA_RENDITION_WORKERS', '2')))
+    
     # Create server instance
-    server_instance = CameraWebSocketServer()
+    server_instance = CameraWebSocketServer(recorder=recorder, clips=clips, metrics_port=metrics_port,
+                                            renditions=renditions)
     
     # Start server
     server = await server_instance.start_server()
@@ -253,6 +1147,10 @@ async def main():
         logger.info("Server interrupted by user")
     finally:
         await server_instance.stop_server(server)
+        if recorder:
+            recorder.close()
+        if clips:
+            clips.close()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,286 @@
+"""
+Object Detection Engine for Camera System
+Runs CPU inference in a process pool, batching the latest frame of every camera
+into one model call and publishing detections asynchronously
+"""
+
+import importlib
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class DetectionModel:
+    """Base class for models usable by the engine; instances live inside worker processes"""
+
+    def __init__(self, **options):
+        self.options = options
+
+    def predict(self, frames: List[np.ndarray]) -> List[List[dict]]:
+        """Return one list of detections per frame: {box, class_id, label, score}"""
+        raise NotImplementedError
+
+
+class FakeModel(DetectionModel):
+    """Deterministic stand-in for tests and demos; needs no weights"""
+
+    def predict(self, frames: List[np.ndarray]) -> List[List[dict]]:
+        delay = self.options.get('delay', 0.0)
+        if delay:
+            time.sleep(delay * len(frames))
+
+        results = []
+        for frame in frames:
+            height, width = frame.shape[:2]
+            results.append([{
+                'box': [width * 0.1, height * 0.1, width * 0.4, height * 0.5],
+                'class_id': 0,
+                'label': 'person',
+                'score': round(float(frame.mean()) / 255.0, 3)
+            }])
+        return results
+
+
+class YoloModel(DetectionModel):
+    """Ultralytics YOLO; one batched call per engine batch"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        from ultralytics import YOLO
+        self.model = YOLO(options.get('weights', 'yolov8n.pt'))
+        self.conf = options.get('conf', 0.25)
+
+    def predict(self, frames: List[np.ndarray]) -> List[List[dict]]:
+        results = self.model(frames, imgsz=self.options.get('imgsz', 640), conf=self.conf, verbose=False)
+        output = []
+        for result in results:
+            boxes = result.boxes
+            xyxy = boxes.xyxy.cpu().numpy()
+            classes = boxes.cls.cpu().numpy().astype(int)
+            scores = boxes.conf.cpu().numpy()
+            output.append([{
+                'box': xyxy[i].tolist(),
+                'class_id': int(classes[i]),
+                'label': result.names.get(int(classes[i]), str(classes[i])),
+                'score': round(float(scores[i]), 3)
+            } for i in range(len(classes))])
+        return output
+
+
+MODELS = {
+    'fake': FakeModel,
+    'yolo': YoloModel
+}
+
+
+def resolve_model(name: str):
+    """Look up a model by registry name or 'package.module:ClassName'"""
+    if name in MODELS:
+        return MODELS[name]
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise ValueError(f"Unknown detection model: {name}")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+# Worker process state
+_worker_model: Optional[DetectionModel] = None
+
+
+def _init_worker(model_name: str, options: dict):
+    global _worker_model
+    _worker_model = resolve_model(model_name)(**options)
+
+
+def _predict_batch(frames: List[np.ndarray]) -> Tuple[List[List[dict]], float]:
+    start = time.perf_counter()
+    detections = _worker_model.predict(frames)
+    return detections, time.perf_counter() - start
+
+
+def draw_detections(frame: np.ndarray, detections: List[dict]) -> np.ndarray:
+    """Burn detection boxes and labels into the frame"""
+    for detection in detections:
+        x1, y1, x2, y2 = (int(v) for v in detection['box'])
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(frame, f"{detection['label']} {detection['score']:.2f}", (x1 + 5, max(y1 - 5, 15)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+    return frame
+
+
+class DetectionEngine:
+    """Batched, non-blocking detection across cameras backed by a process pool"""
+
+    def __init__(self, model: str = 'fake', model_options: Optional[dict] = None, workers: int = 1,
+                 batch_size: int = 4, input_size: int = 640, frame_skip: int = 1,
+                 max_stride: int = 15, cpu_budget: float = 0.5,
+                 on_result: Optional[Callable[[str, dict], None]] = None):
+        self.model = model
+        self.model_options = model_options or {}
+        self.workers = workers
+        self.batch_size = batch_size
+        self.input_size = input_size
+        self.on_result = on_result
+
+        # Frame skip is the minimum stride; the adaptive stride grows up to max_stride
+        # while the pool is busier than cpu_budget (fraction of wall time per worker)
+        self.min_stride = max(1, frame_skip)
+        self.max_stride = max(self.min_stride, max_stride)
+        self.stride = self.min_stride
+        self.cpu_budget = cpu_budget
+
+        self.pending: Dict[str, tuple] = {}  # camera_id -> (sequence, timestamp, frame, scale)
+        self.latest: Dict[str, dict] = {}  # camera_id -> last result
+        self.frame_counters: Dict[str, int] = {}
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.running = False
+
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.dispatcher: Optional[threading.Thread] = None
+
+        # Statistics
+        self.stats = {
+            'submitted': 0,
+            'skipped': 0,
+            'replaced': 0,
+            'batches': 0,
+            'frames_inferred': 0,
+            'errors': 0
+        }
+        self.busy_time = 0.0
+        self.window_start = time.monotonic()
+
+    def start(self):
+        """Spawn the worker processes and the batch dispatcher"""
+        context = multiprocessing.get_context('spawn')
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                        initializer=_init_worker, initargs=(self.model, self.model_options))
+        self.running = True
+        self.dispatcher = threading.Thread(target=self._dispatch_loop, name='detection-dispatch', daemon=True)
+        self.dispatcher.start()
+        logger.info(f"Detection engine started: model={self.model}, workers={self.workers}, batch={self.batch_size}")
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.dispatcher:
+            self.dispatcher.join(timeout=1.0)
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, camera_id: str, frame: np.ndarray, sequence: int = 0,
+               timestamp: Optional[float] = None) -> bool:
+        """Offer a frame for inference; never blocks. Returns False if skipped by the stride"""
+        with self.condition:
+            count = self.frame_counters.get(camera_id, 0)
+            self.frame_counters[camera_id] = count + 1
+            if count % self.stride:
+                self.stats['skipped'] += 1
+                return False
+
+        # Shrink before crossing the process boundary so less data gets pickled
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.input_size / max(height, width))
+        if scale < 1.0:
+            small = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        else:
+            small = frame.copy()
+
+        with self.condition:
+            if camera_id in self.pending:
+                self.stats['replaced'] += 1
+            self.pending[camera_id] = (sequence, timestamp or time.time(), small, scale)
+            self.stats['submitted'] += 1
+            self.condition.notify()
+        return True
+
+    def get_latest(self, camera_id: str) -> Optional[dict]:
+        """Most recent detections for a camera (may lag the current frame)"""
+        return self.latest.get(camera_id)
+
+    def _dispatch_loop(self):
+        while True:
+            with self.condition:
+                while self.running and (not self.pending or self.in_flight >= self.workers):
+                    self.condition.wait()
+                if not self.running:
+                    return
+
+                # One frame per camera, up to batch_size cameras per model call
+                camera_ids = list(self.pending)[:self.batch_size]
+                batch = [(camera_id, self.pending.pop(camera_id)) for camera_id in camera_ids]
+                self.in_flight += 1
+
+            frames = [item[2] for _, item in batch]
+            try:
+                future = self.pool.submit(_predict_batch, frames)
+            except RuntimeError:
+                return
+            future.add_done_callback(lambda f, batch=batch: self._on_batch_done(batch, f))
+
+    def _on_batch_done(self, batch, future):
+        try:
+            detections, elapsed = future.result()
+        except Exception as e:
+            logger.error(f"Detection batch failed: {e}")
+            with self.condition:
+                self.in_flight -= 1
+                self.stats['errors'] += 1
+                self.condition.notify()
+            return
+
+        for (camera_id, (sequence, timestamp, _, scale)), frame_detections in zip(batch, detections):
+            # Map boxes back to full-resolution coordinates
+            for detection in frame_detections:
+                detection['box'] = [round(v / scale, 1) for v in detection['box']]
+            result = {
+                'camera_id': camera_id,
+                'sequence': sequence,
+                'timestamp': timestamp,
+                'detections': frame_detections,
+                'inference_ms': elapsed * 1000 / len(batch)
+            }
+            self.latest[camera_id] = result
+            if self.on_result:
+                try:
+                    self.on_result(camera_id, result)
+                except Exception as e:
+                    logger.error(f"Detection callback failed: {e}")
+
+        with self.condition:
+            self.in_flight -= 1
+            self.stats['batches'] += 1
+            self.stats['frames_inferred'] += len(batch)
+            self.busy_time += elapsed
+            self._adapt_stride()
+            self.condition.notify()
+
+    def _adapt_stride(self):
+        """Widen or narrow the stride so the pool stays within the CPU budget"""
+        window = time.monotonic() - self.window_start
+        if window < 2.0:
+            return
+
+        utilization = self.busy_time / (window * self.workers)
+        if utilization > self.cpu_budget and self.stride < self.max_stride:
+            self.stride += 1
+        elif utilization < self.cpu_budget * 0.5 and self.stride > self.min_stride:
+            self.stride -= 1
+
+        self.stats['utilization'] = round(utilization, 3)
+        self.busy_time = 0.0
+        self.window_start = time.monotonic()
+
+    def get_stats(self) -> dict:
+        with self.condition:
+            return dict(self.stats, stride=self.stride, pending=len(self.pending), in_flight=self.in_flight)
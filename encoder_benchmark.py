@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+JPEG Encoder Micro-Benchmark
+Compares the previous cv2.imencode call with the encoder layer's backends,
+subsampling modes and pool sizes on synthetic camera-like frames
+"""
+
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from jpeg_encoder import BACKEND_OPENCV, BACKEND_TURBOJPEG, SUBSAMPLINGS, JpegEncoder, turbojpeg_available
+
+RESOLUTIONS = {'480p': (640, 480), '720p': (1280, 720), '1080p': (1920, 1080)}
+
+
+def synthetic_frames(width: int, height: int, count: int = 8) -> list:
+    """Smooth gradients plus noise and text: compresses like a camera frame, unlike pure noise"""
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    frames = []
+    for i in range(count):
+        base = np.stack([(x + y + i * 8) % 256, np.broadcast_to(x, (height, width)),
+                         np.broadcast_to(y, (height, width))], axis=-1)
+        frame = np.clip(base + rng.normal(0, 6, base.shape), 0, 255).astype(np.uint8)
+        cv2.putText(frame, f"frame {i}", (40, 80), cv2.FONT_HERSHEY_SIMPLEX, 2, (255, 255, 255), 3)
+        frames.append(frame)
+    return frames
+
+
+def bench_baseline(frames: list, quality: int, duration: float) -> dict:
+    """The call CameraSender.encode_jpeg made before the encoder layer"""
+    count = size = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        ok, buffer = cv2.imencode('.jpg', frames[count % len(frames)], [cv2.IMWRITE_JPEG_QUALITY, quality])
+        size += len(buffer.tobytes())
+        count += 1
+    elapsed = time.perf_counter() - start
+    return {'fps': count / elapsed, 'ms_per_frame': elapsed * 1000 / count, 'avg_bytes': size // count}
+
+
+def bench_encoder(frames: list, backend: str, subsampling: str, workers: int, quality: int,
+                  duration: float) -> dict:
+    encoder = JpegEncoder(backend=backend, subsampling=subsampling, quality=quality, workers=workers)
+    try:
+        count = size = 0
+        in_flight = []
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            # Keep every worker busy, like a capture loop that submits as frames arrive
+            while len(in_flight) < max(1, workers) * 2:
+                in_flight.append(encoder.submit(frames[(count + len(in_flight)) % len(frames)]))
+            size += len(in_flight.pop(0).result())
+            count += 1
+        for future in in_flight:
+            future.result()
+        elapsed = time.perf_counter() - start
+    finally:
+        encoder.close()
+    return {'fps': count / elapsed, 'ms_per_frame': elapsed * 1000 / count, 'avg_bytes': size // count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JPEG encoder micro-benchmark')
+    parser.add_argument('--resolutions', nargs='+', choices=sorted(RESOLUTIONS), default=['720p'])
+    parser.add_argument('--subsampling', nargs='+', choices=SUBSAMPLINGS, default=['420', '444'])
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2, 4],
+                        help='Pool sizes to try (0 = encode on the calling thread)')
+    parser.add_argument('--quality', type=int, default=80)
+    parser.add_argument('--duration', type=float, default=2.0, help='Seconds per configuration')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    backends = [BACKEND_OPENCV] + ([BACKEND_TURBOJPEG] if turbojpeg_available() else [])
+    if len(backends) == 1:
+        print("TurboJPEG not available (pip install PyTurboJPEG); benchmarking OpenCV only")
+
+    print(f"{'resolution':>10} {'encoder':>10} {'sampling':>8} {'workers':>7} {'fps':>8} {'ms/frame':>9} "
+          f"{'bytes':>8} {'speedup':>8}")
+    results = []
+    for resolution in args.resolutions:
+        frames = synthetic_frames(*RESOLUTIONS[resolution])
+        baseline = bench_baseline(frames, args.quality, args.duration)
+        results.append(dict(baseline, resolution=resolution, encoder='imencode', subsampling='420', workers=0))
+        print(f"{resolution:>10} {'imencode':>10} {'420':>8} {0:>7} {baseline['fps']:>8.1f} "
+              f"{baseline['ms_per_frame']:>9.2f} {baseline['avg_bytes']:>8} {1.0:>7.2f}x")
+        for backend in backends:
+            for subsampling in args.subsampling:
+                for workers in args.workers:
+                    stats = bench_encoder(frames, backend, subsampling, workers, args.quality, args.duration)
+                    results.append(dict(stats, resolution=resolution, encoder=backend,
+                                        subsampling=subsampling, workers=workers))
+                    print(f"{resolution:>10} {backend:>10} {subsampling:>8} {workers:>7} {stats['fps']:>8.1f} "
+                          f"{stats['ms_per_frame']:>9.2f} {stats['avg_bytes']:>8} "
+                          f"{stats['fps'] / baseline['fps']:>7.2f}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
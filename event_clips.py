@@ -0,0 +1,312 @@
+"""
+Event Clip Extraction for Camera System
+Keeps a short in-memory pre-roll of every camera and, when an incident is
+triggered (crash status, SOS), writes the seconds before and after it to an
+event clip that FrameArchive can read back
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import urllib.request
+from collections import deque
+from typing import Dict, List, Optional
+
+import websockets
+
+from camera_pipeline import StageStats
+from camera_recorder import SegmentWriter, camera_directory, frame_jpeg
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'event.json'
+MAX_REASON_LENGTH = 64
+
+
+def frame_size(frame) -> int:
+    """Approximate memory held by a buffered frame"""
+    nbytes = getattr(frame, 'nbytes', None)
+    if nbytes is not None:
+        return nbytes
+    return len(frame)
+
+
+def retained_size(frames) -> int:
+    """Memory held by buffered frames, including the keyframes their tile updates keep alive (each once)"""
+    seen = set()
+    total = 0
+    for frame in frames:
+        while frame is not None and id(frame) not in seen:
+            seen.add(id(frame))
+            total += frame_size(frame)
+            frame = getattr(frame, 'base', None)
+    return total
+
+
+class PreRollBuffer:
+    """Recent frames of one camera, bounded by age and by bytes"""
+
+    # Buffered frames grow after they are added (serialized for viewers, decoded, rebuilt from tiles),
+    # so every this many adds the ring is measured again instead of trusting the sizes seen on add
+    REMEASURE_EVERY = 32
+
+    def __init__(self, max_seconds: float = 10.0, max_bytes: int = 32 * 1024 * 1024):
+        self.max_age_ms = max_seconds * 1000
+        self.max_bytes = max_bytes
+        self.frames: deque = deque()  # (timestamp ms, frame)
+        self.nbytes = 0
+        self.adds = 0
+
+    def add(self, timestamp: float, frame):
+        self.frames.append((timestamp, frame))
+        self.adds += 1
+        self.nbytes += frame_size(frame)
+        # Trim by age first, then by memory, always keeping the newest frame
+        while len(self.frames) > 1 and timestamp - self.frames[0][0] > self.max_age_ms:
+            self.nbytes -= frame_size(self.frames.popleft()[1])
+        if self.adds % self.REMEASURE_EVERY == 0 or self.nbytes > self.max_bytes:
+            self.nbytes = self.measure()
+        # A trimmed keyframe stays in memory while buffered tile updates still paint over it
+        while len(self.frames) > 1 and self.nbytes > self.max_bytes:
+            self.frames.popleft()
+            self.nbytes = self.measure()
+
+    def measure(self) -> int:
+        return retained_size(frame for _, frame in self.frames)
+
+    def snapshot(self, since: float) -> list:
+        """(timestamp, frame) pairs at or after `since`; copies references only"""
+        return [(timestamp, frame) for timestamp, frame in self.frames if timestamp >= since]
+
+
+class _ClipEvent:
+    def __init__(self, event_id: str, reason: str, trigger_time: float, pre_seconds: float,
+                 post_seconds: float, directory: str, details: Optional[dict]):
+        self.event_id = event_id
+        self.reason = reason
+        self.trigger_time = trigger_time
+        self.start = trigger_time - pre_seconds * 1000
+        self.end = trigger_time + post_seconds * 1000
+        self.directory = directory
+        self.details = details or {}
+        self.triggered_at = time.perf_counter()
+        self.writers: Dict[str, SegmentWriter] = {}
+        self.frames: Dict[str, int] = {}
+        self.status = 'pending'
+        self.assembly_ms: Optional[float] = None
+
+    def manifest(self) -> dict:
+        return {
+            'event_id': self.event_id,
+            'reason': self.reason,
+            'details': self.details,
+            'trigger_time': self.trigger_time,
+            'start': self.start,
+            'end': self.end,
+            'status': self.status,
+            'assembly_ms': self.assembly_ms,
+            'cameras': dict(self.frames),
+            'path': self.directory
+        }
+
+
+class ClipExtractor:
+    """Pre-roll rings per camera plus a writer thread that turns triggers into clips"""
+
+    def __init__(self, root: str, pre_seconds: float = 10.0, post_seconds: float = 5.0,
+                 max_bytes_per_camera: int = 32 * 1024 * 1024, queue_size: int = 1024, min_interval: float = 30.0):
+        self.root = root
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.min_interval = min_interval  # seconds between clips for one reason; repeats get the last clip back
+        self.max_bytes_per_camera = max_bytes_per_camera
+        self.grace_ms = 500
+
+        self.buffers: Dict[str, PreRollBuffer] = {}
+        self.active: List[_ClipEvent] = []
+        self.recent: deque = deque(maxlen=50)
+        self.last_clip: Dict[str, _ClipEvent] = {}  # reason -> newest clip, while it still throttles that reason
+        self.lock = threading.Lock()
+        self.queue_size = queue_size
+        self.jobs: queue.Queue = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self.running = False
+
+        # Time from trigger until the pre-roll is on disk, and until the clip is complete
+        self.assembly = StageStats('clip_assembly')
+        self.completion = StageStats('clip_completion')
+        self.dropped = 0
+        self.throttled = 0
+
+    def start(self):
+        os.makedirs(self.root, exist_ok=True)
+        self.running = True
+        self.thread = threading.Thread(target=self._write_loop, name='clips', daemon=True)
+        self.thread.start()
+        logger.info(f"🎬 Event clips ({self.pre_seconds:g}s before, {self.post_seconds:g}s after) in {self.root}")
+
+    def close(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=5.0)
+
+    def add_frame(self, camera_id: str, timestamp: float, frame):
+        """Buffer a frame (bytes, base64 text or RelayFrame); cheap enough for the relay's event loop"""
+        with self.lock:
+            ring = self.buffers.get(camera_id)
+            if ring is None:
+                ring = self.buffers[camera_id] = PreRollBuffer(self.pre_seconds, self.max_bytes_per_camera)
+            ring.add(timestamp, frame)
+            for event in self.active:
+                if timestamp > event.end:
+                    continue
+                # Post-trigger frames are dropped if the disk falls behind; pre-roll jobs never are
+                if self.jobs.qsize() >= self.queue_size:
+                    self.dropped += 1
+                else:
+                    self.jobs.put_nowait(('frame', event, camera_id, [(timestamp, frame)]))
+
+    def trigger(self, reason: str, timestamp: Optional[float] = None, details: Optional[dict] = None) -> dict:
+        """Start a clip around `timestamp` (ms, default now); an event still collecting for the same reason is reused"""
+        trigger_time = time.time() * 1000 if timestamp is None else timestamp
+        reason = reason[:MAX_REASON_LENGTH]
+        with self.lock:
+            for event in self.active:
+                if event.reason == reason:
+                    return event.manifest()
+            now = time.perf_counter()
+            self.last_clip = {key: event for key, event in self.last_clip.items()
+                              if now - event.triggered_at < self.min_interval}
+            if reason in self.last_clip:
+                self.throttled += 1
+                return self.last_clip[reason].manifest()
+
+            event_id = time.strftime('%Y%m%d-%H%M%S', time.localtime(trigger_time / 1000))
+            event_id += f"-{int(trigger_time) % 1000:03d}-{re.sub(r'[^A-Za-z0-9_-]', '_', reason)}"
+            event = _ClipEvent(event_id, reason, trigger_time, self.pre_seconds, self.post_seconds,
+                               os.path.join(self.root, event_id), details)
+            snapshot = {camera_id: ring.snapshot(event.start) for camera_id, ring in self.buffers.items()}
+            self.active.append(event)
+            self.last_clip[reason] = event
+            # Queued under the lock so the pre-roll always lands ahead of post-trigger frames
+            self.jobs.put_nowait(('pre', event, snapshot))
+
+        logger.warning(f"🚨 Event '{reason}' triggered clip {event_id}")
+        return event.manifest()
+
+    def _write_loop(self):
+        while self.running or not self.jobs.empty():
+            try:
+                job = self.jobs.get(timeout=0.1)
+            except queue.Empty:
+                job = None
+
+            try:
+                if job and job[0] == 'pre':
+                    self._write_pre_roll(job[1], job[2])
+                elif job:
+                    self._append(job[1], job[2], job[3])
+            except OSError as e:
+                logger.error(f"Error writing event clip: {e}")
+
+            self._finish_expired()
+
+    def _append(self, event: _ClipEvent, camera_id: str, frames: list):
+        if not frames or event.status == 'complete':
+            return
+        writer = event.writers.get(camera_id)
+        if writer is None:
+            directory = camera_directory(event.directory, camera_id)
+            os.makedirs(directory, exist_ok=True)
+            writer = event.writers[camera_id] = SegmentWriter(directory, frames[0][0])
+        writer.append([(timestamp, frame_jpeg(frame)) for timestamp, frame in frames])
+        event.frames[camera_id] = event.frames.get(camera_id, 0) + len(frames)
+
+    def _write_pre_roll(self, event: _ClipEvent, snapshot: Dict[str, list]):
+        os.makedirs(event.directory, exist_ok=True)
+        for camera_id, frames in snapshot.items():
+            self._append(event, camera_id, frames)
+        event.status = 'recording'
+        event.assembly_ms = round((time.perf_counter() - event.triggered_at) * 1000, 1)
+        self.assembly.record(event.assembly_ms / 1000)
+        self._write_manifest(event)
+        logger.info(f"🎬 Clip {event.event_id} pre-roll ready in {event.assembly_ms} ms "
+                    f"({sum(event.frames.values())} frames, {len(event.frames)} cameras)")
+
+    def _finish_expired(self):
+        now = time.time() * 1000
+        with self.lock:
+            # A short grace period lets frames queued just before the end reach the clip
+            expired = [event for event in self.active
+                       if event.status == 'recording' and now > event.end + self.grace_ms]
+            for event in expired:
+                self.active.remove(event)
+        for event in expired:
+            for writer in event.writers.values():
+                writer.close()
+            event.status = 'complete'
+            self.completion.record(time.perf_counter() - event.triggered_at)
+            self._write_manifest(event)
+            self.recent.append(event.manifest())
+            logger.info(f"✅ Clip {event.event_id} complete: {event.frames}")
+
+    def _write_manifest(self, event: _ClipEvent):
+        path = os.path.join(event.directory, MANIFEST)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(event.manifest(), f)
+        os.replace(path + '.tmp', path)
+
+    def clips(self) -> list:
+        """Manifests of in-progress and recently completed clips, newest first"""
+        with self.lock:
+            active = [event.manifest() for event in self.active]
+        return active[::-1] + list(self.recent)[::-1]
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            buffered = {camera_id: {'frames': len(ring.frames), 'bytes': ring.nbytes}
+                        for camera_id, ring in self.buffers.items()}
+        return {
+            'pre_seconds': self.pre_seconds,
+            'post_seconds': self.post_seconds,
+            'buffered': buffered,
+            'active': len(self.active),
+            'completed': self.completion.count,
+            'dropped': self.dropped,
+            'throttled': self.throttled,
+            'assembly': self.assembly.snapshot(),
+            'completion': self.completion.snapshot()
+        }
+
+
+def trigger_remote(url: str, reason: str, details: Optional[dict] = None, timeout: float = 2.0) -> Optional[dict]:
+    """Ask a camera server (ws://...?token=...) or video server (http://.../clips) to cut a clip"""
+    message = {'type': 'event', 'reason': reason, 'details': details or {}}
+    try:
+        if url.startswith(('ws://', 'wss://')):
+            return asyncio.run(_trigger_websocket(url, message, timeout))
+        request = urllib.request.Request(url, data=json.dumps(message).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except Exception as e:
+        logger.error(f"Clip trigger to {url} failed: {e}")
+        return None
+
+
+async def _trigger_websocket(url: str, message: dict, timeout: float) -> Optional[dict]:
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.send(json.dumps(message))
+        deadline = time.monotonic() + timeout
+        # Cached frames may be replayed to us first; wait for the clip acknowledgement
+        while True:
+            reply = await asyncio.wait_for(ws.recv(), timeout=max(0.01, deadline - time.monotonic()))
+            if isinstance(reply, str) and reply.startswith('{'):
+                data = json.loads(reply)
+                if data.get('type') == 'clip':
+                    return data.get('clip')
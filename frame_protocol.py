@@ -0,0 +1,194 @@
+"""
+Binary Frame Protocol for Camera System
+Packs JPEG frames behind a small fixed header so they can travel as binary
+WebSocket messages instead of base64 text wrapped in JSON
+"""
+
+import json
+import struct
+import time
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+PROTOCOL_VERSION = 1
+
+# Message types
+MSG_FRAME = 1
+MSG_METADATA = 2  # JSON side-channel (detections, fps) sharing the frame's sequence number
+MSG_TILES = 3  # changed tiles of a frame, to be pasted over the keyframe (an MSG_FRAME) they name
+
+# Header flags
+FLAG_TRACE = 0x01  # a TRACE block follows the camera ID
+
+# Transport formats negotiated per connection (?format=...)
+FORMAT_TEXT = 'text'
+FORMAT_BINARY = 'binary'
+FORMATS = (FORMAT_TEXT, FORMAT_BINARY)
+
+# Frame codecs negotiated per viewer connection (?codec=...); tile updates need the binary format
+CODEC_JPEG = 'jpeg'
+CODEC_TILES = 'tiles'
+CODECS = (CODEC_JPEG, CODEC_TILES)
+
+# version, msg_type, flags, camera_id length, sequence, timestamp (ms since epoch)
+HEADER = struct.Struct('!BBBBId')
+MAX_CAMERA_ID_LENGTH = 255
+
+# Sender stage offsets in ms after the header timestamp (capture): JPEG encoded, handed to the socket
+TRACE = struct.Struct('!ff')
+
+# Tile update payload: frame width, frame height, tile size, keyframe sequence, tile count,
+# then per tile its row-major index and JPEG length, followed by the JPEG bytes
+TILE_UPDATE = struct.Struct('!HHHIH')
+TILE = struct.Struct('!HI')
+
+
+class FrameHeader(NamedTuple):
+    msg_type: int
+    flags: int
+    camera_id: str
+    sequence: int
+    timestamp: float
+    trace: Optional[Tuple[float, float]] = None  # (encoded_ms, sent_ms) after the timestamp
+
+
+class TileUpdate(NamedTuple):
+    width: int
+    height: int
+    tile_size: int
+    key_sequence: int
+    tiles: List[Tuple[int, memoryview]]  # (row-major tile index, JPEG bytes)
+
+
+def pack_frame(camera_id: str, sequence: int, payload: Union[bytes, bytearray, memoryview],
+               timestamp: Optional[float] = None, msg_type: int = MSG_FRAME, flags: int = 0,
+               trace: Optional[Tuple[float, float]] = None) -> bytes:
+    """Pack a payload behind the binary frame header (and a trace block when given)"""
+    camera_id_bytes = camera_id.encode('utf-8')
+    if len(camera_id_bytes) > MAX_CAMERA_ID_LENGTH:
+        raise ValueError(f"Camera ID too long ({len(camera_id_bytes)} bytes)")
+
+    if timestamp is None:
+        timestamp = time.time() * 1000
+
+    if trace is not None:
+        flags |= FLAG_TRACE
+    header = HEADER.pack(PROTOCOL_VERSION, msg_type, flags, len(camera_id_bytes),
+                         sequence & 0xFFFFFFFF, timestamp)
+    if trace is None:
+        return b''.join((header, camera_id_bytes, payload))
+    return b''.join((header, camera_id_bytes, TRACE.pack(*trace), payload))
+
+
+def stamp_sent(message: bytearray, sent_ms: float):
+    """Fill in the sent offset of a traced message in place, just before it goes to the socket"""
+    if message[2] & FLAG_TRACE:
+        offset = HEADER.size + message[3]
+        TRACE.pack_into(message, offset, TRACE.unpack_from(message, offset)[0], sent_ms)
+
+
+def unpack_frame(message: Union[bytes, bytearray, memoryview]) -> Tuple[FrameHeader, memoryview]:
+    """Split a binary message into its header and a zero-copy view of the payload"""
+    view = memoryview(message)
+    if len(view) < HEADER.size:
+        raise ValueError("Message shorter than frame header")
+
+    version, msg_type, flags, camera_id_length, sequence, timestamp = HEADER.unpack_from(view)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported protocol version {version}")
+
+    payload_start = HEADER.size + camera_id_length
+    if len(view) < payload_start:
+        raise ValueError("Message truncated inside camera ID")
+
+    camera_id = bytes(view[HEADER.size:payload_start]).decode('utf-8')
+    trace = None
+    if flags & FLAG_TRACE:
+        if len(view) < payload_start + TRACE.size:
+            raise ValueError("Message truncated inside trace")
+        trace = TRACE.unpack_from(view, payload_start)
+        payload_start += TRACE.size
+    return FrameHeader(msg_type, flags, camera_id, sequence, timestamp, trace), view[payload_start:]
+
+
+def peek_camera_id(message: Union[bytes, bytearray, memoryview]) -> str:
+    """Camera ID of a binary message without unpacking the rest (routes multiplexed senders)"""
+    if len(message) < HEADER.size:
+        raise ValueError("Message shorter than frame header")
+    camera_id_length = message[3]  # fourth header byte, after version, msg_type and flags
+    return bytes(message[HEADER.size:HEADER.size + camera_id_length]).decode('utf-8')
+
+
+def peek_key_sequence(message: Union[bytes, bytearray, memoryview]) -> int:
+    """Keyframe sequence a binary tile update paints over, without parsing its tiles"""
+    header, payload = unpack_frame(message)
+    if header.msg_type != MSG_TILES or len(payload) < TILE_UPDATE.size:
+        raise ValueError("Not a tile update")
+    return TILE_UPDATE.unpack_from(payload)[3]
+
+
+def pack_tiles(camera_id: str, sequence: int, key_sequence: int, width: int, height: int, tile_size: int,
+               tiles: List[Tuple[int, bytes]], timestamp: Optional[float] = None,
+               trace: Optional[Tuple[float, float]] = None) -> bytes:
+    """Tile update message: the tiles of a frame that differ from keyframe `key_sequence`"""
+    parts = [TILE_UPDATE.pack(width, height, tile_size, key_sequence & 0xFFFFFFFF, len(tiles))]
+    for index, jpeg in tiles:
+        parts.append(TILE.pack(index, len(jpeg)))
+        parts.append(jpeg)
+    return pack_frame(camera_id, sequence, b''.join(parts), timestamp, msg_type=MSG_TILES, trace=trace)
+
+
+def unpack_tiles(payload: Union[bytes, memoryview]) -> TileUpdate:
+    """Parse a tile update payload; the tile JPEGs stay zero-copy views"""
+    view = memoryview(payload)
+    if len(view) < TILE_UPDATE.size:
+        raise ValueError("Tile update shorter than its header")
+    width, height, tile_size, key_sequence, count = TILE_UPDATE.unpack_from(view)
+    if not tile_size:
+        raise ValueError("Tile update without a tile size")
+
+    tiles = []
+    offset = TILE_UPDATE.size
+    for _ in range(count):
+        if len(view) < offset + TILE.size:
+            raise ValueError("Tile update truncated inside a tile header")
+        index, length = TILE.unpack_from(view, offset)
+        offset += TILE.size
+        if len(view) < offset + length:
+            raise ValueError("Tile update truncated inside a tile")
+        tiles.append((index, view[offset:offset + length]))
+        offset += length
+    return TileUpdate(width, height, tile_size, key_sequence, tiles)
+
+
+def build_metadata(detections: List[dict], fps: float, width: int, height: int,
+                   detection_sequence: Optional[int] = None) -> dict:
+    """Compact column-wise detection metadata for viewers that draw their own overlays"""
+    return {
+        'fps': round(fps, 1),
+        'width': width,
+        'height': height,
+        'detection_sequence': detection_sequence,
+        'boxes': [[round(v, 1) for v in d['box']] for d in detections],
+        'classes': [d['class_id'] for d in detections],
+        'labels': [d['label'] for d in detections],
+        'scores': [d['score'] for d in detections]
+    }
+
+
+def encode_metadata(metadata: dict) -> bytes:
+    return json.dumps(metadata, separators=(',', ':')).encode('utf-8')
+
+
+def decode_metadata(payload: Union[bytes, memoryview]) -> dict:
+    return json.loads(bytes(payload))
+
+
+def pack_metadata(camera_id: str, sequence: int, metadata: dict, timestamp: Optional[float] = None) -> bytes:
+    """Binary metadata message for the frame with the same sequence number"""
+    return pack_frame(camera_id, sequence, encode_metadata(metadata), timestamp, msg_type=MSG_METADATA)
+
+
+def metadata_text(camera_id: str, sequence: int, metadata: dict, timestamp: float) -> str:
+    """Text metadata message; distinguishable from base64 frames by its leading '{'"""
+    return json.dumps(dict(metadata, type='metadata', camera_id=camera_id, sequence=sequence,
+                           timestamp=timestamp), separators=(',', ':'))
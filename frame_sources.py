@@ -0,0 +1,176 @@
+"""
+Frame Sources for Camera Senders
+Live devices, video files, image directories and a synthetic pattern behind
+the subset of the cv2.VideoCapture interface the sender uses, so cameras can
+be replaced by recorded or generated video on machines without any
+"""
+
+import os
+import time
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+SYNTHETIC = 'synthetic'
+
+
+def check_fps(fps: float) -> float:
+    """Frame pacing divides by the FPS, so it must be a positive number"""
+    fps = float(fps)
+    if not fps > 0:
+        raise ValueError(f"FPS must be positive, got {fps:g}")
+    return fps
+
+
+class FrameSource:
+    """Paced source: frame n is released at start + n / fps, like a camera's shutter"""
+
+    def __init__(self, width: int = 1280, height: int = 720, fps: float = 15, loop: bool = True,
+                 realtime: bool = True):
+        self.width = width
+        self.height = height
+        self.fps = check_fps(fps)
+        self.loop = loop
+        self.realtime = realtime
+        self.index = 0
+        self.start: Optional[float] = None
+
+    def isOpened(self) -> bool:
+        return True
+
+    def next_frame(self) -> Optional[np.ndarray]:
+        """Frame number self.index, or None when the source is exhausted"""
+        raise NotImplementedError
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        if self.realtime:
+            if self.start is None:
+                self.start = time.monotonic()
+            # Fixed schedule rather than sleeping a fixed interval, so timing never drifts
+            delay = self.start + self.index / self.fps - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        frame = self.next_frame()
+        if frame is None:
+            return False, None
+        self.index += 1
+        return True, frame
+
+    def set(self, prop: int, value: float) -> bool:
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            self.width = int(value)
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            self.height = int(value)
+        elif prop == cv2.CAP_PROP_FPS:
+            if not value > 0:
+                return False  # like cv2.VideoCapture, a setting that cannot be applied is refused
+            self.fps = float(value)
+        else:
+            return False
+        return True
+
+    def get(self, prop: int) -> float:
+        return {cv2.CAP_PROP_FRAME_WIDTH: self.width, cv2.CAP_PROP_FRAME_HEIGHT: self.height,
+                cv2.CAP_PROP_FPS: self.fps}.get(prop, 0.0)
+
+    def fit(self, frame: np.ndarray) -> np.ndarray:
+        if frame.shape[1] != self.width or frame.shape[0] != self.height:
+            frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        return frame
+
+    def release(self):
+        pass
+
+
+class SyntheticSource(FrameSource):
+    """Generated test pattern: frame n depends only on the seed and n"""
+
+    def __init__(self, seed: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.seed = seed
+        self.background: Optional[np.ndarray] = None
+
+    def next_frame(self) -> np.ndarray:
+        if self.background is None or self.background.shape[:2] != (self.height, self.width):
+            # Gradient plus fixed noise compresses like a real scene, unlike a flat colour or pure noise
+            rng = np.random.default_rng(self.seed)
+            x = np.linspace(0, 255, self.width, dtype=np.float32)
+            y = np.linspace(0, 255, self.height, dtype=np.float32)[:, None]
+            base = np.stack([np.broadcast_to(x, (self.height, self.width)),
+                             np.broadcast_to(y, (self.height, self.width)),
+                             (x + y + self.seed * 37) % 256], axis=-1)
+            self.background = np.clip(base + rng.normal(0, 6, base.shape), 0, 255).astype(np.uint8)
+
+        frame = self.background.copy()
+        # A box sweeping across the scene, so motion gating and delta coding see change
+        size = max(8, self.height // 6)
+        x = (self.index * 8 + self.seed * 50) % max(1, self.width - size)
+        y = (self.height - size) // 2
+        cv2.rectangle(frame, (x, y), (x + size, y + size), (0, 0, 255), -1)
+        cv2.putText(frame, f"{self.seed}:{self.index}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8,
+                    (255, 255, 255), 2)
+        return frame
+
+
+class ImageDirectorySource(FrameSource):
+    """Images of a directory in name order, decoded once and played back at the source FPS"""
+
+    def __init__(self, directory: str, **kwargs):
+        super().__init__(**kwargs)
+        self.paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        if not self.paths:
+            raise ValueError(f"No images in {directory}")
+        self.frames = {}
+
+    def next_frame(self) -> Optional[np.ndarray]:
+        if self.index >= len(self.paths) and not self.loop:
+            return None
+        position = self.index % len(self.paths)
+        frame = self.frames.get(position)
+        if frame is None:
+            frame = cv2.imread(self.paths[position])
+            if frame is None:
+                raise ValueError(f"Could not read {self.paths[position]}")
+            frame = self.frames[position] = self.fit(frame)
+        return frame.copy()
+
+
+class VideoFileSource(FrameSource):
+    """A video file played back at the source FPS (not the file's), rewinding at the end when looping"""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError(f"Could not open video {path}")
+
+    def isOpened(self) -> bool:
+        return self.capture.isOpened()
+
+    def next_frame(self) -> Optional[np.ndarray]:
+        ok, frame = self.capture.read()
+        if not ok and self.loop and self.index:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.capture.read()
+        return self.fit(frame) if ok else None
+
+    def release(self):
+        self.capture.release()
+
+
+def open_source(spec: Union[int, str], width: int = 1280, height: int = 720, fps: float = 15,
+                loop: bool = True, realtime: bool = True):
+    """Device index, "synthetic[:seed]", an image directory or a video file"""
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        return cv2.VideoCapture(int(spec))
+    options = {'width': width, 'height': height, 'fps': fps, 'loop': loop, 'realtime': realtime}
+    if spec == SYNTHETIC or spec.startswith(SYNTHETIC + ':'):
+        _, _, seed = spec.partition(':')
+        return SyntheticSource(seed=int(seed or 0), **options)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, **options)
+    return VideoFileSource(spec, **options)
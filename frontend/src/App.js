@@ -1,26 +1,14 @@
 import { BrowserRouter as Router, Routes, Route } from "react-router-dom";
-import React, { useEffect, useState } from "react";
+import React from "react";
 import Dashboard from "./pages/Dashboard";
 import VideoPage from "./pages/VideoPage";
 import Login from "./pages/Login";
 import Analytics from "./pages/Analytics";
 import Layout from "./components/Layout";
+import { useLiveData } from "./utils/api";
 
 function App() {
-  const [sos, setSos] = useState(false);
-
-  useEffect(() => {
-    const poll = async () => {
-      try {
-        const res = await fetch("http://192.168.242.7:5000/sos");
-        const j = await res.json();
-        setSos(!!j.sos);
-      } catch {}
-    };
-    poll();
-    const i = setInterval(poll, 2000);
-    return () => clearInterval(i);
-  }, []);
+  const { sos } = useLiveData();
 
   return (
     <Router>
@@ -1,35 +1,27 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { DataGrid } from "@mui/x-data-grid";
+import { useLiveData } from "../utils/api";
 
 export default function DataTable() {
   const [rows, setRows] = useState([]);
+  const { sensor, sos } = useLiveData();
+  // Read through a ref so toggling SOS does not re-append the last reading
+  const sosRef = useRef(sos);
+  sosRef.current = sos;
 
+  // One row per pushed reading (bursts are coalesced by the server)
   useEffect(() => {
-    const fetchData = async () => {
-      try {
-        const [resLatest, resSos] = await Promise.all([
-          fetch("http://192.168.242.7:5000/latest"),
-          fetch("http://192.168.242.7:5000/sos"),
-        ]);
-        const latest = await resLatest.json();
-        const sosObj = await resSos.json();
-        setRows((prev) => [
-          ...prev,
-          {
-            id: prev.length + 1,
-            timestamp: new Date().toLocaleTimeString(),
-            ...latest,
-            sos: !!sosObj.sos,
-          },
-        ]);
-      } catch (e) {
-        // noop
-      }
-    };
-    fetchData();
-    const interval = setInterval(fetchData, 2000);
-    return () => clearInterval(interval);
-  }, []);
+    if (!sensor || !Object.keys(sensor).length) return;
+    setRows((prev) => [
+      ...prev,
+      {
+        id: prev.length + 1,
+        timestamp: new Date().toLocaleTimeString(),
+        ...sensor,
+        sos: sosRef.current,
+      },
+    ]);
+  }, [sensor]);
 
   const columns = [
     { field: "id", headerName: "ID", width: 80 },
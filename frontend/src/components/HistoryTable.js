@@ -0,0 +1,60 @@
+import React, { useEffect, useState } from "react";
+import { DataGrid } from "@mui/x-data-grid";
+import { API_BASE } from "../utils/api";
+
+// Server-side history: one row per minute of the last hour, computed from rollups on the backend
+export default function HistoryTable({ device = "default", range = 3600, step = 60 }) {
+  const [rows, setRows] = useState([]);
+
+  useEffect(() => {
+    const fetchHistory = async () => {
+      try {
+        const to = Date.now() / 1000;
+        const res = await fetch(
+          `${API_BASE}/history?device=${encodeURIComponent(device)}&from=${to - range}&to=${to}&step=${step}`
+        );
+        const h = await res.json();
+        if (!h.t) return;
+        setRows(
+          h.t.map((t, i) => ({
+            id: t,
+            timestamp: new Date(t * 1000).toLocaleTimeString(),
+            readings: h.count[i],
+            crashes: h.crashes[i],
+            tempAvg: h.temperature.avg[i],
+            tempMin: h.temperature.min[i],
+            tempMax: h.temperature.max[i],
+            humidityAvg: h.humidity.avg[i],
+          })).reverse()
+        );
+      } catch (e) {
+        // noop
+      }
+    };
+    fetchHistory();
+    const interval = setInterval(fetchHistory, step * 1000);
+    return () => clearInterval(interval);
+  }, [device, range, step]);
+
+  const columns = [
+    { field: "timestamp", headerName: "Time", width: 150 },
+    { field: "readings", headerName: "Readings", width: 110 },
+    { field: "crashes", headerName: "Crashes", width: 110 },
+    { field: "tempAvg", headerName: "Temp avg (°C)", width: 130 },
+    { field: "tempMin", headerName: "Temp min", width: 110 },
+    { field: "tempMax", headerName: "Temp max", width: 110 },
+    { field: "humidityAvg", headerName: "Humidity avg (%)", width: 150 },
+  ];
+
+  return (
+    <div style={{ height: 400, width: "100%", marginTop: "20px" }}>
+      <DataGrid
+        rows={rows}
+        columns={columns}
+        pageSize={5}
+        rowsPerPageOptions={[5]}
+        disableSelectionOnClick
+      />
+    </div>
+  );
+}
@@ -1,25 +1,10 @@
-import React, { useEffect, useMemo, useState } from "react";
-import DataTable from "../components/DataTable";
+import React from "react";
+import HistoryTable from "../components/HistoryTable";
+import { useLiveData } from "../utils/api";
 
 export default function Analytics() {
-  const [snapshot, setSnapshot] = useState({ status: "-", temperature: 0, humidity: 0, sos: false });
-
-  useEffect(() => {
-    const fetchNow = async () => {
-      try {
-        const [resLatest, resSos] = await Promise.all([
-          fetch("http://192.168.242.7:5000/latest"),
-          fetch("http://192.168.242.7:5000/sos"),
-        ]);
-        const latest = await resLatest.json();
-        const sosObj = await resSos.json();
-        setSnapshot({ ...latest, sos: !!sosObj.sos });
-      } catch {}
-    };
-    fetchNow();
-    const i = setInterval(fetchNow, 3000);
-    return () => clearInterval(i);
-  }, []);
+  const { sensor, sos } = useLiveData();
+  const snapshot = { status: "-", temperature: 0, humidity: 0, ...sensor, sos };
 
   const statChip = (label, value, color) => (
     <div style={{
@@ -46,8 +31,8 @@ export default function Analytics() {
         {statChip("SOS", snapshot.sos ? "ON" : "OFF", snapshot.sos ? "#e67e22" : "#27ae60")}
       </div>
 
-      {/* Historical table (appends new rows) */}
-      <DataTable />
+      {/* Historical table (per-minute rollups from the server's sensor store) */}
+      <HistoryTable />
     </div>
   );
 }
@@ -1,35 +1,13 @@
-import React, { useEffect, useState } from "react";
+import React from "react";
 import DataBox from "../components/DataBox";
 import SOSStatus from "../components/SOSStatus";
 import DataTable from "../components/DataTable";
 import CrashAlert from "../components/CrashAlert";
+import { API_BASE, useLiveData } from "../utils/api";
 
 export default function Dashboard() {
-  const [sensorData, setSensorData] = useState({});
-  const [sos, setSos] = useState(false);
-  const [loading, setLoading] = useState(true);
-
-  useEffect(() => {
-    const fetchAll = async () => {
-      try {
-        const [sensorRes, sosRes] = await Promise.all([
-          fetch("http://192.168.242.7:5000/latest"),
-          fetch("http://192.168.242.7:5000/sos")
-        ]);
-        const sensorJson = await sensorRes.json();
-        const sosJson = await sosRes.json();
-        setSensorData(sensorJson);
-        setSos(sosJson.sos);
-      } catch (e) {
-        // Optionally handle error
-      } finally {
-        setLoading(false);
-      }
-    };
-    fetchAll();
-    const interval = setInterval(fetchAll, 2000);
-    return () => clearInterval(interval);
-  }, []);
+  // Sensor and SOS state are pushed over /events; the buttons below only send commands
+  const { sensor: sensorData, sos } = useLiveData();
 
   return (
     <div style={{ padding: "20px" }}>
@@ -62,8 +40,7 @@ export default function Dashboard() {
         <button
           onClick={async () => {
             try {
-              await fetch("http://192.168.242.7:5000/sos/activate", { method: "POST" });
-              setSos(true);
+              await fetch(`${API_BASE}/sos/activate`, { method: "POST" });
             } catch {}
           }}
           style={{
@@ -81,8 +58,7 @@ export default function Dashboard() {
         <button
           onClick={async () => {
             try {
-              await fetch("http://192.168.242.7:5000/sos/deactivate", { method: "POST" });
-              setSos(false);
+              await fetch(`${API_BASE}/sos/deactivate`, { method: "POST" });
             } catch {}
           }}
           style={{
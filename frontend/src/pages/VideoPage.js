@@ -7,6 +7,26 @@ export default function VideoPage() {
   const [status, setStatus] = useState("Connecting to video server...");
   const [hasFrame, setHasFrame] = useState(false);
   const [error, setError] = useState(null);
+  // Latest detection metadata from senders running with --overlay metadata
+  const detectionsRef = useRef(null);
+
+  const drawDetections = (ctx, canvas) => {
+    const meta = detectionsRef.current;
+    if (!meta || !meta.boxes) return;
+    const sx = canvas.width / (meta.width || canvas.width);
+    const sy = canvas.height / (meta.height || canvas.height);
+    ctx.strokeStyle = "#00ff00";
+    ctx.fillStyle = "#00ff00";
+    ctx.lineWidth = 2;
+    ctx.font = "14px sans-serif";
+    meta.boxes.forEach(([x1, y1, x2, y2], i) => {
+      ctx.strokeRect(x1 * sx, y1 * sy, (x2 - x1) * sx, (y2 - y1) * sy);
+      ctx.fillText(`${meta.labels[i]} ${meta.scores[i].toFixed(2)}`, x1 * sx + 4, Math.max(y1 * sy - 4, 14));
+    });
+    if (meta.fps !== undefined) {
+      ctx.fillText(`FPS: ${meta.fps}`, 10, 20);
+    }
+  };
 
   useEffect(() => {
     let ws;
@@ -53,9 +73,12 @@ export default function VideoPage() {
           if (!canvas) return;
           const ctx = canvas.getContext("2d");
           ctx.drawImage(img, 0, 0, canvas.width, canvas.height);
+          drawDetections(ctx, canvas);
         };
         setHasFrame(true);
         setStatus("Receiving video frames");
+      } else if (msg.type === "detections") {
+        detectionsRef.current = msg;
       } else if (msg.type === "sensor") {
         // Optionally could display sensor overlay later
       }
@@ -0,0 +1,43 @@
+import { useEffect, useState } from "react";
+
+export const API_BASE = "http://192.168.242.7:5000";
+
+// One EventSource per tab, shared by every component that needs live sensor/SOS state
+let source = null;
+let state = { sensor: {}, sos: false, connected: false, lastAlert: null };
+const listeners = new Set();
+
+function update(patch) {
+  state = { ...state, ...patch };
+  listeners.forEach((listener) => listener(state));
+}
+
+function open() {
+  source = new EventSource(`${API_BASE}/events`);
+  source.onopen = () => update({ connected: true });
+  source.onerror = () => update({ connected: false }); // EventSource reconnects by itself
+  source.addEventListener("sensor", (e) => update({ sensor: JSON.parse(e.data) || {} }));
+  source.addEventListener("sos", (e) => update({ sos: !!JSON.parse(e.data).sos }));
+  source.addEventListener("alert", (e) => update({ lastAlert: JSON.parse(e.data) }));
+}
+
+export function subscribeLive(listener) {
+  listeners.add(listener);
+  if (!source) open();
+  listener(state);
+  return () => {
+    listeners.delete(listener);
+    if (!listeners.size && source) {
+      source.close();
+      source = null;
+      state = { ...state, connected: false };
+    }
+  };
+}
+
+// { sensor, sos, connected, lastAlert }, pushed by the backend as changes happen
+export function useLiveData() {
+  const [live, setLive] = useState(state);
+  useEffect(() => subscribeLive(setLive), []);
+  return live;
+}
@@ -0,0 +1,145 @@
+"""
+JPEG Encoder Layer for Camera Senders
+Pluggable encoders behind one interface: libjpeg-turbo through PyTurboJPEG when
+it is installed, OpenCV's imencode otherwise, with chroma subsampling control
+and a thread pool so several frames encode in parallel
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+import cv2
+import numpy as np
+
+try:
+    from turbojpeg import TJPF_BGR, TJSAMP_420, TJSAMP_422, TJSAMP_444, TurboJPEG
+except ImportError:  # optional: pip install PyTurboJPEG (needs the libturbojpeg shared library)
+    TurboJPEG = None
+
+BACKEND_AUTO = 'auto'
+BACKEND_TURBOJPEG = 'turbojpeg'
+BACKEND_OPENCV = 'opencv'
+BACKENDS = (BACKEND_AUTO, BACKEND_TURBOJPEG, BACKEND_OPENCV)
+
+SUBSAMPLINGS = ('420', '422', '444')
+
+OPENCV_SAMPLING = {
+    '420': cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+    '422': cv2.IMWRITE_JPEG_SAMPLING_FACTOR_422,
+    '444': cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444,
+}
+
+_turbojpeg_library = None
+_turbojpeg_lock = threading.Lock()
+
+
+def turbojpeg_available() -> bool:
+    """True if PyTurboJPEG is installed and its shared library loads"""
+    global _turbojpeg_library
+    if TurboJPEG is None:
+        return False
+    with _turbojpeg_lock:
+        if _turbojpeg_library is None:
+            try:
+                _turbojpeg_library = TurboJPEG()
+            except (OSError, RuntimeError):
+                _turbojpeg_library = False
+    return _turbojpeg_library is not False
+
+
+class OpenCVEncoder:
+    """cv2.imencode; OpenCV allocates the output itself, so only the parameter list is reused"""
+
+    name = BACKEND_OPENCV
+
+    def __init__(self, subsampling: str = '420'):
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, 80, cv2.IMWRITE_JPEG_SAMPLING_FACTOR, OPENCV_SAMPLING[subsampling]]
+
+    def encode(self, frame: np.ndarray, quality: int) -> bytes:
+        self.params[1] = quality
+        ok, buffer = cv2.imencode('.jpg', frame, self.params)
+        return buffer.tobytes() if ok else b""
+
+
+class TurboJPEGEncoder:
+    """libjpeg-turbo into a destination buffer that is reused while the frame size stays the same"""
+
+    name = BACKEND_TURBOJPEG
+
+    def __init__(self, subsampling: str = '420'):
+        if not turbojpeg_available():
+            raise RuntimeError("TurboJPEG is not available (pip install PyTurboJPEG and libturbojpeg)")
+        self.jpeg = _turbojpeg_library
+        self.subsampling = {'420': TJSAMP_420, '422': TJSAMP_422, '444': TJSAMP_444}[subsampling]
+        self.buffer: Optional[bytearray] = None
+        self.buffer_shape = None
+
+    def encode(self, frame: np.ndarray, quality: int) -> bytes:
+        if frame.shape != self.buffer_shape:
+            # Worst-case size for this resolution, so libjpeg-turbo never reallocates
+            self.buffer = bytearray(self.jpeg.buffer_size(frame, self.subsampling))
+            self.buffer_shape = frame.shape
+        _, size = self.jpeg.encode(frame, quality=quality, pixel_format=TJPF_BGR,
+                                   jpeg_subsample=self.subsampling, dst=self.buffer)
+        return bytes(memoryview(self.buffer)[:size])
+
+
+def resolve_backend(backend: str) -> str:
+    if backend == BACKEND_AUTO:
+        return BACKEND_TURBOJPEG if turbojpeg_available() else BACKEND_OPENCV
+    if backend == BACKEND_TURBOJPEG and not turbojpeg_available():
+        raise RuntimeError("TurboJPEG is not available (pip install PyTurboJPEG and libturbojpeg)")
+    return backend
+
+
+class JpegEncoder:
+    """Thread-safe encoder: one backend encoder (and output buffer) per calling thread"""
+
+    def __init__(self, backend: str = BACKEND_AUTO, subsampling: str = '420', quality: int = 80,
+                 workers: int = 0):
+        self.backend = resolve_backend(backend)
+        self.subsampling = subsampling
+        self.quality = quality
+        self.local = threading.local()
+        self.workers = workers
+        self.executor: Optional[ThreadPoolExecutor] = None
+        if workers:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='encode')
+        self.frames = 0
+        self.bytes = 0
+
+    def _encoder(self):
+        encoder = getattr(self.local, 'encoder', None)
+        if encoder is None:
+            cls = TurboJPEGEncoder if self.backend == BACKEND_TURBOJPEG else OpenCVEncoder
+            encoder = self.local.encoder = cls(self.subsampling)
+        return encoder
+
+    def encode(self, frame: np.ndarray, quality: Optional[int] = None) -> bytes:
+        """Encode on the calling thread; returns b"" on failure"""
+        jpeg = self._encoder().encode(frame, quality or self.quality)
+        self.frames += 1
+        self.bytes += len(jpeg)
+        return jpeg
+
+    def submit(self, frame: np.ndarray, quality: Optional[int] = None) -> Future:
+        """Encode on the pool (or inline without one); the frame must not be modified until done"""
+        if self.executor:
+            return self.executor.submit(self.encode, frame, quality)
+        future: Future = Future()
+        future.set_result(self.encode(frame, quality))
+        return future
+
+    def get_stats(self) -> dict:
+        return {
+            'backend': self.backend,
+            'subsampling': self.subsampling,
+            'workers': self.workers,
+            'frames': self.frames,
+            'avg_bytes': self.bytes // self.frames if self.frames else 0,
+        }
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(wait=False)
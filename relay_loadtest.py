@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Load Test for the Multi-Process Camera Relay
+Starts camera_relay.py with an increasing number of workers, drives it with
+synthetic binary senders and viewers from several client processes and
+reports delivered throughput and latency per worker count
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import websockets
+
+from frame_protocol import pack_frame, unpack_frame
+
+
+async def run_sender(url: str, camera_id: str, fps: float, payload: bytes, stop_at: float):
+    async with websockets.connect(f"{url}&user_type=sender&camera_id={camera_id}&format=binary",
+                                  max_size=None) as ws:
+        interval = 1.0 / fps
+        sequence = 0
+        next_send = time.monotonic()
+        while time.monotonic() < stop_at:
+            sequence += 1
+            await ws.send(pack_frame(camera_id, sequence, payload))
+            next_send += interval
+            await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+
+
+async def run_viewer(url: str, measure_from: float, measure_to: float, result: dict):
+    async with websockets.connect(f"{url}&format=binary", max_size=None) as ws:
+        while time.monotonic() < measure_to:
+            try:
+                message = await asyncio.wait_for(ws.recv(), timeout=max(0.01, measure_to - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+            now = time.monotonic()
+            if now < measure_from or not isinstance(message, bytes):
+                continue
+            header, _ = unpack_frame(message)
+            result['frames'] += 1
+            result['bytes'] += len(message)
+            # Sample latency on a subset of frames to keep client overhead low
+            if result['frames'] % 10 == 0:
+                result['latency_ms'].append(time.time() * 1000 - header.timestamp)
+
+
+async def run_clients(shard: dict) -> dict:
+    url = shard['url']
+    start = time.monotonic()
+    measure_from = start + shard['warmup']
+    measure_to = measure_from + shard['duration']
+    result = {'frames': 0, 'bytes': 0, 'latency_ms': []}
+
+    viewers = [asyncio.ensure_future(run_viewer(url, measure_from, measure_to, result))
+               for _ in range(shard['viewers'])]
+    await asyncio.sleep(0.5)  # let viewers subscribe before frames flow
+    payload = os.urandom(shard['frame_size'])
+    senders = [asyncio.ensure_future(run_sender(url, camera_id, shard['fps'], payload, measure_to))
+               for camera_id in shard['cameras']]
+
+    await asyncio.gather(*viewers, *senders, return_exceptions=True)
+    return result
+
+
+def client_main(shard: dict) -> dict:
+    return asyncio.run(run_clients(shard))
+
+
+def wait_for_port(host: str, port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Relay did not come up on {host}:{port}")
+
+
+def percentile(samples: list, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_level(args, workers: int) -> dict:
+    """Run one load level against a relay with the given number of workers"""
+    broker = f"unix:///tmp/camera-relay-loadtest-{os.getpid()}.sock"
+    relay = subprocess.Popen(
+        [sys.executable, 'camera_relay.py', '--workers', str(workers), '--host', args.host,
+         '--port', str(args.port), '--token', args.token, '--broker', broker],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_port(args.host, args.port)
+        time.sleep(1.0)  # let every worker attach to the broker
+
+        url = f"ws://{args.host}:{args.port}?token={args.token}&role=admin"
+        shards = []
+        for i in range(args.client_procs):
+            shards.append({
+                'url': url,
+                'cameras': [f"load-cam-{c}" for c in range(i, args.cameras, args.client_procs)],
+                'viewers': len(range(i, args.viewers, args.client_procs)),
+                'fps': args.fps,
+                'frame_size': args.frame_size,
+                'warmup': args.warmup,
+                'duration': args.duration
+            })
+
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(args.client_procs) as pool:
+            results = pool.map(client_main, shards)
+    finally:
+        relay.terminate()
+        relay.wait(timeout=10)
+
+    frames = sum(r['frames'] for r in results)
+    total_bytes = sum(r['bytes'] for r in results)
+    latency = [sample for r in results for sample in r['latency_ms']]
+    offered = args.cameras * args.fps * args.viewers
+    return {
+        'workers': workers,
+        'frames_per_sec': frames / args.duration,
+        'offered_per_sec': offered,
+        'mbytes_per_sec': total_bytes / args.duration / 1e6,
+        'delivery_ratio': frames / args.duration / offered if offered else 0.0,
+        'latency_p50_ms': percentile(latency, 0.5),
+        'latency_p99_ms': percentile(latency, 0.99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Relay scaling load test')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='Worker counts to test')
+    parser.add_argument('--cameras', type=int, default=8, help='Virtual senders')
+    parser.add_argument('--viewers', type=int, default=64, help='Virtual viewers (each subscribed to all cameras)')
+    parser.add_argument('--fps', type=float, default=30, help='Frames per second per sender')
+    parser.add_argument('--frame-size', type=int, default=20000, help='Payload bytes per frame')
+    parser.add_argument('--duration', type=float, default=10, help='Measurement window in seconds')
+    parser.add_argument('--warmup', type=float, default=2, help='Seconds before measuring')
+    parser.add_argument('--client-procs', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='Client processes generating load')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7790)
+    parser.add_argument('--token', default='StrongPassword123')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    print(f"Offered load: {args.cameras} cameras x {args.fps} fps x {args.viewers} viewers "
+          f"= {args.cameras * args.fps * args.viewers:.0f} frames/s of {args.frame_size} bytes")
+    print(f"{'workers':>8} {'frames/s':>10} {'MB/s':>8} {'delivered':>10} {'p50 ms':>8} {'p99 ms':>8} {'speedup':>8}")
+
+    results = []
+    for workers in args.workers:
+        result = run_level(args, workers)
+        result['speedup'] = result['frames_per_sec'] / results[0]['frames_per_sec'] if results and results[0]['frames_per_sec'] else 1.0
+        results.append(result)
+        print(f"{workers:>8} {result['frames_per_sec']:>10.0f} {result['mbytes_per_sec']:>8.1f} "
+              f"{result['delivery_ratio']:>9.0%} {result['latency_p50_ms']:>8.1f} "
+              f"{result['latency_p99_ms']:>8.1f} {result['speedup']:>7.2f}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
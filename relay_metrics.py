@@ -0,0 +1,160 @@
+"""
+Relay Metrics for the Camera System
+Fixed-bucket latency histograms for the stages of the video path and a tiny
+local HTTP endpoint serving them, with counters and gauges, in the
+Prometheus text format
+"""
+
+import asyncio
+import bisect
+import logging
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in milliseconds; the last bucket catches everything slower
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float('inf'))
+
+# Stages of a frame's life, in order (sender stages need a traced binary frame, see frame_protocol.py)
+STAGE_ENCODE = 'encode'              # capture -> JPEG encoded (sender)
+STAGE_SENDER_QUEUE = 'sender_queue'  # encoded -> handed to the sender's socket
+STAGE_NETWORK = 'network'            # handed to the socket -> received by the relay
+STAGE_INGEST = 'ingest'              # capture -> received by the relay (any binary frame)
+STAGE_FANOUT = 'fanout'              # received -> queued for every subscriber
+STAGE_RELAY = 'relay'                # received -> written to a viewer's socket (fan-out and queue wait)
+STAGE_DELIVERY = 'delivery'          # capture -> written to a viewer's socket (end to end)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram; observe() is a bisect and three additions"""
+
+    __slots__ = ('counts', 'count', 'total')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+
+    def percentile(self, fraction: float) -> float:
+        """Estimate by linear interpolation inside the bucket holding the percentile"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            if count and seen + count >= rank:
+                if bound == float('inf'):
+                    return lower
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return lower
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.5), 3),
+            'p99_ms': round(self.percentile(0.99), 3),
+        }
+
+    def render(self, name: str, labels: str) -> Iterable[str]:
+        cumulative = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else f"{bound:g}"
+            yield f'{name}_bucket{{{labels},le="{le}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.total:.3f}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+class StageHistograms:
+    """One histogram per stage, created on first use"""
+
+    __slots__ = ('stages',)
+
+    def __init__(self):
+        self.stages: Dict[str, Histogram] = {}
+
+    def observe(self, stage: str, ms: float):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.observe(ms)
+
+    def snapshot(self) -> dict:
+        return {stage: histogram.snapshot() for stage, histogram in self.stages.items()}
+
+
+def label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsWriter:
+    """Accumulates Prometheus text exposition, one HELP/TYPE header per metric family"""
+
+    def __init__(self):
+        self.lines = []
+        self.declared = set()
+
+    def declare(self, name: str, kind: str, help_text: str):
+        if name not in self.declared:
+            self.declared.add(name)
+            self.lines.append(f"# HELP {name} {help_text}")
+            self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, kind: str, help_text: str, value: float, **labels):
+        self.declare(name, kind, help_text)
+        label_text = ','.join(f'{key}="{label(val)}"' for key, val in labels.items())
+        self.lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    def stages(self, name: str, help_text: str, histograms: StageHistograms, **labels):
+        self.declare(name, 'histogram', help_text)
+        base = ','.join(f'{key}="{label(val)}"' for key, val in labels.items())
+        for stage, histogram in histograms.stages.items():
+            self.lines.extend(histogram.render(name, f'{base},stage="{stage}"' if base else f'stage="{stage}"'))
+
+    def text(self) -> str:
+        return '\n'.join(self.lines) + '\n'
+
+
+class MetricsHTTPServer:
+    """GET /metrics on a local port; rendering happens on the event loop only when scraped"""
+
+    def __init__(self, render: Callable[[], str], host: str = '127.0.0.1', port: int = 9108):
+        self.render = render
+        self.host = host
+        self.port = port
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        logger.info(f"📊 Metrics on http://{self.host}:{self.port}/metrics")
+        return self.server
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=5)
+            method, path = request.split(b' ', 2)[:2]
+            if method == b'GET' and path.split(b'?')[0] == b'/metrics':
+                status, body = '200 OK', self.render().encode()
+            else:
+                status, body = '404 Not Found', b'Not found\n'
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError,
+                ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def close(self):
+        if self.server:
+            self.server.close()
@@ -0,0 +1,158 @@
+"""
+Renditions for Dashboard Grids
+Lower-resolution, lower-rate copies of camera frames (e.g. 320px thumbnails at
+5 FPS) rendered on the relay by a worker pool, only for cameras somebody is
+watching at that size, with the latest one cached per camera for late joiners
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from camera_recorder import frame_jpeg
+from jpeg_encoder import JpegEncoder
+
+logger = logging.getLogger(__name__)
+
+FULL = 'full'  # the sender's own frames, forwarded untouched
+
+# Libjpeg scales by 1/2, 1/4 or 1/8 while decoding, far cheaper than decoding in full and resizing
+REDUCED_DECODES = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                   (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+class Rendition(NamedTuple):
+    name: str
+    width: int
+    fps: float
+    quality: int = 70
+
+
+DEFAULT_RENDITIONS = {
+    'thumb': Rendition('thumb', 320, 5, 70),
+    'small': Rendition('small', 640, 10, 75),
+}
+
+
+def parse_rendition(spec: str) -> Rendition:
+    """name=WIDTH@FPS[:QUALITY], e.g. thumb=320@5 or wall=480@8:60"""
+    name, _, size = spec.partition('=')
+    width, _, rate = size.partition('@')
+    fps, _, quality = rate.partition(':')
+    if not name or name == FULL or not width.isdigit() or not fps:
+        raise ValueError(f"Rendition must look like name=WIDTH@FPS[:QUALITY], got {spec!r}")
+    return Rendition(name, int(width), float(fps), int(quality or 70))
+
+
+def parse_renditions(specs: Iterable[str]) -> Dict[str, Rendition]:
+    renditions = [parse_rendition(spec) for spec in specs if spec]
+    return {rendition.name: rendition for rendition in renditions}
+
+
+class RenditionPool:
+    """Renders renditions off the event loop; at most one frame per camera and rendition in flight"""
+
+    def __init__(self, renditions: Optional[Dict[str, Rendition]] = None, workers: int = 2,
+                 max_age: float = 30.0):
+        self.renditions = dict(DEFAULT_RENDITIONS if renditions is None else renditions)
+        self.workers = workers
+        self.max_age = max_age
+        # Threads are enough: decoding, resizing and encoding all release the GIL
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rendition')
+        self.encoder = JpegEncoder()
+
+        self.cache: Dict[Tuple[str, str], tuple] = {}  # (camera_id, rendition) -> (stored at, rendered frame)
+        self.pending = set()  # (camera_id, rendition) being rendered
+        self.due: Dict[Tuple[str, str], float] = {}  # (camera_id, rendition) -> earliest next render
+        self.source_widths: Dict[str, int] = {}  # camera_id -> width of its full frames
+
+        self.rendered = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def submit(self, camera_id: str, name: str, frame, deliver: Callable) -> bool:
+        """Render `frame` unless the rendition is busy or not due at its FPS; call deliver(camera_id, name,
+        frame, jpeg) on the event loop when done. Must be called from the event loop"""
+        key = (camera_id, name)
+        now = time.monotonic()
+        if key in self.pending or now < self.due.get(key, 0.0):
+            self.skipped += 1
+            return False
+
+        rendition = self.renditions[name]
+        self.pending.add(key)
+        self.due[key] = now + 1.0 / rendition.fps
+        future = asyncio.get_event_loop().run_in_executor(self.executor, self.render, camera_id, rendition, frame)
+        future.add_done_callback(functools.partial(self._finished, key, frame, deliver))
+        return True
+
+    def _finished(self, key: Tuple[str, str], frame, deliver: Callable, future: asyncio.Future):
+        self.pending.discard(key)
+        try:
+            jpeg = future.result()
+        except Exception as e:
+            jpeg = b""
+            logger.warning(f"Rendition {key[1]} of {key[0]} failed: {e}")
+        if not jpeg:
+            self.failed += 1
+            return
+        self.rendered += 1
+        deliver(key[0], key[1], frame, jpeg)
+
+    def decode(self, camera_id: str, data, width: int) -> Optional[np.ndarray]:
+        """Decode at the smallest DCT scale that still covers `width`, once the camera's size is known"""
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        source_width = self.source_widths.get(camera_id)
+        if source_width:
+            for factor, flag in REDUCED_DECODES:
+                if source_width // factor >= width:
+                    image = cv2.imdecode(buffer, flag)
+                    # A sender that shrank its frames (adaptive quality) gets a full decode below
+                    if image is not None and image.shape[1] >= width:
+                        return image
+                    break
+        image = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        if image is not None:
+            self.source_widths[camera_id] = image.shape[1]
+        return image
+
+    def render(self, camera_id: str, rendition: Rendition, frame) -> bytes:
+        """Worker thread: scale a frame down to the rendition's width and re-encode it"""
+        image = self.decode(camera_id, frame_jpeg(frame), rendition.width)
+        if image is None:
+            return b""
+        height, width = image.shape[:2]
+        if width > rendition.width:
+            size = (rendition.width, max(1, round(height * rendition.width / width)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return self.encoder.encode(image, rendition.quality)
+
+    def store(self, camera_id: str, name: str, rendered):
+        self.cache[(camera_id, name)] = (time.monotonic(), rendered)
+
+    def cached(self, camera_id: str, name: str):
+        """Latest rendition of a camera for a late joiner, unless it is older than max_age"""
+        entry = self.cache.get((camera_id, name))
+        if entry is None or time.monotonic() - entry[0] > self.max_age:
+            return None
+        return entry[1]
+
+    def get_stats(self) -> dict:
+        return {
+            'renditions': {name: rendition._asdict() for name, rendition in self.renditions.items()},
+            'workers': self.workers,
+            'rendered': self.rendered,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'pending': len(self.pending),
+            'cached': len(self.cache)
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False)
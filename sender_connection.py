@@ -0,0 +1,232 @@
+"""
+Resilient Sender Connection
+One persistent WebSocket per camera sender process: heartbeat pings notice a
+dead relay within seconds, reconnects back off exponentially with jitter
+instead of giving up, and the latest frames (with their metadata) of each
+camera are kept in a small bounded buffer and replayed once the relay is back
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Sequence, Tuple, Union
+
+import websockets
+
+from frame_protocol import stamp_sent
+
+logger = logging.getLogger(__name__)
+
+Message = Union[str, bytes, bytearray]
+
+CLOSE_POLICY_VIOLATION = 1008  # the relay refused the token, role or parameters; retrying cannot help
+
+
+class Backoff:
+    """Exponential backoff with jitter: each delay is drawn from [delay / 2, delay], doubling up to a cap"""
+
+    def __init__(self, initial: float = 0.1, maximum: float = 1.0, factor: float = 2.0):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        delay = min(self.maximum, self.initial * self.factor ** self.attempts)
+        self.attempts += 1
+        # Jitter keeps a fleet of senders from reconnecting in lockstep after a relay restart
+        return random.uniform(delay / 2, delay)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class SenderConnection:
+    """Keeps a sender's WebSocket up and buffers the newest frames of each camera while it is down"""
+
+    def __init__(self, url: str, heartbeat: float = 1.0, heartbeat_timeout: float = 2.0,
+                 reconnect_initial: float = 0.1, reconnect_max: float = 1.0, replay_frames: int = 2,
+                 replay_max_age: float = 2.0, on_connect: Optional[Callable[[], None]] = None,
+                 on_rejected: Optional[Callable[[str], None]] = None):
+        self.url = url
+        self.heartbeat = heartbeat  # seconds between pings; no pong within heartbeat_timeout drops the link
+        self.heartbeat_timeout = heartbeat_timeout
+        self.backoff = Backoff(reconnect_initial, reconnect_max)
+        self.replay_frames = replay_frames  # per camera; older frames are overwritten while disconnected
+        self.replay_max_age = replay_max_age  # seconds; older buffered frames are not worth replaying
+        self.on_connect = on_connect  # e.g. request keyframes, the relay may have restarted without them
+        self.on_rejected = on_rejected  # called with the relay's reason when it refuses the connection
+
+        self.websocket: Optional[websockets.WebSocketClientProtocol] = None
+        self.ready = False  # connected and the buffer replayed: live frames go straight to the socket
+        self.closing = False
+        self.supervisor: Optional[asyncio.Task] = None
+        # camera_id -> (buffered at, capture time, messages)
+        self.buffer: Dict[str, Deque[Tuple[float, float, Sequence[Message]]]] = {}
+        self.down_since: Optional[float] = None
+
+        self.connects = 0
+        self.disconnects = 0
+        self.failed_attempts = 0
+        self.buffered = 0
+        self.replayed = 0
+        self.expired = 0
+        self.overwritten = 0
+        self.last_outage_ms: Optional[float] = None
+
+    async def start(self) -> bool:
+        """Connect once, then keep the connection up in the background whether or not that worked"""
+        connected = await self.connect()
+        if connected:
+            self.ready = True
+        else:
+            self.down_since = time.monotonic()
+            logger.warning("Relay unreachable, frames are buffered while reconnecting")
+        self.supervisor = asyncio.ensure_future(self.supervise())
+        return connected
+
+    async def connect(self) -> bool:
+        try:
+            # Heartbeats are ours (see watch), the library's keepalive cannot close a connection stuck in send
+            self.websocket = await websockets.connect(self.url, ping_interval=None,
+                                                      open_timeout=max(self.heartbeat_timeout, 1.0))
+        except Exception as e:
+            self.failed_attempts += 1
+            if self.backoff.attempts <= 1:
+                logger.error(f"WebSocket connection failed: {e or type(e).__name__}")
+            return False
+        # The backoff is only reset once the relay answers a heartbeat (see watch)
+        self.connects += 1
+        if self.on_connect:
+            self.on_connect()
+        return True
+
+    async def supervise(self):
+        """Wait for the connection to drop, then reconnect with backoff and replay the buffer"""
+        while not self.closing:
+            if self.websocket is not None:
+                await self.watch(self.websocket)
+                if self.closing:
+                    break
+                if self.websocket.close_code == CLOSE_POLICY_VIOLATION:
+                    self.rejected(self.websocket.close_reason)
+                    break
+                self.connection_lost()
+            await asyncio.sleep(self.backoff.next_delay())
+            if not self.closing and await self.connect():
+                await self.replay()
+
+    async def watch(self, websocket: websockets.WebSocketClientProtocol):
+        """Heartbeat until the connection closes; a ping unanswered within heartbeat_timeout aborts it"""
+        while not websocket.closed:
+            try:
+                await asyncio.wait_for(self.ping(websocket), self.heartbeat_timeout)
+            except asyncio.TimeoutError:
+                # A hung relay or a dead link; aborting also frees a send waiting on a full socket buffer
+                logger.warning(f"💔 No heartbeat from the relay for {self.heartbeat_timeout:.1f} s")
+                websocket.transport.abort()
+                break
+            except websockets.exceptions.ConnectionClosed:
+                break
+            # Accepted and answering: the next outage starts backing off from the shortest delay again
+            self.backoff.reset()
+            await asyncio.sleep(self.heartbeat)
+        await websocket.wait_closed()
+
+    @staticmethod
+    async def ping(websocket: websockets.WebSocketClientProtocol):
+        pong_waiter = await websocket.ping()
+        await pong_waiter
+
+    def connection_lost(self):
+        websocket, self.websocket = self.websocket, None
+        self.ready = False
+        self.disconnects += 1
+        self.down_since = time.monotonic()
+        logger.warning(f"🔌 Relay connection lost (code {websocket.close_code}), reconnecting")
+
+    def rejected(self, reason: str):
+        """The relay refused this sender; stop instead of reconnecting forever"""
+        self.closing = True
+        self.ready = False
+        logger.error(f"❌ Relay rejected the connection: {reason or 'policy violation'}")
+        if self.on_rejected:
+            self.on_rejected(reason)
+
+    async def send(self, camera_id: str, capture_time: float, messages: Sequence[Message],
+                   replayable: bool = True) -> bool:
+        """Write a frame and its metadata now (True), or keep them for replay while disconnected (False)"""
+        if self.ready:
+            try:
+                await self.write(capture_time, messages)
+                return True
+            except websockets.exceptions.ConnectionClosed:
+                self.ready = False  # the supervisor sees the close and reconnects
+            except Exception as e:
+                logger.error(f"Error sending frame: {e}")
+                return False
+
+        # Tile updates are not replayable: they build on a keyframe the relay may no longer have
+        if replayable and self.replay_frames > 0:
+            queue = self.buffer.get(camera_id)
+            if queue is None:
+                queue = self.buffer[camera_id] = deque(maxlen=self.replay_frames)
+            if len(queue) == queue.maxlen:
+                self.overwritten += 1
+            queue.append((time.monotonic(), capture_time, messages))
+            self.buffered += 1
+        return False
+
+    async def write(self, capture_time: float, messages: Sequence[Message]):
+        for message in messages:
+            if isinstance(message, bytearray):
+                # Traced frames carry the time they were handed to the socket
+                stamp_sent(message, (time.time() - capture_time) * 1000)
+            await self.websocket.send(message)
+
+    async def replay(self):
+        """Send what was buffered while disconnected, oldest first, before live frames resume"""
+        replayed = 0
+        try:
+            # Frames keep arriving while replaying; go live only once the buffer is empty
+            while any(self.buffer.values()):
+                for queue in list(self.buffer.values()):
+                    while queue:
+                        buffered_at, capture_time, messages = queue.popleft()
+                        if time.monotonic() - buffered_at > self.replay_max_age:
+                            self.expired += 1
+                            continue
+                        await self.write(capture_time, messages)
+                        replayed += 1
+        except websockets.exceptions.ConnectionClosed:
+            return
+        self.replayed += replayed
+        self.ready = True
+        if self.down_since is not None:
+            self.last_outage_ms = (time.monotonic() - self.down_since) * 1000
+            self.down_since = None
+        logger.info(f"🔌 Reconnected after {self.last_outage_ms or 0:.0f} ms, replayed {replayed} frame(s)")
+
+    def get_stats(self) -> dict:
+        return {
+            'connected': self.ready,
+            'connects': self.connects,
+            'disconnects': self.disconnects,
+            'failed_attempts': self.failed_attempts,
+            'buffered': self.buffered,
+            'replayed': self.replayed,
+            'expired': self.expired,
+            'overwritten': self.overwritten,
+            'pending': sum(len(queue) for queue in self.buffer.values()),
+            'last_outage_ms': round(self.last_outage_ms, 1) if self.last_outage_ms is not None else None
+        }
+
+    async def close(self):
+        self.closing = True
+        self.ready = False
+        if self.supervisor:
+            self.supervisor.cancel()
+        if self.websocket:
+            await self.websocket.close()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The camera modules live in the project root and the sensor API in backend/, neither is a package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "backend")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,74 @@
+import operator
+import threading
+
+from camera_pipeline import FrameRing
+
+
+def drain(ring):
+    items = []
+    while True:
+        item = ring.get_nowait()
+        if item is None:
+            return items
+        items.append(item)
+
+
+def test_full_ring_drops_the_oldest():
+    dropped = []
+    ring = FrameRing(capacity=2, on_drop=dropped.append)
+    for item in (1, 2, 3):
+        ring.put(item)
+    assert dropped == [1]
+    assert ring.dropped == 1
+    assert drain(ring) == [2, 3]
+
+
+def test_busy_key_never_evicts_another_keys_items():
+    dropped = []
+    ring = FrameRing(capacity=2, key=operator.itemgetter(0), on_drop=dropped.append)
+    ring.put(('quiet', 0))
+    for i in range(10):
+        ring.put(('busy', i))
+    assert len(ring) == 3
+    assert dropped == [('busy', i) for i in range(8)]
+    assert ('quiet', 0) in drain(ring)
+
+
+def test_keys_are_served_in_turn():
+    ring = FrameRing(capacity=3, key=operator.itemgetter(0))
+    for i in range(3):
+        ring.put(('a', i))
+    ring.put(('b', 0))
+    ring.put(('c', 0))
+    assert drain(ring) == [('a', 0), ('b', 0), ('c', 0), ('a', 1), ('a', 2)]
+
+
+def test_each_key_keeps_its_own_order():
+    ring = FrameRing(capacity=4, key=operator.itemgetter(0))
+    for i in range(4):
+        ring.put(('a', i))
+        ring.put(('b', i))
+    items = drain(ring)
+    assert [i for key, i in items if key == 'a'] == [0, 1, 2, 3]
+    assert [i for key, i in items if key == 'b'] == [0, 1, 2, 3]
+
+
+def test_get_times_out_and_close_wakes_a_waiting_get():
+    ring = FrameRing()
+    assert ring.get(timeout=0.01) is None
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(ring.get(timeout=5)))
+    waiter.start()
+    ring.close()
+    waiter.join(timeout=1)
+    assert not waiter.is_alive()
+    assert results == [None]
+
+
+def test_on_put_is_called_for_every_item():
+    calls = []
+    ring = FrameRing(capacity=1, on_put=lambda: calls.append(len(ring)))
+    ring.put('a')
+    ring.put('b')
+    assert calls == [1, 1]
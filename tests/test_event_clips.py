@@ -0,0 +1,91 @@
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+from camera_server import RelayFrame
+from event_clips import MANIFEST, ClipExtractor, PreRollBuffer, retained_size
+
+
+def tile_update(sequence, key):
+    return RelayFrame('cam', sequence, 0, tiles=b't' * 100, base=key, update=object())
+
+
+def test_pre_roll_trims_by_age_keeping_the_newest():
+    ring = PreRollBuffer(max_seconds=1.0)
+    for timestamp in (0, 500, 1000, 2600):
+        ring.add(timestamp, b'x' * 10)
+    assert [timestamp for timestamp, _ in ring.frames] == [2600]
+    assert ring.nbytes == 10
+
+
+def test_pre_roll_trims_by_bytes():
+    ring = PreRollBuffer(max_seconds=60, max_bytes=250)
+    for timestamp in range(5):
+        ring.add(timestamp, bytes(100))
+    assert len(ring.frames) == 2
+    assert ring.snapshot(since=4) == [(4, bytes(100))]
+
+
+def test_shared_keyframe_is_counted_once():
+    key = RelayFrame('cam', 0, 0, jpeg=b'k' * 1000)
+    updates = [tile_update(i, key) for i in range(1, 4)]
+    assert retained_size(updates) == 1000 + 3 * 100
+    assert retained_size([key] + updates) == 1000 + 3 * 100
+
+
+def test_pre_roll_counts_keyframes_decoded_after_buffering():
+    key = RelayFrame('cam', 0, 0, jpeg=b'k' * 1000)
+    ring = PreRollBuffer(max_seconds=60, max_bytes=1_000_000)
+    ring.add(0, key)
+    key._image = np.zeros((720, 1280, 3), np.uint8)  # decoded later, to rebuild a tile update
+    for i in range(1, PreRollBuffer.REMEASURE_EVERY + 1):
+        ring.add(i, tile_update(i, key))
+    # The decoded keyframe alone is over budget, and every update keeps it alive
+    assert len(ring.frames) == 1
+    assert ring.nbytes == ring.measure() > ring.max_bytes
+
+
+def wait_until_complete(clips):
+    deadline = time.monotonic() + 5
+    while clips.active and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert not clips.active
+
+
+@pytest.fixture
+def clips(tmp_path):
+    clips = ClipExtractor(str(tmp_path), pre_seconds=1.0, post_seconds=0.05, min_interval=30)
+    clips.grace_ms = 0
+    clips.start()
+    yield clips
+    clips.close()
+
+
+def test_clip_holds_pre_roll_and_post_trigger_frames(clips):
+    now = time.time() * 1000
+    clips.add_frame('gate-1', now - 2000, b'too old')
+    clips.add_frame('gate-1', now - 500, b'before')
+    event = clips.trigger('crash', timestamp=now)
+    clips.add_frame('gate-1', now + 10, b'after')
+    clips.add_frame('gate-1', now + 1000, b'after the window')
+    wait_until_complete(clips)
+
+    with open(os.path.join(event['path'], MANIFEST)) as f:
+        manifest = json.load(f)
+    assert manifest['status'] == 'complete'
+    assert manifest['cameras'] == {'gate-1': 2}
+
+
+def test_repeated_triggers_are_throttled_per_reason(clips):
+    first = clips.trigger('sos')
+    wait_until_complete(clips)  # a clip still collecting is reused anyway, throttling starts after it
+    assert clips.trigger('sos')['event_id'] == first['event_id']
+    assert clips.throttled == 1
+    assert clips.trigger('crash')['event_id'] != first['event_id']
+
+
+def test_long_reasons_are_truncated(clips):
+    assert len(clips.trigger('x' * 500)['reason']) == 64
@@ -0,0 +1,63 @@
+import time
+
+import numpy as np
+
+from camera_server import FrameCache, RelayFrame, RelayMetadata
+
+
+def frame(camera_id, sequence, size=100):
+    return RelayFrame(camera_id, sequence, 0, jpeg=bytes(size))
+
+
+def metadata(camera_id, sequence):
+    return RelayMetadata(camera_id, sequence, 0, {'boxes': []})
+
+
+def test_late_joiner_gets_the_latest_frame_with_its_metadata():
+    cache = FrameCache(max_frames=2)
+    for sequence in (1, 2):
+        cache.add(frame('a', sequence))
+        cache.add(metadata('a', sequence))
+    assert [(type(item).__name__, item.sequence) for item in cache.replay('a')] == [
+        ('RelayFrame', 2), ('RelayMetadata', 2)]
+    assert cache.replay('missing') == []
+
+
+def test_resuming_viewer_gets_everything_after_its_sequence():
+    cache = FrameCache(max_frames=3)
+    for sequence in (1, 2, 3, 4):
+        cache.add(frame('a', sequence))
+    assert [item.sequence for item in cache.replay('a', since=2)] == [3, 4]
+    assert [item.sequence for item in cache.replay('a', since=0)] == [2, 3, 4]  # 1 was evicted
+
+
+def test_global_byte_limit_evicts_the_oldest_across_cameras():
+    cache = FrameCache(max_frames=5, max_bytes=250)
+    cache.add(frame('a', 1))
+    cache.add(frame('b', 1))
+    cache.add(frame('a', 2))
+    assert cache.replay('a', since=0)[0].sequence == 2
+    assert [item.sequence for item in cache.replay('b', since=0)] == [1]
+    assert cache.total_bytes == 200
+
+
+def test_frames_are_measured_again_as_they_grow():
+    cache = FrameCache(max_frames=3, max_bytes=10_000_000)
+    key = frame('a', 1)
+    cache.add(key)
+    key.base64_data  # serialized for a text viewer after it was cached
+    key._image = np.zeros((1080, 1920, 3), np.uint8)  # decoded to rebuild a tile update
+    cache.add(RelayFrame('a', 2, 0, tiles=bytes(10), base=key, update=object()))
+    assert cache.total_bytes == key.nbytes + 10
+    assert cache.get_stats()['items'] == 2
+
+
+def test_sweep_drops_cameras_that_stopped_sending():
+    cache = FrameCache(max_age=0.05)
+    cache.add(frame('silent', 1))
+    time.sleep(0.1)
+    cache.add(frame('live', 1))
+    assert cache.sweep() == ['silent']
+    assert cache.get_stats()['cameras'] == 1
+    assert cache.total_bytes == 100
+    assert cache.sweep() == []  # at most once per max_age
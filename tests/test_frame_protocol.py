@@ -0,0 +1,93 @@
+import pytest
+
+from frame_protocol import (FLAG_TRACE, MSG_FRAME, MSG_METADATA, MSG_TILES, decode_metadata, pack_frame,
+                            pack_metadata, pack_tiles, peek_camera_id, peek_key_sequence, stamp_sent, unpack_frame,
+                            unpack_tiles)
+
+
+def test_frame_round_trip():
+    message = pack_frame('gate-1', 42, b'\xff\xd8jpeg', timestamp=1234.5)
+    header, payload = unpack_frame(message)
+    assert header.msg_type == MSG_FRAME
+    assert header.camera_id == 'gate-1'
+    assert header.sequence == 42
+    assert header.timestamp == 1234.5
+    assert header.trace is None
+    assert bytes(payload) == b'\xff\xd8jpeg'
+
+
+def test_payload_is_a_view_into_the_message():
+    message = bytearray(pack_frame('cam', 1, b'abc', timestamp=0))
+    _, payload = unpack_frame(message)
+    message[-1:] = b'z'
+    assert bytes(payload) == b'abz'
+
+
+def test_sequence_wraps_at_32_bits():
+    header, _ = unpack_frame(pack_frame('cam', 2 ** 32 + 5, b'', timestamp=0))
+    assert header.sequence == 5
+
+
+def test_camera_id_length_limit():
+    pack_frame('c' * 255, 1, b'', timestamp=0)
+    with pytest.raises(ValueError):
+        pack_frame('c' * 256, 1, b'', timestamp=0)
+
+
+def test_stamp_sent_fills_in_the_trace():
+    message = bytearray(pack_frame('cam', 7, b'jpeg', timestamp=1000.0, trace=(3.5, 0.0)))
+    stamp_sent(message, 9.25)
+    header, payload = unpack_frame(message)
+    assert header.flags & FLAG_TRACE
+    assert header.trace == (3.5, 9.25)
+    assert bytes(payload) == b'jpeg'
+
+
+def test_stamp_sent_leaves_untraced_messages_alone():
+    original = pack_frame('cam', 7, b'jpeg', timestamp=1000.0)
+    message = bytearray(original)
+    stamp_sent(message, 9.25)
+    assert bytes(message) == original
+
+
+@pytest.mark.parametrize('message', [
+    b'\x01\x01',  # shorter than the header
+    pack_frame('camera', 1, b'', timestamp=0)[:18],  # cut inside the camera ID
+    bytes([2]) + pack_frame('cam', 1, b'', timestamp=0)[1:],  # unknown version
+])
+def test_malformed_frames_raise_value_error(message):
+    with pytest.raises(ValueError):
+        unpack_frame(message)
+
+
+def test_peek_camera_id():
+    assert peek_camera_id(pack_frame('dock-2', 1, b'data', timestamp=0)) == 'dock-2'
+
+
+def test_metadata_round_trip():
+    metadata = {'fps': 14.9, 'boxes': [[1.0, 2.0, 3.0, 4.0]], 'labels': ['person']}
+    header, payload = unpack_frame(pack_metadata('cam', 9, metadata, timestamp=5.0))
+    assert header.msg_type == MSG_METADATA
+    assert header.sequence == 9
+    assert decode_metadata(payload) == metadata
+
+
+def test_tiles_round_trip():
+    message = pack_tiles('cam', 11, 10, 640, 480, 64, [(0, b'tile0'), (12, b'tile12')], timestamp=0)
+    header, payload = unpack_frame(message)
+    assert header.msg_type == MSG_TILES
+    update = unpack_tiles(payload)
+    assert (update.width, update.height, update.tile_size, update.key_sequence) == (640, 480, 64, 10)
+    assert [(index, bytes(jpeg)) for index, jpeg in update.tiles] == [(0, b'tile0'), (12, b'tile12')]
+    assert peek_key_sequence(message) == 10
+
+
+def test_truncated_tile_update_raises_value_error():
+    _, payload = unpack_frame(pack_tiles('cam', 11, 10, 640, 480, 64, [(0, b'tile0')], timestamp=0))
+    with pytest.raises(ValueError):
+        unpack_tiles(payload[:-1])
+
+
+def test_peek_key_sequence_rejects_whole_frames():
+    with pytest.raises(ValueError):
+        peek_key_sequence(pack_frame('cam', 1, b'jpeg', timestamp=0))
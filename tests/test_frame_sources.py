@@ -0,0 +1,42 @@
+import cv2
+import numpy as np
+import pytest
+
+from frame_sources import ImageDirectorySource, SyntheticSource, open_source
+
+
+def test_synthetic_frames_depend_only_on_seed_and_index():
+    first = [SyntheticSource(seed=3, width=160, height=120, realtime=False).read()[1] for _ in range(2)]
+    assert np.array_equal(first[0], first[1])
+    source = SyntheticSource(seed=3, width=160, height=120, realtime=False)
+    frames = [source.read()[1] for _ in range(2)]
+    assert frames[0].shape == (120, 160, 3)
+    assert not np.array_equal(frames[0], frames[1])
+
+
+@pytest.mark.parametrize('fps', [0, -5, float('nan')])
+def test_non_positive_fps_is_rejected(fps):
+    with pytest.raises(ValueError):
+        SyntheticSource(fps=fps)
+    source = SyntheticSource(fps=15)
+    assert not source.set(cv2.CAP_PROP_FPS, fps)
+    assert source.get(cv2.CAP_PROP_FPS) == 15
+
+
+def test_set_and_get_like_video_capture():
+    source = open_source('synthetic:1', realtime=False)
+    assert source.set(cv2.CAP_PROP_FRAME_WIDTH, 320)
+    assert source.set(cv2.CAP_PROP_FPS, 30)
+    assert not source.set(cv2.CAP_PROP_BRIGHTNESS, 1)
+    assert (source.get(cv2.CAP_PROP_FRAME_WIDTH), source.get(cv2.CAP_PROP_FPS)) == (320, 30)
+    assert source.read()[1].shape[1] == 320
+
+
+def test_image_directory_plays_in_name_order_and_loops(tmp_path):
+    for name, value in (('b.png', 200), ('a.png', 100)):
+        cv2.imwrite(str(tmp_path / name), np.full((20, 30, 3), value, np.uint8))
+    source = ImageDirectorySource(str(tmp_path), width=30, height=20, realtime=False)
+    assert [int(source.read()[1][0, 0, 0]) for _ in range(3)] == [100, 200, 100]
+
+    once = ImageDirectorySource(str(tmp_path), width=30, height=20, realtime=False, loop=False)
+    assert [once.read()[0] for _ in range(3)] == [True, True, False]
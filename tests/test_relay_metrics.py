@@ -0,0 +1,62 @@
+import pytest
+
+from relay_metrics import Histogram, MetricsWriter, StageHistograms
+
+
+def test_empty_histogram():
+    histogram = Histogram()
+    assert histogram.percentile(0.5) == 0.0
+    assert histogram.snapshot() == {'count': 0, 'avg_ms': 0.0, 'p50_ms': 0.0, 'p99_ms': 0.0}
+
+
+def test_percentile_interpolates_inside_the_bucket():
+    histogram = Histogram()
+    for ms in (11, 12, 13, 14):  # all in the (10, 20] bucket
+        histogram.observe(ms)
+    assert histogram.percentile(0.5) == pytest.approx(15.0)
+    assert histogram.percentile(1.0) == pytest.approx(20.0)
+
+
+def test_percentile_picks_the_bucket_holding_the_rank():
+    histogram = Histogram()
+    for ms in [0.5] * 90 + [150] * 10:
+        histogram.observe(ms)
+    assert histogram.percentile(0.5) < 1
+    assert 100 < histogram.percentile(0.95) <= 200
+
+
+def test_slowest_bucket_reports_its_lower_bound():
+    histogram = Histogram()
+    histogram.observe(60_000)
+    assert histogram.percentile(0.99) == 5000
+
+
+def test_snapshot_average():
+    histogram = Histogram()
+    histogram.observe(1)
+    histogram.observe(3)
+    assert histogram.snapshot()['avg_ms'] == 2.0
+
+
+def test_render_is_cumulative():
+    histogram = Histogram()
+    for ms in (0.5, 3, 3, 10_000):
+        histogram.observe(ms)
+    lines = list(histogram.render('latency_ms', 'stage="relay"'))
+    assert 'latency_ms_bucket{stage="relay",le="1"} 1' in lines
+    assert 'latency_ms_bucket{stage="relay",le="5"} 3' in lines
+    assert 'latency_ms_bucket{stage="relay",le="+Inf"} 4' in lines
+    assert lines[-1] == 'latency_ms_count{stage="relay"} 4'
+
+
+def test_writer_declares_each_family_once_and_escapes_labels():
+    writer = MetricsWriter()
+    writer.sample('frames_total', 'counter', 'Frames', 1, camera='a"b')
+    writer.sample('frames_total', 'counter', 'Frames', 2, camera='c')
+    histograms = StageHistograms()
+    histograms.observe('relay', 2)
+    writer.stages('latency_ms', 'Latency', histograms, camera='c')
+    text = writer.text()
+    assert text.count('# TYPE frames_total counter') == 1
+    assert 'frames_total{camera="a\\"b"} 1' in text
+    assert 'latency_ms_bucket{camera="c",stage="relay",le="2"} 1' in text
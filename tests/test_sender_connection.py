@@ -0,0 +1,80 @@
+import asyncio
+import random
+
+import websockets
+
+from sender_connection import Backoff, SenderConnection
+
+
+def test_backoff_doubles_up_to_the_cap_with_jitter():
+    random.seed(1)
+    backoff = Backoff(initial=0.1, maximum=1.0)
+    for ceiling in (0.1, 0.2, 0.4, 0.8, 1.0, 1.0):
+        delay = backoff.next_delay()
+        assert ceiling / 2 <= delay <= ceiling
+
+
+def test_backoff_reset_starts_from_the_shortest_delay():
+    backoff = Backoff(initial=0.1, maximum=1.0)
+    for _ in range(5):
+        backoff.next_delay()
+    backoff.reset()
+    assert backoff.next_delay() <= 0.1
+
+
+def send(connection, camera_id, capture_time, replayable=True):
+    return asyncio.run(connection.send(camera_id, capture_time, [f"{camera_id}-{capture_time}"], replayable))
+
+
+def test_disconnected_sends_keep_the_newest_frames_per_camera():
+    connection = SenderConnection('ws://127.0.0.1:1', replay_frames=2)
+    for capture_time in range(4):
+        assert not send(connection, 'a', capture_time)
+    assert not send(connection, 'b', 0)
+    assert [entry[1] for entry in connection.buffer['a']] == [2, 3]
+    assert len(connection.buffer['b']) == 1
+    assert connection.overwritten == 2
+    assert connection.get_stats()['pending'] == 3
+
+
+def test_tile_updates_are_not_buffered():
+    connection = SenderConnection('ws://127.0.0.1:1')
+    assert not send(connection, 'a', 0, replayable=False)
+    assert connection.get_stats()['pending'] == 0
+
+
+def test_rejection_stops_reconnecting_and_reports_the_reason():
+    reasons = []
+    connection = SenderConnection('ws://127.0.0.1:1', on_rejected=reasons.append)
+    connection.rejected('Invalid token')
+    assert connection.closing
+    assert not connection.ready
+    assert reasons == ['Invalid token']
+
+
+def test_replay_sends_buffered_frames_oldest_first_and_skips_expired():
+    async def scenario():
+        received = []
+
+        async def collect(websocket, path=None):
+            async for message in websocket:
+                received.append(message)
+
+        server = await websockets.serve(collect, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        connection = SenderConnection(f'ws://127.0.0.1:{port}', replay_frames=3, replay_max_age=60)
+        for capture_time in range(3):
+            await connection.send('a', capture_time, [f'a-{capture_time}'])
+        buffered_at, capture_time, messages = connection.buffer['a'][0]
+        connection.buffer['a'][0] = (buffered_at - 3600, capture_time, messages)  # buffered long ago
+        assert await connection.connect()
+        await connection.replay()
+        await connection.close()
+        server.close()
+        await server.wait_closed()
+        return connection, received
+
+    connection, received = asyncio.run(scenario())
+    assert received == ['a-1', 'a-2']
+    assert connection.ready is False  # closed again
+    assert (connection.replayed, connection.expired) == (2, 1)
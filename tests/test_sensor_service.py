@@ -0,0 +1,71 @@
+import pytest
+
+from sensor_service import MAX_BATCH, MAX_CLOCK_SKEW, BatchError, SensorService, validate_batch
+
+NOW = 1_700_000_000.0
+
+
+def test_batch_is_grouped_by_device():
+    by_device, errors = validate_batch({"readings": [
+        {"device_id": "esp-1", "timestamp": NOW - 2, "temperature": 20},
+        {"device_id": "esp-2", "timestamp": (NOW - 1) * 1000, "status": "ok"},  # milliseconds
+        {"device_id": "esp-1", "humidity": 40},  # no timestamp: received now
+    ]}, NOW)
+    assert errors == []
+    assert by_device["esp-1"][0] == [NOW - 2, NOW]
+    assert by_device["esp-2"][0] == [NOW - 1]
+    assert len(by_device["esp-1"][1]) == 2
+
+
+@pytest.mark.parametrize("reading, error", [
+    ("not a dict", "not an object"),
+    ({"timestamp": NOW}, "invalid device_id"),
+    ({"device_id": ""}, "invalid device_id"),
+    ({"device_id": "x" * 65}, "invalid device_id"),
+    ({"device_id": "esp:1"}, "invalid device_id"),
+    ({"device_id": "esp/1"}, "invalid device_id"),
+    ({"device_id": "esp-1", "timestamp": "soon"}, "invalid timestamp"),
+    ({"device_id": "esp-1", "timestamp": True}, "invalid timestamp"),
+    ({"device_id": "esp-1", "timestamp": NOW + MAX_CLOCK_SKEW + 1}, "timestamp in the future"),
+    ({"device_id": "esp-1", "temperature": "hot"}, "non-numeric value"),
+    ({"device_id": "esp-1", "humidity": False}, "non-numeric value"),
+    ({"device_id": "esp-1", "status": 3}, "invalid status"),
+])
+def test_bad_entries_are_reported_not_fatal(reading, error):
+    by_device, errors = validate_batch([reading, {"device_id": "esp-9"}], NOW)
+    assert errors == [{"index": 0, "error": error}]
+    assert list(by_device) == ["esp-9"]
+
+
+@pytest.mark.parametrize("payload", [{"readings": "none"}, 42, [{}] * (MAX_BATCH + 1)])
+def test_unusable_batches_raise(payload):
+    with pytest.raises(BatchError):
+        validate_batch(payload, NOW)
+
+
+@pytest.fixture
+def service():
+    return SensorService(store=None, live=None)
+
+
+def test_late_reading_does_not_replace_the_latest(service):
+    assert not service._update_device("esp-1", NOW, {"status": "ok", "temperature": 21}, NOW)
+    assert not service._update_device("esp-1", NOW - 60, {"status": "ok", "temperature": 5}, NOW)
+    assert service.latest["temperature"] == 21
+
+
+def test_crash_switches_once(service):
+    assert service._update_device("esp-1", NOW, {"status": "crash"}, NOW)
+    assert not service._update_device("esp-1", NOW + 1, {"status": "crash"}, NOW + 1)
+
+
+def test_late_crash_is_never_hidden(service):
+    service._update_device("esp-1", NOW, {"status": "ok"}, NOW)
+    assert service._update_device("esp-1", NOW - 30, {"status": "crash"}, NOW)
+    assert service.devices["esp-1"]["reading"]["status"] == "crash"
+
+
+def test_clock_running_ahead_does_not_make_later_readings_late(service):
+    service._update_device("esp-1", NOW + MAX_CLOCK_SKEW, {"status": "ok"}, NOW)
+    assert service._update_device("esp-1", NOW + 1, {"status": "crash"}, NOW + 1)
+    assert service.latest["status"] == "crash"
@@ -0,0 +1,123 @@
+import math
+import os
+
+import pytest
+
+from sensor_store import MAX_STATUSES, OTHER_STATUS, SensorStore
+
+START = 472_222 * 3600.0  # a whole hour, so 1 min and 1 h buckets line up with it
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SensorStore(str(tmp_path))
+    yield store
+    store.close()
+
+
+def reopen(store):
+    store.close()
+    return SensorStore(store.root)
+
+
+def test_history_from_raw_readings(store):
+    store.append("esp-1", {"status": "ok", "temperature": 20, "humidity": 40}, START)
+    store.append("esp-1", {"status": "ok", "temperature": 22, "humidity": 50}, START + 10)
+    store.append("esp-1", {"status": "crash", "temperature": 30}, START + 70)
+
+    history = store.history("esp-1", START, START + 120, step=60)
+    assert history["source"] == "1m"
+    assert history["t"] == [START, START + 60]
+    assert history["count"] == [2, 1]
+    assert history["crashes"] == [0, 1]
+    assert history["temperature"] == {"min": [20.0, 30.0], "max": [22.0, 30.0], "avg": [21.0, 30.0]}
+    assert history["humidity"]["avg"] == [45.0, None]
+
+
+def test_step_below_a_minute_reads_raw_columns(store):
+    for i in range(6):
+        store.append("esp-1", {"status": "ok", "temperature": i}, START + i * 5)
+    history = store.history("esp-1", START, START + 30, step=10)
+    assert history["source"] == "raw"
+    assert history["count"] == [2, 2, 2]
+    assert history["temperature"]["max"] == [1.0, 3.0, 5.0]
+
+
+def test_rollups_match_raw_after_late_and_batched_readings(store):
+    store.append_many("esp-1", [START + 3600 + 5, START + 5], [{"status": "ok", "temperature": 10},
+                                                              {"status": "ok", "temperature": 30}])
+    store.append("esp-1", {"status": "ok", "temperature": 20}, START + 1)  # late: lands in an earlier bucket
+    hourly = store.history("esp-1", START, START + 7200, step=3600)
+    assert hourly["source"] == "1h"
+    assert hourly["count"] == [2, 1]
+    assert hourly["temperature"]["avg"] == [25.0, 10.0]
+    raw = store.history("esp-1", START, START + 7200, step=10)
+    assert raw["source"] == "raw"
+    assert raw["count"] == [2, 1]
+    assert raw["temperature"]["avg"] == [25.0, 10.0]
+
+
+def test_reload_restores_readings_and_rollups(store):
+    store.append("esp-1", {"status": "ok", "temperature": 20}, START + 30)
+    store.append("esp-1", {"status": "crash", "temperature": 25}, START)
+    before = store.history("esp-1", START, START + 60, step=60)
+
+    reloaded = reopen(store)
+    try:
+        assert reloaded.history("esp-1", START, START + 60, step=60) == before
+        assert before["crashes"] == [1]
+    finally:
+        reloaded.close()
+
+
+def test_device_ids_survive_a_reload_without_colliding(store):
+    for device_id in ("esp:1", "esp/1", "esp_1", "50%"):
+        store.append(device_id, {"status": "ok", "temperature": 1}, START)
+    assert len(os.listdir(store.root)) == 5  # four series and the status table
+
+    reloaded = reopen(store)
+    try:
+        assert reloaded.device_ids() == ["50%", "esp/1", "esp:1", "esp_1"]
+        assert reloaded.history("esp:1", START, START + 60)["count"] == [1]
+    finally:
+        reloaded.close()
+
+
+def test_statuses_beyond_the_table_share_a_code(store):
+    for i in range(MAX_STATUSES + 20):
+        store.append("esp-1", {"status": f"status-{i}"}, START + i)
+    assert len(store.statuses) == MAX_STATUSES - 1  # the last code is kept for "crash"
+    assert store._status_code("status-999") == OTHER_STATUS
+
+    # "crash" still gets its own code, so crashes are still counted after a reload
+    store.append("esp-1", {"status": "crash"}, START + 1000)
+    reloaded = reopen(store)
+    try:
+        assert sum(reloaded.history("esp-1", START, START + 3600, step=3600)["crashes"]) == 1
+    finally:
+        reloaded.close()
+
+
+def test_unknown_device(store):
+    with pytest.raises(KeyError):
+        store.history("missing", START, START + 60)
+
+
+@pytest.mark.parametrize("start, end, step", [
+    (START, START, None),
+    (-math.inf, START, None),
+    (START, math.nan, None),
+    (START, START + 60, math.inf),
+    (-1e308, 1e308, None),
+])
+def test_invalid_ranges_raise_value_error(store, start, end, step):
+    store.append("esp-1", {"status": "ok"}, START)
+    with pytest.raises(ValueError):
+        store.history("esp-1", start, end, step)
+
+
+def test_wide_ranges_are_capped_in_points(store):
+    store.append("esp-1", {"status": "ok", "temperature": 1}, START)
+    history = store.history("esp-1", START - 365 * 86400, START + 60, step=1)
+    assert history["step"] % 3600 == 0
+    assert history["count"] == [1]
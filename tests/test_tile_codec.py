@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from frame_protocol import TileUpdate
+from jpeg_encoder import JpegEncoder
+from tile_codec import TileEncoder, TileGrid, assemble, decode_jpeg
+
+
+def scene(box_x=None):
+    frame = np.full((240, 320, 3), 90, np.uint8)
+    frame[:, :160] = 160
+    if box_x is not None:
+        frame[100:140, box_x:box_x + 40] = (0, 0, 255)
+    return frame
+
+
+@pytest.fixture
+def encoder():
+    return TileEncoder(JpegEncoder(quality=95), tile_size=64, keyframe_interval=60)
+
+
+def test_edge_tiles_are_cut_short():
+    grid = TileGrid(200, 100, 64)
+    assert (grid.columns, grid.rows, grid.count) == (4, 2, 8)
+    assert grid.bounds(3) == (192, 0, 200, 64)
+    assert grid.bounds(7) == (192, 64, 200, 100)
+
+
+def test_tile_size_must_match_jpeg_blocks():
+    with pytest.raises(ValueError):
+        TileEncoder(JpegEncoder(), tile_size=50)
+
+
+def test_static_scene_sends_an_empty_update(encoder):
+    assert encoder.encode(scene(), 1).keyframe
+    update = encoder.encode(scene(), 2)
+    assert not update.keyframe
+    assert update.key_sequence == 1
+    assert update.tiles == []
+
+
+def test_only_changed_tiles_are_sent_and_assemble_rebuilds_the_frame(encoder):
+    key = encoder.encode(scene(), 1)
+    moved = scene(box_x=10)
+    update = encoder.encode(moved, 2)
+    assert [index for index, _ in update.tiles] == [5, 10]  # column 0 of rows 1 and 2 in a 5x4 grid
+    rebuilt = assemble(decode_jpeg(key.jpeg), TileUpdate(320, 240, 64, key.key_sequence, update.tiles))
+    assert np.abs(rebuilt.astype(int) - moved).mean() < 3
+
+
+def test_requested_and_wholesale_changes_send_keyframes(encoder):
+    encoder.encode(scene(), 1)
+    encoder.request_keyframe()
+    assert encoder.encode(scene(), 2).keyframe
+    assert encoder.encode(255 - scene(), 3).keyframe  # every tile changed: a keyframe is cheaper
+
+
+def test_assemble_rejects_mismatched_updates():
+    keyframe = np.zeros((240, 320, 3), np.uint8)
+    with pytest.raises(ValueError):
+        assemble(keyframe, TileUpdate(640, 480, 64, 1, []))
+    with pytest.raises(ValueError):
+        assemble(keyframe, TileUpdate(320, 240, 64, 1, [(99, b'')]))
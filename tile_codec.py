@@ -0,0 +1,155 @@
+"""
+Tile Codec for Fixed-Mount Cameras
+Splits frames into a grid of tiles, finds the tiles that differ from the last
+keyframe with one vectorized comparison and encodes only those as small JPEGs,
+with a full keyframe every few seconds. Receivers paste the tiles over the
+decoded keyframe (see assemble and frame_protocol.TileUpdate)
+"""
+
+import threading
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from frame_protocol import TileUpdate
+from jpeg_encoder import JpegEncoder
+
+
+class TileGrid:
+    """Tile geometry of a frame size; edge tiles are cut short when the size is not a multiple"""
+
+    def __init__(self, width: int, height: int, tile_size: int):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.columns = -(-width // tile_size)
+        self.rows = -(-height // tile_size)
+        self.count = self.rows * self.columns
+        # Tile edges along each axis, and pixels per tile to turn changed-pixel counts into fractions
+        self.row_edges = np.append(np.arange(0, height, tile_size), height)
+        self.column_edges = np.append(np.arange(0, width, tile_size), width)
+        self.areas = np.outer(np.diff(self.row_edges), np.diff(self.column_edges))
+
+    def bounds(self, index: int) -> Tuple[int, int, int, int]:
+        """(x0, y0, x1, y1) of a row-major tile index"""
+        row, column = divmod(index, self.columns)
+        x0, y0 = column * self.tile_size, row * self.tile_size
+        return x0, y0, min(x0 + self.tile_size, self.width), min(y0 + self.tile_size, self.height)
+
+
+class TileFrame(NamedTuple):
+    keyframe: bool
+    key_sequence: int  # the keyframe's own sequence for keyframes
+    jpeg: bytes  # whole frame, keyframes only
+    tiles: List[Tuple[int, bytes]]  # changed tiles, updates only
+
+
+class TileEncoder:
+    """Per-camera delta encoder: a keyframe, then only the tiles that differ from it"""
+
+    def __init__(self, encoder: JpegEncoder, tile_size: int = 64, keyframe_interval: float = 2.0,
+                 pixel_threshold: int = 15, sensitivity: float = 0.01, max_changed: float = 0.5):
+        if tile_size <= 0 or tile_size % 16:
+            raise ValueError("Tile size must be a positive multiple of 16 (the JPEG block size)")
+        self.encoder = encoder
+        self.tile_size = tile_size
+        self.keyframe_interval = keyframe_interval  # seconds between keyframes
+        self.pixel_threshold = pixel_threshold  # grayscale delta counted as a changed pixel
+        self.sensitivity = sensitivity  # fraction of a tile's pixels that must change
+        self.max_changed = max_changed  # above this fraction of tiles a keyframe is cheaper
+
+        # Workers of one camera share the keyframe; the lock covers the decision, not the encoding
+        self.lock = threading.Lock()
+        self.grid: Optional[TileGrid] = None
+        self.reference: Optional[np.ndarray] = None  # grayscale keyframe
+        self.key_sequence = 0
+        self.key_time = 0.0
+        self.force_keyframe = True
+
+        self.keyframes = 0
+        self.updates = 0
+        self.tiles_sent = 0
+        self.bytes = 0
+
+    def request_keyframe(self):
+        """Make the next frame a keyframe (the previous one was lost, or the connection is new)"""
+        self.force_keyframe = True
+
+    def changed_tiles(self, gray: np.ndarray) -> np.ndarray:
+        """Row-major indices of the tiles where enough pixels differ from the keyframe"""
+        _, changed = cv2.threshold(cv2.absdiff(gray, self.reference), self.pixel_threshold, 1, cv2.THRESH_BINARY)
+        # Changed pixels of every tile at once from the four corners of a summed-area table
+        table = cv2.integral(changed)
+        top, bottom = self.grid.row_edges[:-1, None], self.grid.row_edges[1:, None]
+        left, right = self.grid.column_edges[None, :-1], self.grid.column_edges[None, 1:]
+        counts = table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+        return np.flatnonzero(counts > self.sensitivity * self.grid.areas)
+
+    def encode(self, frame: np.ndarray, sequence: int, quality: Optional[int] = None) -> TileFrame:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+        now = time.monotonic()
+
+        with self.lock:
+            keyframe = (self.force_keyframe or self.reference is None or self.reference.shape != gray.shape
+                        or now - self.key_time >= self.keyframe_interval)
+            if not keyframe:
+                changed = self.changed_tiles(gray)
+                keyframe = len(changed) > self.max_changed * self.grid.count
+            if keyframe:
+                self.force_keyframe = False
+                self.reference = gray
+                self.key_sequence = sequence
+                self.key_time = now
+                if self.grid is None or (self.grid.width, self.grid.height) != (width, height):
+                    self.grid = TileGrid(width, height, self.tile_size)
+            grid, key_sequence = self.grid, self.key_sequence
+
+        if keyframe:
+            jpeg = self.encoder.encode(frame, quality)
+            self.keyframes += 1
+            self.bytes += len(jpeg)
+            return TileFrame(True, key_sequence, jpeg, [])
+
+        tiles = []
+        for index in changed:
+            x0, y0, x1, y1 = grid.bounds(int(index))
+            jpeg = self.encoder.encode(np.ascontiguousarray(frame[y0:y1, x0:x1]), quality)
+            tiles.append((int(index), jpeg))
+            self.bytes += len(jpeg)
+        self.updates += 1
+        self.tiles_sent += len(tiles)
+        return TileFrame(False, key_sequence, b"", tiles)
+
+    def snapshot(self) -> dict:
+        tiles = self.grid.count if self.grid else 0
+        return {
+            'tile_size': self.tile_size,
+            'keyframes': self.keyframes,
+            'updates': self.updates,
+            'avg_tiles_changed': round(self.tiles_sent / self.updates / tiles, 4) if self.updates and tiles else 0.0,
+            'avg_bytes': self.bytes // (self.keyframes + self.updates) if self.keyframes + self.updates else 0
+        }
+
+
+def decode_jpeg(data) -> Optional[np.ndarray]:
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def assemble(keyframe: np.ndarray, update: TileUpdate) -> np.ndarray:
+    """A copy of the decoded keyframe with the update's tiles pasted in"""
+    if keyframe.shape[:2] != (update.height, update.width):
+        raise ValueError("Tile update does not match the keyframe size")
+    frame = keyframe.copy()
+    grid = TileGrid(update.width, update.height, update.tile_size)
+    for index, jpeg in update.tiles:
+        if index >= grid.count:
+            raise ValueError(f"Tile {index} outside a {grid.columns}x{grid.rows} grid")
+        tile = decode_jpeg(jpeg)
+        if tile is None:
+            raise ValueError(f"Could not decode tile {index}")
+        x0, y0, x1, y1 = grid.bounds(index)
+        frame[y0:y1, x0:x1] = tile[:y1 - y0, :x1 - x0]
+    return frame